@@ -10,6 +10,9 @@ class Config:
     admins: List[int]
     openai_api_key: str
     huggingface_token: str
+    update_queue_limit: int = 32  # макс. апдейтов в очереди одного чата
+    snapshot_db: str = ""  # файл снимков игр; пусто — рядом с базой дрочки
+    snapshot_interval: int = 60  # секунды между снимками игр
 
 
 def load_config(env_file: str = ".env") -> Config:
@@ -29,7 +32,15 @@ def load_config(env_file: str = ".env") -> Config:
     hf_token = os.getenv("HUGGINGFACE_TOKEN", "")
     print(f"DEBUG: HUGGINGFACE_TOKEN loaded: {bool(hf_token)} (length: {len(hf_token) if hf_token else 0})")
 
-    return Config(bot_token=token, admins=admins, openai_api_key=openai_key, huggingface_token=hf_token)
+    queue_raw = os.getenv("UPDATE_QUEUE_LIMIT", "")
+    update_queue_limit = int(queue_raw) if queue_raw.isdigit() and int(queue_raw) > 0 else 32
+
+    interval_raw = os.getenv("SNAPSHOT_INTERVAL", "")
+    snapshot_interval = int(interval_raw) if interval_raw.isdigit() and int(interval_raw) > 0 else 60
+
+    return Config(bot_token=token, admins=admins, openai_api_key=openai_key, huggingface_token=hf_token,
+                  update_queue_limit=update_queue_limit, snapshot_db=os.getenv("SNAPSHOT_DB", ""),
+                  snapshot_interval=snapshot_interval)
 
 
 def format_user_mention(user) -> str:
@@ -0,0 +1 @@
+"""Игровые движки без зависимостей от aiogram (можно тестировать и гонять отдельно)."""
@@ -0,0 +1,162 @@
+"""Крестики-нолики на поле N×N до k в ряд (гомоку-подобные варианты).
+
+Поле — два битборда, как в games.tictactoe, бит ``i`` — клетка ``i = row * size + col``.
+Геометрия (размер, k, лучи из каждой клетки) считается один раз на пару ``(size, k)``.
+После хода проверяются только четыре направления через поставленную клетку:
+не больше ``2 * (k - 1)`` проверок бита на направление, т.е. O(k) вместо обхода поля.
+"""
+from __future__ import annotations
+from functools import lru_cache
+from typing import Iterator
+
+from .tictactoe import EMPTY_CELL, PLAYER_X, PLAYER_O, TIE
+
+MIN_SIZE = 3
+MAX_SIZE = 8  # Telegram: не больше 8 кнопок в ряду inline-клавиатуры
+
+# (drow, dcol): горизонталь, вертикаль, две диагонали
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+POS_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def encode_pos(pos: int) -> str:
+    """Cell index for callback_data: one or two base36 chars (max 63 → '1r')."""
+    return POS_DIGITS[pos] if pos < 36 else POS_DIGITS[pos // 36] + POS_DIGITS[pos % 36]
+
+
+def decode_pos(raw: str | None) -> int | None:
+    try:
+        return int(raw, 36)
+    except (TypeError, ValueError):
+        return None
+
+
+def default_k(size: int) -> int:
+    return 3 if size <= 4 else 4 if size <= 6 else 5
+
+
+class Geometry:
+    """Board shape shared by all boards of the same ``(size, k)``."""
+
+    __slots__ = ("size", "k", "cells", "full_mask", "rays")
+
+    def __init__(self, size: int, k: int):
+        if not MIN_SIZE <= size <= MAX_SIZE:
+            raise ValueError(f"Board size must be {MIN_SIZE}..{MAX_SIZE}, got {size}")
+        if not MIN_SIZE <= k <= size:
+            raise ValueError(f"k must be {MIN_SIZE}..{size}, got {k}")
+        self.size = size
+        self.k = k
+        self.cells = size * size
+        self.full_mask = (1 << self.cells) - 1
+        # rays[pos] — для каждого направления пара (вперёд, назад): биты соседей
+        # на расстоянии 1..k-1 по порядку удаления от клетки
+        self.rays = tuple(tuple(
+            (self._ray(pos, dr, dc), self._ray(pos, -dr, -dc)) for dr, dc in DIRECTIONS
+        ) for pos in range(self.cells))
+
+    def _ray(self, pos: int, dr: int, dc: int) -> tuple[int, ...]:
+        row, col = divmod(pos, self.size)
+        bits = []
+        for step in range(1, self.k):
+            r, c = row + dr * step, col + dc * step
+            if not (0 <= r < self.size and 0 <= c < self.size):
+                break
+            bits.append(1 << (r * self.size + c))
+        return tuple(bits)
+
+    def completes_line(self, bits: int, pos: int) -> bool:
+        """Whether ``bits`` (which include ``pos``) contain k in a row through ``pos``."""
+        need = self.k - 1
+        for forward, backward in self.rays[pos]:
+            if len(forward) + len(backward) < need:
+                continue
+            run = 0
+            for bit in forward:
+                if not bits & bit:
+                    break
+                run += 1
+            for bit in backward:
+                if run >= need or not bits & bit:
+                    break
+                run += 1
+            if run >= need:
+                return True
+        return False
+
+
+@lru_cache(maxsize=None)
+def geometry(size: int, k: int) -> Geometry:
+    return Geometry(size, k)
+
+
+class KInARowBoard:
+    """N×N board, first to get k in a row wins. Same interface as TicTacToeBoard."""
+
+    __slots__ = ("geo", "x", "o")
+
+    def __init__(self, size: int = 3, k: int = 3, x: int = 0, o: int = 0):
+        self.geo = geometry(size, k)
+        self.x = x
+        self.o = o
+
+    @property
+    def size(self) -> int:
+        return self.geo.size
+
+    @property
+    def k(self) -> int:
+        return self.geo.k
+
+    @property
+    def cells(self) -> int:
+        return self.geo.cells
+
+    @property
+    def occupied(self) -> int:
+        return self.x | self.o
+
+    @property
+    def key(self) -> tuple[int, int]:
+        return self.x, self.o
+
+    def cell(self, pos: int) -> int:
+        bit = 1 << pos
+        if self.x & bit:
+            return PLAYER_X
+        if self.o & bit:
+            return PLAYER_O
+        return EMPTY_CELL
+
+    def __iter__(self) -> Iterator[int]:
+        return (self.cell(pos) for pos in range(self.cells))
+
+    def is_free(self, pos: int) -> bool:
+        return 0 <= pos < self.cells and not (self.occupied >> pos) & 1
+
+    def play(self, pos: int, symbol: int) -> int:
+        """Put ``symbol`` on ``pos``; return the winner, TIE or EMPTY_CELL (game goes on)."""
+        bit = 1 << pos
+        if symbol == PLAYER_X:
+            self.x |= bit
+            bits = self.x
+        else:
+            self.o |= bit
+            bits = self.o
+        if self.geo.completes_line(bits, pos):
+            return symbol
+        return TIE if self.occupied == self.geo.full_mask else EMPTY_CELL
+
+    def __reduce__(self):
+        # геометрию не сериализуем — она пересобирается из (size, k) через кэш
+        return KInARowBoard, (self.size, self.k, self.x, self.o)
+
+    def copy(self) -> "KInARowBoard":
+        return KInARowBoard(self.size, self.k, self.x, self.o)
+
+    def __repr__(self) -> str:
+        marks = {EMPTY_CELL: ".", PLAYER_X: "X", PLAYER_O: "O"}
+        n = self.size
+        rows = ("".join(marks[self.cell(r * n + c)] for c in range(n)) for r in range(n))
+        return f"KInARowBoard({n}x{n}, k={self.k}, {'/'.join(rows)})"
@@ -0,0 +1,283 @@
+"""Правила мафии без Telegram: состояние партии и переходы между фазами.
+
+``handlers.mafia`` хранит ``MafiaGame`` в сессиях, рассылает сообщения и ставит
+таймеры, а всё, что меняет состояние партии (раздача ролей, ночные действия,
+голосование, итоги фаз, условие победы), делается методами движка. Тот же движок
+крутит пакетный симулятор баланса (``games.mafia_sim``).
+"""
+from __future__ import annotations
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+
+class GamePhase(Enum):
+    WAITING = "ожидание"
+    NIGHT = "ночь"
+    DAY = "день"
+    VOTING = "голосование"
+    ENDED = "завершена"
+
+
+class Role(Enum):
+    MAFIA = "мафия"
+    CIVILIAN = "мирный"
+    DETECTIVE = "детектив"
+    DOCTOR = "доктор"
+
+
+class Side(Enum):
+    MAFIA = "mafia"
+    TOWN = "town"
+
+
+WIN_TEXT = {Side.TOWN: "Мирные жители победили!", Side.MAFIA: "Мафия победила!"}
+
+# Ночное действие каждой активной роли
+NIGHT_ACTIONS = {Role.MAFIA: "mafia_kill", Role.DOCTOR: "doctor_heal", Role.DETECTIVE: "detective_check"}
+
+MIN_PLAYERS = 4
+
+
+def normalize_username(name: str) -> str:
+    return name.lstrip('@').lower()
+
+
+def default_mafia_count(players: int) -> int:
+    return max(1, players // 3)
+
+
+def deal_roles(players: int, mafia: Optional[int] = None, detectives: int = 1, doctors: int = 1) -> List[Role]:
+    """Unshuffled role list: ``mafia`` mafiosi (default ``players // 3``), specials, civilians for the rest."""
+    mafia = default_mafia_count(players) if mafia is None else mafia
+    civilians = players - mafia - detectives - doctors
+    if mafia < 1 or civilians < 0:
+        raise ValueError(f"Role mix {mafia}/{detectives}/{doctors} does not fit {players} players")
+    return [Role.MAFIA] * mafia + [Role.CIVILIAN] * civilians + [Role.DETECTIVE] * detectives + [Role.DOCTOR] * doctors
+
+
+@dataclass
+class Player:
+    user_id: int
+    username: str  # отображаемое имя
+    role: Optional[Role] = None
+    alive: bool = True
+    vote_count: int = 0  # for voting
+    tg_username: Optional[str] = None  # настоящий @username, если есть
+
+
+@dataclass
+class NightResult:
+    killed: Optional[Player] = None  # погиб этой ночью
+    saved: Optional[Player] = None  # мафия стреляла, доктор вылечил
+    checked: Optional[Player] = None  # кого проверил детектив
+
+    @property
+    def checked_is_mafia(self) -> bool:
+        return self.checked is not None and self.checked.role == Role.MAFIA
+
+
+@dataclass
+class VoteResult:
+    executed: Optional[Player] = None
+    tie: bool = False  # None + not tie — никто не голосовал
+
+
+@dataclass
+class MafiaGame:
+    chat_id: int
+    players: List[Player]
+    phase: GamePhase = GamePhase.WAITING
+    night_actions: Dict[str, Optional[int]] = None  # mafia_kill, doctor_heal, detective_check
+    day_votes: Dict[int, int] = None  # voter_id -> target_id
+    phase_deadline: Optional[float] = None  # time.time() конца текущей фазы (для перезапуска)
+    # Индексы и счётчики, поддерживаются инкрементально (add_player / kill / cast_vote)
+    by_id: Dict[int, Player] = field(default_factory=dict, init=False, repr=False)
+    by_username: Dict[str, Player] = field(default_factory=dict, init=False, repr=False)
+    # запасной индекс по отображаемому имени (как /vote @Имя до индексов); совпадающие имена не индексируем
+    by_name: Dict[str, Player] = field(default_factory=dict, init=False, repr=False)
+    name_clashes: Set[str] = field(default_factory=set, init=False, repr=False)
+    alive_count: int = field(default=0, init=False)
+    alive_roles: Counter = field(default_factory=Counter, init=False, repr=False)
+    vote_tally: Counter = field(default_factory=Counter, init=False, repr=False)
+    vote_leaders: Tuple[int, ...] = field(default=(), init=False, repr=False)
+    leader_votes: int = field(default=0, init=False, repr=False)
+
+    def __post_init__(self):
+        if self.night_actions is None:
+            self.night_actions = dict.fromkeys(NIGHT_ACTIONS.values())
+        if self.day_votes is None:
+            self.day_votes = {}
+        self._reindex()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reindex()  # снимки старого формата без индексов тоже поднимаются
+
+    def _reindex(self):
+        players, votes = self.players, self.day_votes
+        self.players, self.by_id, self.by_username = [], {}, {}
+        self.by_name, self.name_clashes = {}, set()
+        self.alive_count, self.alive_roles = 0, Counter()
+        for player in players:
+            self.add_player(player)
+        self.reset_votes()
+        for voter_id, target_id in votes.items():
+            self.cast_vote(voter_id, target_id)
+
+    @property
+    def clock_key(self):
+        return ("mafia", self.chat_id)
+
+    # --- состав ---
+    def add_player(self, player: Player):
+        self.players.append(player)
+        self.by_id[player.user_id] = player
+        if player.tg_username:
+            self.by_username[normalize_username(player.tg_username)] = player
+        name = normalize_username(player.username)
+        if name in self.by_name or name in self.name_clashes:
+            self.by_name.pop(name, None)  # двое с одним именем — по имени не угадываем
+            self.name_clashes.add(name)
+        else:
+            self.by_name[name] = player
+        if player.alive:
+            self.alive_count += 1
+            self.alive_roles[player.role] += 1
+
+    def assign_roles(self, roles: Sequence[Role]):
+        for player, role in zip(self.players, roles):
+            player.role = role
+        self.alive_roles = Counter(p.role for p in self.players if p.alive)
+
+    def kill(self, player: Player):
+        if not player.alive:
+            return
+        player.alive = False
+        self.alive_count -= 1
+        self.alive_roles[player.role] -= 1
+
+    def alive_player(self, user_id: Optional[int]) -> Optional[Player]:
+        player = self.by_id.get(user_id)
+        return player if player is not None and player.alive else None
+
+    def alive_by_username(self, username: str) -> Optional[Player]:
+        """By @username, or by display name for players without one (unless the name is shared)."""
+        key = normalize_username(username)
+        player = self.by_username.get(key) or self.by_name.get(key)
+        return player if player is not None and player.alive else None
+
+    def get_alive_players(self) -> List[Player]:
+        return [p for p in self.players if p.alive]
+
+    def get_mafia_players(self) -> List[Player]:
+        return [p for p in self.players if p.alive and p.role == Role.MAFIA]
+
+    def get_civilian_players(self) -> List[Player]:
+        return [p for p in self.players if p.alive and p.role != Role.MAFIA]
+
+    # --- фазы ---
+    def start(self, roles: Sequence[Role], rng: Optional[random.Random] = None):
+        """Shuffle ``roles`` over the players and go to the first night."""
+        if self.phase != GamePhase.WAITING:
+            raise ValueError("Game already started")
+        roles = list(roles)
+        (rng or random).shuffle(roles)
+        self.assign_roles(roles)
+        self.start_night()
+
+    def start_night(self):
+        self.phase = GamePhase.NIGHT
+        self.night_actions = dict.fromkeys(NIGHT_ACTIONS.values())
+
+    def start_day(self):
+        self.phase = GamePhase.DAY
+        self.reset_votes()
+
+    def start_voting(self):
+        self.phase = GamePhase.VOTING
+
+    def night_action(self, player: Optional[Player], target: Player, role: Optional[Role] = None) -> Optional[str]:
+        """Record the player's night choice; returns an error text or None"""
+        if self.phase != GamePhase.NIGHT:
+            return "❌ Сейчас не ночь!"
+        if not player or not player.alive or player.role not in NIGHT_ACTIONS or (role and player.role != role):
+            return "❌ Вы не можете использовать эту команду!"
+        if not target.alive:
+            return "❌ Игрок не найден!"
+        if player.role == Role.MAFIA and target.role == Role.MAFIA:
+            return "❌ Нельзя убивать своих!"
+        self.night_actions[NIGHT_ACTIONS[player.role]] = target.user_id
+        return None
+
+    def night_actions_complete(self) -> bool:
+        """Every alive active role has made its night choice"""
+        return all(self.alive_roles[role] <= 0 or self.night_actions[action] is not None
+                   for role, action in NIGHT_ACTIONS.items())
+
+    def resolve_night(self) -> NightResult:
+        """Apply the night's actions (the doctor's heal cancels the kill)."""
+        actions = self.night_actions
+        result = NightResult(checked=self.alive_player(actions.get("detective_check")))
+        target = self.alive_player(actions.get("mafia_kill"))
+        if target is not None:
+            if target.user_id == actions.get("doctor_heal"):
+                result.saved = target
+            else:
+                self.kill(target)
+                result.killed = target
+        return result
+
+    # --- голосование ---
+    def reset_votes(self):
+        self.day_votes = {}
+        self.vote_tally = Counter()
+        self.vote_leaders = ()
+        self.leader_votes = 0
+
+    def cast_vote(self, voter_id: int, target_id: int):
+        """Record (or change) a vote; the tally and leaders are updated in O(1) amortized"""
+        previous = self.day_votes.get(voter_id)
+        if previous == target_id:
+            return
+        self.day_votes[voter_id] = target_id
+        if previous is not None:
+            self.vote_tally[previous] -= 1
+            if previous in self.vote_leaders:
+                # лидер потерял голос — пересчёт только среди тех, за кого голосовали
+                self.leader_votes = max(self.vote_tally.values())
+                self.vote_leaders = tuple(t for t, v in self.vote_tally.items() if v == self.leader_votes and v > 0)
+        count = self.vote_tally[target_id] = self.vote_tally[target_id] + 1
+        if count > self.leader_votes:
+            self.leader_votes, self.vote_leaders = count, (target_id,)
+        elif count == self.leader_votes and target_id not in self.vote_leaders:
+            self.vote_leaders += (target_id,)
+
+    def all_voted(self) -> bool:
+        return len(self.day_votes) >= self.alive_count
+
+    def resolve_vote(self) -> VoteResult:
+        """Execute the single vote leader; a tie or no votes executes nobody."""
+        if len(self.vote_leaders) != 1:
+            return VoteResult(tie=len(self.vote_leaders) > 1)
+        executed = self.alive_player(self.vote_leaders[0])
+        if executed is not None:
+            self.kill(executed)
+        return VoteResult(executed=executed)
+
+    # --- итог ---
+    def winner(self) -> Optional[Side]:
+        mafia_count = self.alive_roles[Role.MAFIA]
+        if mafia_count == 0:
+            return Side.TOWN
+        if mafia_count >= self.alive_count - mafia_count:
+            return Side.MAFIA
+        return None
+
+    def check_win_condition(self) -> Optional[str]:
+        side = self.winner()
+        if side is not None:
+            self.phase = GamePhase.ENDED
+        return WIN_TEXT.get(side)
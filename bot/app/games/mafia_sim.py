@@ -0,0 +1,210 @@
+"""Пакетный симулятор мафии для подбора баланса ролей.
+
+Партии играются движком ``games.mafia_engine`` (теми же правилами, что и в боте)
+за ботов-стратегий. Игры одной конфигурации идут пачкой в ногу: на каждый раунд
+(ночь + голосование) случайные числа для всех живых партий тянутся одной матрицей
+— через NumPy, если он установлен, иначе обычным ``random``.
+
+    python -m app.games.mafia_sim --players 4-12 --games 100000
+    python -m app.games.mafia_sim --players 8 --mafia 1-3 --strategy informed
+
+Выводит долю побед мафии и мирных по каждому числу игроков и раскладу ролей.
+"""
+from __future__ import annotations
+import argparse
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set
+
+from .mafia_engine import MafiaGame, Player, Role, Side, deal_roles, default_mafia_count
+
+try:
+    import numpy as np
+except ImportError:  # симулятор работает и без NumPy, просто медленнее тянет случайные числа
+    np = None
+
+MAX_ROUNDS = 50  # защита от бесконечной партии (доктор каждую ночь спасает, ничьи на голосовании)
+
+
+def pick(candidates: Sequence[Player], u: float) -> Optional[Player]:
+    """Candidate for a uniform draw ``u`` in [0, 1)."""
+    return candidates[int(u * len(candidates))] if candidates else None
+
+
+@dataclass
+class SimGame:
+    game: MafiaGame
+    rounds: int = 0
+    checked: Dict[int, bool] = field(default_factory=dict)  # проверки детектива: user_id -> мафия?
+    revealed: Set[int] = field(default_factory=set)  # мафия, которую детектив объявил днём
+
+
+class Strategy:
+    """Random play: every choice is uniform over the legal targets."""
+
+    name = "random"
+
+    def night_targets(self, sim: SimGame, player: Player) -> List[Player]:
+        alive = sim.game.get_alive_players()
+        if player.role == Role.MAFIA:
+            return [p for p in alive if p.role != Role.MAFIA]
+        if player.role == Role.DETECTIVE:
+            return [p for p in alive if p is not player]
+        return alive
+
+    def night_target(self, sim: SimGame, player: Player, u: float) -> Optional[Player]:
+        return pick(self.night_targets(sim, player), u)
+
+    def vote_target(self, sim: SimGame, voter: Player, u: float) -> Optional[Player]:
+        alive = sim.game.get_alive_players()
+        if voter.role == Role.MAFIA:
+            return pick([p for p in alive if p.role != Role.MAFIA], u)
+        return pick([p for p in alive if p is not voter], u)
+
+
+class InformedStrategy(Strategy):
+    """The detective checks unknown players and reveals found mafia; the town votes on reveals."""
+
+    name = "informed"
+
+    def night_target(self, sim: SimGame, player: Player, u: float) -> Optional[Player]:
+        game = sim.game
+        if player.role == Role.DETECTIVE:
+            unknown = [p for p in game.get_alive_players() if p is not player and p.user_id not in sim.checked]
+            return pick(unknown, u) or super().night_target(sim, player, u)
+        if sim.revealed:
+            detective = next((p for p in game.get_alive_players() if p.role == Role.DETECTIVE), None)
+            if detective is not None and player.role in (Role.MAFIA, Role.DOCTOR):
+                return detective  # раскрывшийся детектив — первая цель мафии и первый пациент доктора
+        return super().night_target(sim, player, u)
+
+    def vote_target(self, sim: SimGame, voter: Player, u: float) -> Optional[Player]:
+        if voter.role != Role.MAFIA:
+            suspects = [p for p in sim.game.get_alive_players() if p.user_id in sim.revealed]
+            if suspects:
+                return suspects[0]
+        return super().vote_target(sim, voter, u)
+
+
+STRATEGIES: Dict[str, Callable[[], Strategy]] = {"random": Strategy, "informed": InformedStrategy}
+
+
+def draw_matrix(rows: int, width: int, rng: random.Random, np_rng=None) -> List[List[float]]:
+    if np_rng is not None:
+        return np_rng.random((rows, width)).tolist()
+    r = rng.random
+    return [[r() for _ in range(width)] for _ in range(rows)]
+
+
+def play_round(sim: SimGame, strategy: Strategy, draws: List[float]) -> Optional[Side]:
+    """One night and one vote; ``draws`` has ``3 + players`` uniforms."""
+    game = sim.game
+    sim.rounds += 1
+    game.start_night()
+    mafia = game.get_mafia_players()
+    for player, u in ((mafia[0] if mafia else None, draws[0]),
+                      (next((p for p in game.players if p.alive and p.role == Role.DOCTOR), None), draws[1]),
+                      (next((p for p in game.players if p.alive and p.role == Role.DETECTIVE), None), draws[2])):
+        if player is not None:
+            target = strategy.night_target(sim, player, u)
+            if target is not None:
+                game.night_action(player, target)
+    night = game.resolve_night()
+    if night.checked is not None:
+        sim.checked[night.checked.user_id] = night.checked_is_mafia
+        if night.checked_is_mafia and any(p.alive and p.role == Role.DETECTIVE for p in game.players):
+            sim.revealed.add(night.checked.user_id)
+    side = game.winner()
+    if side is not None:
+        return side
+
+    game.start_day()
+    game.start_voting()
+    for i, voter in enumerate(game.get_alive_players()):
+        target = strategy.vote_target(sim, voter, draws[3 + i])
+        if target is not None:
+            game.cast_vote(voter.user_id, target.user_id)
+    game.resolve_vote()
+    return game.winner()
+
+
+def simulate(players: int, games: int, mafia: Optional[int] = None, strategy: str = "random",
+             seed: Optional[int] = None, batch: int = 4096) -> Dict[str, float]:
+    """Play ``games`` games of one configuration; returns win rates and the average length."""
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed) if np is not None else None
+    play = STRATEGIES[strategy]()
+    roles = deal_roles(players, mafia)
+    wins = {Side.MAFIA: 0, Side.TOWN: 0, None: 0}
+    rounds = 0
+    for start in range(0, games, batch):
+        active = []
+        for _ in range(min(batch, games - start)):
+            game = MafiaGame(0, [Player(i, str(i)) for i in range(players)])
+            game.start(roles, rng)
+            active.append(SimGame(game))
+        for _ in range(MAX_ROUNDS):
+            if not active:
+                break
+            still = []
+            for sim, draws in zip(active, draw_matrix(len(active), 3 + players, rng, np_rng)):
+                side = play_round(sim, play, draws)
+                if side is None:
+                    still.append(sim)
+                else:
+                    wins[side] += 1
+                    rounds += sim.rounds
+            active = still
+        wins[None] += len(active)  # не закончились за MAX_ROUNDS
+        rounds += sum(sim.rounds for sim in active)
+    return {
+        "games": games,
+        "mafia": wins[Side.MAFIA] / games,
+        "town": wins[Side.TOWN] / games,
+        "unfinished": wins[None] / games,
+        "rounds": rounds / games,
+    }
+
+
+def parse_range(raw: str) -> List[int]:
+    """``"8"``, ``"4-12"`` or ``"1,2,4"``."""
+    values: List[int] = []
+    for part in raw.split(","):
+        lo, _, hi = part.partition("-")
+        values.extend(range(int(lo), int(hi or lo) + 1))
+    return values
+
+
+def run(player_counts: Iterable[int], mafia_counts: Optional[List[int]], games: int, strategy: str,
+        seed: Optional[int], batch: int) -> None:
+    print(f"strategy={strategy} games={games} numpy={'yes' if np is not None else 'no'}")
+    print(f"{'players':>7} {'mafia':>5} {'mafia win':>9} {'town win':>8} {'rounds':>6}")
+    for players in player_counts:
+        for mafia in mafia_counts or [default_mafia_count(players)]:
+            try:
+                deal_roles(players, mafia)
+            except ValueError:
+                continue
+            started = time.perf_counter()
+            result = simulate(players, games, mafia, strategy, seed, batch)
+            elapsed = time.perf_counter() - started
+            print(f"{players:>7} {mafia:>5} {result['mafia']:>9.1%} {result['town']:>8.1%} {result['rounds']:>6.2f}"
+                  f"   ({games / elapsed:,.0f} games/s)")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Monte-Carlo balance benchmark for mafia role mixes")
+    parser.add_argument("--players", default="4-12", help="player counts: 8, 4-12 or 5,7,9")
+    parser.add_argument("--mafia", default=None, help="mafia counts to try (default: players // 3)")
+    parser.add_argument("--games", type=int, default=10000, help="games per configuration")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="random")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--batch", type=int, default=4096, help="games played in lockstep")
+    args = parser.parse_args(argv)
+    run(parse_range(args.players), parse_range(args.mafia) if args.mafia else None,
+        args.games, args.strategy, args.seed, args.batch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Движок крестиков-ноликов на битбордах.
+
+Поле — два 9-битных числа (клетки X и клетки O), бит ``i`` — клетка ``i = row * 3 + col``.
+Победа проверяется восемью заранее посчитанными масками, ход — парой битовых операций.
+"""
+from __future__ import annotations
+import random
+from typing import Iterator
+
+EMPTY_CELL = 0
+PLAYER_X = 1
+PLAYER_O = 2
+TIE = 3
+
+SIZE = 3
+CELLS = SIZE * SIZE
+FULL_MASK = (1 << CELLS) - 1
+
+# Все выигрышные линии: 3 строки, 3 столбца, 2 диагонали
+WIN_MASKS = tuple(
+    [0b111 << (r * 3) for r in range(3)]
+    + [0b001001001 << c for c in range(3)]
+    + [0b100010001, 0b001010100]
+)
+# Для каждой клетки — только линии через неё (проверка после хода)
+CELL_WIN_MASKS = tuple(tuple(m for m in WIN_MASKS if m >> pos & 1) for pos in range(CELLS))
+
+
+def has_line(bits: int) -> bool:
+    return any(bits & m == m for m in WIN_MASKS)
+
+
+class TicTacToeBoard:
+    """3×3 board stored as two bitboards."""
+
+    __slots__ = ("x", "o")
+
+    # общий интерфейс с games.kinarow.KInARowBoard
+    size = SIZE
+    k = SIZE
+    cells = CELLS
+
+    def __init__(self, x: int = 0, o: int = 0):
+        self.x = x
+        self.o = o
+
+    @property
+    def occupied(self) -> int:
+        return self.x | self.o
+
+    @property
+    def moves(self) -> int:
+        return bin(self.occupied).count("1")
+
+    @property
+    def turn(self) -> int:
+        """Symbol that moves next (X always starts)."""
+        return PLAYER_X if self.moves % 2 == 0 else PLAYER_O
+
+    @property
+    def key(self) -> tuple[int, int]:
+        return self.x, self.o
+
+    def cell(self, pos: int) -> int:
+        bit = 1 << pos
+        if self.x & bit:
+            return PLAYER_X
+        if self.o & bit:
+            return PLAYER_O
+        return EMPTY_CELL
+
+    def __iter__(self) -> Iterator[int]:
+        return (self.cell(pos) for pos in range(CELLS))
+
+    def is_free(self, pos: int) -> bool:
+        return 0 <= pos < CELLS and not (self.occupied >> pos) & 1
+
+    def free_cells(self) -> list[int]:
+        occ = self.occupied
+        return [pos for pos in range(CELLS) if not (occ >> pos) & 1]
+
+    def play(self, pos: int, symbol: int) -> int:
+        """Put ``symbol`` on ``pos`` and return the resulting state.
+
+        Returns the winning symbol, TIE, or EMPTY_CELL if the game goes on.
+        Only lines through ``pos`` are checked.
+        """
+        bit = 1 << pos
+        if symbol == PLAYER_X:
+            self.x |= bit
+            bits = self.x
+        else:
+            self.o |= bit
+            bits = self.o
+        if any(bits & m == m for m in CELL_WIN_MASKS[pos]):
+            return symbol
+        return TIE if self.occupied == FULL_MASK else EMPTY_CELL
+
+    def winner(self) -> int:
+        """Full-board check: winning symbol, TIE or EMPTY_CELL."""
+        if has_line(self.x):
+            return PLAYER_X
+        if has_line(self.o):
+            return PLAYER_O
+        return TIE if self.occupied == FULL_MASK else EMPTY_CELL
+
+    def copy(self) -> "TicTacToeBoard":
+        return TicTacToeBoard(self.x, self.o)
+
+    def __repr__(self) -> str:
+        marks = {EMPTY_CELL: ".", PLAYER_X: "X", PLAYER_O: "O"}
+        rows = ("".join(marks[self.cell(r * 3 + c)] for c in range(3)) for r in range(3))
+        return f"TicTacToeBoard({'/'.join(rows)})"
+
+
+# --- Игра против бота: таблица идеальной игры ---------------------------------
+
+# Сложность -> вероятность сделать лучший ход (иначе — случайный из остальных)
+DIFFICULTY_ACCURACY = {"easy": 0.35, "medium": 0.75, "hard": 1.0}
+DEFAULT_DIFFICULTY = "hard"
+
+_solution: dict[tuple[int, int], tuple[tuple[int, int], ...]] | None = None
+
+
+def _negamax(x: int, o: int, table: dict) -> int:
+    """Score for the side to move; faster wins score higher. Fills ``table``."""
+    key = (x, o)
+    cached = table.get(key)
+    if cached is not None:
+        return cached[0][1] if cached else 0
+    occ = x | o
+    moves_made = bin(occ).count("1")
+    to_move_x = moves_made % 2 == 0
+    own, other = (x, o) if to_move_x else (o, x)
+    scored = []
+    for pos in range(CELLS):
+        bit = 1 << pos
+        if occ & bit:
+            continue
+        mine = own | bit
+        if any(mine & m == m for m in CELL_WIN_MASKS[pos]):
+            score = CELLS + 1 - moves_made  # выиграли этим ходом
+        elif (occ | bit) == FULL_MASK:
+            score = 0
+        else:
+            nx, no = (mine, other) if to_move_x else (other, mine)
+            score = -_negamax(nx, no, table)
+        scored.append((pos, score))
+    scored.sort(key=lambda ms: -ms[1])
+    table[key] = tuple(scored)
+    return scored[0][1] if scored else 0
+
+
+def solve() -> dict[tuple[int, int], tuple[tuple[int, int], ...]]:
+    """Precompute (once) move scores for every reachable non-terminal position.
+
+    Maps ``(x_bits, o_bits)`` to ``((pos, score), ...)`` sorted best first.
+    """
+    global _solution
+    if _solution is None:
+        table: dict = {}
+        _negamax(0, 0, table)
+        _solution = table
+    return _solution
+
+
+def bot_move(board: TicTacToeBoard, difficulty: str = DEFAULT_DIFFICULTY, rng=None) -> int:
+    """Pick a move for the side to move in O(1) using the precomputed table."""
+    rng = rng or random
+    scored = solve()[board.key]
+    best = scored[0][1]
+    optimal = [pos for pos, score in scored if score == best]
+    others = [pos for pos, score in scored if score != best]
+    accuracy = DIFFICULTY_ACCURACY.get(difficulty, 1.0)
+    if others and rng.random() >= accuracy:
+        return rng.choice(others)
+    return rng.choice(optimal)
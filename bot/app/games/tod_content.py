@@ -0,0 +1,200 @@
+"""Каталог заданий «Правда или действие» — общий для бота и mini-app.
+
+Файл ``bot/truth_or_dare_content.json`` читается один раз в индекс по
+(тип × сложность × язык) и по тегам. Поддерживаются обе формы файла::
+
+    {"truths": ["...", ...], "dares": [...]}                      # плоские списки
+    {"truths": {"safe": [...], "spicy": [...], "risky": [...]}, ...}
+
+Элемент списка — строка или ``{"text": ..., "tags": [...], "lang": "ru"}``.
+
+Каждая игра держит свою колоду (``PromptDeck``): задания выдаются из перемешанной
+стопки без повторов, ``pop()`` — O(1); когда стопка кончается, она тасуется заново.
+Файл перечитывается при изменении mtime (проверка не чаще раза в ``check_interval``).
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TRUTH = "truth"
+DARE = "dare"
+KINDS = {TRUTH: "truths", DARE: "dares"}  # тип задания -> ключ в JSON
+DIFFICULTIES = ("safe", "spicy", "risky")
+ALL = "all"
+DEFAULT_DIFFICULTY = "safe"  # для плоских списков без уровней
+DEFAULT_LANG = "ru"
+
+CONTENT_FILE = Path(__file__).resolve().parents[2] / "truth_or_dare_content.json"
+
+# Если файла нет или он пустой
+FALLBACK = {
+    "truths": [
+        "Какой самый странный факт обо мне (по твоему)?",
+        "Чего ты сейчас боишься больше всего?",
+        "Что бы ты сделал(а), будь у тебя один свободный день без ограничений?",
+        "Какой самый бессмысленный предмет ты когда‑либо покупал(а)?",
+        "Что из последнего тебя реально насмешило?",
+    ],
+    "dares": [
+        "Сделай 10 приседаний и скажи 'я мощь'",
+        "Изобрази робота в своём следующем сообщении",
+        "Скажи любую фразу ЗЛЫМ шёпотом",
+        "Поставь любую смайлу и объясни почему именно она — философски",
+        "Напиши сообщение только эмодзи (минимум 5 штук)",
+    ],
+}
+
+
+@dataclass(frozen=True)
+class Prompt:
+    text: str
+    kind: str
+    difficulty: str
+    lang: str = DEFAULT_LANG
+    tags: FrozenSet[str] = frozenset()
+
+
+PoolKey = Tuple[str, str, Optional[str], Optional[str]]  # kind, difficulty, lang, tag
+
+
+class ContentCatalog:
+    """Immutable index of prompts; a reload builds a new catalog with a new version."""
+
+    def __init__(self, data: dict, version: int = 0):
+        self.version = version
+        self.prompts: List[Prompt] = []
+        for kind, key in KINDS.items():
+            section = data.get(key) or []
+            if isinstance(section, dict):
+                for difficulty, items in section.items():
+                    self._add(kind, difficulty, items or [])
+            else:
+                self._add(kind, DEFAULT_DIFFICULTY, section)
+        # готовые пулы для основных запросов: тип × сложность (+ «все») × язык
+        pools: Dict[PoolKey, List[int]] = {}
+        for i, p in enumerate(self.prompts):
+            for difficulty in (p.difficulty, ALL):
+                for lang in (p.lang, None):
+                    pools.setdefault((p.kind, difficulty, lang, None), []).append(i)
+        self._pools = {key: tuple(ids) for key, ids in pools.items()}
+
+    def _add(self, kind: str, difficulty: str, items: Iterable) -> None:
+        for item in items:
+            if isinstance(item, str):
+                prompt = Prompt(item, kind, difficulty)
+            elif isinstance(item, dict) and item.get("text"):
+                prompt = Prompt(item["text"], kind, item.get("difficulty", difficulty),
+                                item.get("lang", DEFAULT_LANG), frozenset(item.get("tags") or ()))
+            else:
+                continue
+            self.prompts.append(prompt)
+
+    def pool(self, kind: str, difficulty: str = ALL, lang: Optional[str] = None, tag: Optional[str] = None) -> Tuple[int, ...]:
+        """Prompt ids for a request; unknown difficulty means all of them."""
+        if difficulty != ALL and (kind, difficulty, None, None) not in self._pools:
+            difficulty = ALL
+        key = (kind, difficulty, lang, tag)
+        ids = self._pools.get(key)
+        if ids is None:
+            # запрос с тегом считаем один раз и кладём в тот же индекс
+            base = self._pools.get((kind, difficulty, lang, None), ())
+            ids = self._pools[key] = tuple(i for i in base if tag in self.prompts[i].tags)
+        return ids
+
+    def __len__(self) -> int:
+        return len(self.prompts)
+
+
+class PromptDeck:
+    """Per-game no-repeat draw piles, one per pool; picklable (lives inside the game)."""
+
+    __slots__ = ("version", "piles", "last")
+
+    def __init__(self):
+        self.version = -1
+        self.piles: Dict[PoolKey, List[int]] = {}
+        self.last: Dict[PoolKey, int] = {}
+
+    def draw(self, catalog: ContentCatalog, key: PoolKey, rng=random) -> Optional[Prompt]:
+        if self.version != catalog.version:
+            # каталог перечитан — id заданий поменялись, колоды собираем заново
+            self.version, self.piles, self.last = catalog.version, {}, {}
+        pile = self.piles.get(key)
+        if not pile:
+            ids = catalog.pool(*key)
+            if not ids:
+                return None
+            pile = self.piles[key] = list(ids)
+            rng.shuffle(pile)
+            if len(pile) > 1 and pile[-1] == self.last.get(key):
+                pile[0], pile[-1] = pile[-1], pile[0]  # новый круг не начинаем с только что выпавшего
+        prompt_id = pile.pop()
+        self.last[key] = prompt_id
+        return catalog.prompts[prompt_id]
+
+    def __getstate__(self):
+        return self.version, self.piles, self.last
+
+    def __setstate__(self, state):
+        self.version, self.piles, self.last = state
+
+
+class ContentService:
+    """Loads the catalog from ``path`` and reloads it when the file's mtime changes."""
+
+    def __init__(self, path: Path = CONTENT_FILE, check_interval: float = 2.0):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._checked = 0.0
+        self._catalog = ContentCatalog(FALLBACK, version=0)
+        self._reload()
+
+    def _reload(self) -> None:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        data = FALLBACK
+        if mtime is not None:
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                logger.exception("Cannot read %s, keeping the previous prompts", self.path)
+                return
+        catalog = ContentCatalog(data, version=self._catalog.version + 1)
+        if not catalog.prompts:
+            catalog = ContentCatalog(FALLBACK, version=catalog.version)
+        self._catalog, self._mtime = catalog, mtime
+        logger.info("Truth or dare prompts loaded: %d (v%d)", len(catalog), catalog.version)
+
+    @property
+    def catalog(self) -> ContentCatalog:
+        now = time.monotonic()
+        if now - self._checked >= self.check_interval:
+            with self._lock:
+                if now - self._checked >= self.check_interval:
+                    self._checked = now
+                    self._reload()
+        return self._catalog
+
+    def draw(self, deck: PromptDeck, kind: str, difficulty: str = ALL,
+             lang: Optional[str] = None, tag: Optional[str] = None) -> Optional[str]:
+        """Next prompt text from the game's deck (no repeats until the pool is exhausted)."""
+        prompt = deck.draw(self.catalog, (kind, difficulty, lang, tag))
+        return prompt.text if prompt else None
+
+
+tod_content = ContentService()
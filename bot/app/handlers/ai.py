@@ -5,6 +5,7 @@ import re
 import random
 import logging
 from app.config import load_config
+from ..utils.triggers import Trigger, triggers
 
 router = Router(name="ai")
 config = load_config()
@@ -37,7 +38,10 @@ MILANA_PATTERNS = [
     r".*милан[а|у|ой|е].*зачем.*",
 ]
 
-@router.message(lambda message: message.text and any(re.match(pattern, message.text.lower()) for pattern in MILANA_PATTERNS))
+triggers.regex("milana", *MILANA_PATTERNS)
+MILANA_NAME_RE = re.compile(r"милан[а|у|ой|е]", re.IGNORECASE)
+
+@router.message(Trigger("milana"))
 async def ai_milana(message: Message):
     try:
         # Get user info for personalized response
@@ -48,13 +52,8 @@ async def ai_milana(message: Message):
         user_text = message.text
 
         # Try to get a more specific request by removing the mention of Milana
-        request_text = user_text
-        for pattern in MILANA_PATTERNS:
-            match = re.match(pattern, user_text.lower())
-            if match:
-                # Try to get a cleaner request text
-                request_text = re.sub(r"милан[а|у|ой|е]", "", user_text, flags=re.IGNORECASE).strip()
-                break
+        # (фильтр Trigger("milana") уже гарантирует, что один из MILANA_PATTERNS совпал)
+        request_text = MILANA_NAME_RE.sub("", user_text).strip()
 
         # Get real AI response
         ai_response = get_ai_response(request_text, user_name)
@@ -1,9 +1,13 @@
 from __future__ import annotations
-from aiogram import Router, F
+from aiogram import Router
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import CommandStart, Command
+from ..utils.triggers import Trigger, triggers
+from ..middlewares import CallbackAck
+from ..utils.callbacks import CallbackData, CallbackRouter
 
 router = Router(name="basic")
+callbacks = CallbackRouter("help")
 
 @router.message(CommandStart())
 async def cmd_start(message: Message):
@@ -66,7 +70,8 @@ HELP_SECTIONS = {
     "games": {
         "title": "🎮 <b>Игры</b>",
         "text": (
-            "<b>/tictactoe</b> — крестики-нолики c ELO (старт 1000).\n"
+            "<b>/tictactoe</b> [N] [k] — крестики-нолики c ELO (старт 1000); поле N×N до 8×8, k в ряд — без рейтинга.\n"
+            "<b>/tictactoe_bot</b> [easy|medium|hard] — против бота (отдельный ELO по сложности).\n"
             "<b>/top_elo</b> — топ по ELO, <b>/top_level</b> — топ уровней.\n"
             "<b>ELO:</b> классическая формула ожидания + K=32 (примерно).\n"
             "📌 План: больше мини-игр, бустеры XP, сезонные сбросы." )
@@ -118,32 +123,26 @@ async def cmd_help(message: Message):
     text = render_help_section('main')
     await message.answer(text, parse_mode="HTML", reply_markup=build_help_keyboard('main'))
 
-@router.callback_query(F.data.startswith("help:"))
-async def help_callbacks(cb: CallbackQuery):
-    if not cb.data:
-        return await cb.answer()
-    parts = cb.data.split(":")
-    if len(parts) < 2:
-        return await cb.answer()
-    action = parts[1]
-    if action == 'close':
-        try:
-            await cb.message.edit_text("Закрыто.")
-        except Exception:
-            pass
-        return await cb.answer("Закрыто")
-    if action == 'sec':
-        if len(parts) < 3:
-            return await cb.answer()
-        key = parts[2]
-        text = render_help_section(key)
-        try:
-            await cb.message.edit_text(text, parse_mode="HTML", reply_markup=build_help_keyboard(key))
-        except Exception:
-            # fallback отправим новое сообщение
-            await cb.message.answer(text, parse_mode="HTML", reply_markup=build_help_keyboard(key))
-        return await cb.answer()
-    await cb.answer()
+@callbacks.action("close")
+async def help_close(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    await ack.answer("Закрыто")
+    try:
+        await cb.message.edit_text("Закрыто.")
+    except Exception:
+        pass
+
+@callbacks.action("sec")
+async def help_section(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    key = payload.arg(0)
+    if key is None:
+        return await ack.answer()
+    text = render_help_section(key)
+    await ack.answer()
+    try:
+        await cb.message.edit_text(text, parse_mode="HTML", reply_markup=build_help_keyboard(key))
+    except Exception:
+        # fallback отправим новое сообщение
+        await cb.message.answer(text, parse_mode="HTML", reply_markup=build_help_keyboard(key))
 
 @router.message(Command(commands=["ping"]))
 async def cmd_ping(message: Message):
@@ -169,7 +168,9 @@ async def cmd_echo(message: Message):
     else:
         await message.answer(text[1])
 
-@router.message(F.text.contains("бот"))
+triggers.keyword("bot_word", "бот")
+
+@router.message(Trigger("bot_word"))
 async def mention_react(message: Message):
     if message.from_user and not message.from_user.is_bot:
         try:
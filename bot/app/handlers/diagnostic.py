@@ -3,6 +3,9 @@ import os, logging
 from aiogram import Router
 from aiogram.types import Message
 from aiogram.filters import Command
+from ..utils.sessions import sessions
+from ..utils.game_clock import clock
+from ..utils.pending_input import pending_inputs
 
 router = Router(name="diagnostic")
 
@@ -14,6 +17,10 @@ async def cmd_diag(message: Message):
             safe_env[k] = os.environ[k]
     text = ["🩺 DIAG", f"chat={message.chat.id}", f"user={message.from_user.id}"]
     text.append(f"env={safe_env}")
+    for kind, st in sessions.stats().items():
+        text.append(f"sessions.{kind}: live={st['live']} ~{st['bytes'] // 1024}KB expired={st['expired']}")
+    text.append(f"clock={clock.stats()}")
+    text.append(f"pending_input={pending_inputs.stats()}")
     text.append("Если другие команды молчат, значит update не доходит до нужного роутера или бот не видит сообщения.")
     await message.answer("\n".join(text))
 
@@ -13,6 +13,7 @@ import asyncio
 from typing import Dict
 import math, json, re
 from .. import format_user_mention
+from ..utils.triggers import Trigger, triggers
 
 router = Router(name="drochka")
 
@@ -126,6 +127,7 @@ def init_db():
 	cur.execute('''CREATE TABLE IF NOT EXISTS daily_quests (user_id TEXT, date TEXT, code TEXT, progress INTEGER DEFAULT 0, target INTEGER DEFAULT 1, done INTEGER DEFAULT 0, PRIMARY KEY(user_id,date,code))''')
 	cur.execute('''CREATE TABLE IF NOT EXISTS weekly_progress (week_key TEXT PRIMARY KEY, total_actions INTEGER DEFAULT 0)''')
 	cur.execute('''CREATE TABLE IF NOT EXISTS weekly_participants (week_key TEXT, user_id TEXT, PRIMARY KEY(week_key,user_id))''')
+	cur.execute('''CREATE TABLE IF NOT EXISTS ttt_bot_stats (user_id TEXT, difficulty TEXT, username TEXT, elo INTEGER DEFAULT 1000, wins INTEGER DEFAULT 0, losses INTEGER DEFAULT 0, draws INTEGER DEFAULT 0, PRIMARY KEY(user_id,difficulty))''')
 	conn.commit(); conn.close()
 
 def load_data() -> Dict:
@@ -351,7 +353,9 @@ async def cmd_set_status(message:Message):
 @router.message(Command(commands=["дрочка","дрочить","drochka"]))
 async def cmd_drochka(message:Message): await perform_drochka(message)
 
-@router.message(lambda m: m.text and "дроч" in m.text.lower())
+triggers.keyword("droch", "дроч")
+
+@router.message(Trigger("droch"))
 async def word_droch(message:Message): await perform_drochka(message)
 
 @router.message(Command(commands=["статистика_дрочка","дрочка_статы","drochka_stats","drochka_stat","drochka_stats" ]))
@@ -424,6 +428,17 @@ def update_elo(user_id:str, opponent_id:str, result:float):
 	elif result==0: o['ttt_wins']=o.get('ttt_wins',0)+1; u['ttt_losses']=u.get('ttt_losses',0)+1
 	persist_user(user_id,u); persist_user(opponent_id,o)
 
+# Рейтинг против бота ведётся отдельно от PvP (elo_ttt) и по каждой сложности свой; у бота фиксированный рейтинг
+BOT_ELO={'easy':800,'medium':1100,'hard':1400}
+def update_bot_elo(user_id:str, username:str, difficulty:str, result:float)->int:
+	init_db(); conn=sqlite3.connect(DB_FILE); cur=conn.cursor()
+	cur.execute('INSERT OR IGNORE INTO ttt_bot_stats(user_id,difficulty,username) VALUES (?,?,?)',(user_id,difficulty,username))
+	cur.execute('SELECT elo FROM ttt_bot_stats WHERE user_id=? AND difficulty=?',(user_id,difficulty)); Ru=cur.fetchone()[0] or 1000
+	K=32; Rb=BOT_ELO.get(difficulty,1400); Eu=1/(1+10**((Rb-Ru)/400)); new_Ru=int(round(Ru+K*(result-Eu)))
+	col='wins' if result==1 else 'losses' if result==0 else 'draws'
+	cur.execute(f'UPDATE ttt_bot_stats SET elo=?, username=?, {col}={col}+1 WHERE user_id=? AND difficulty=?',(new_Ru,username,user_id,difficulty)); conn.commit(); conn.close()
+	return new_Ru
+
 async def check_breaks_and_notify(bot):
 	while True:
 		try:
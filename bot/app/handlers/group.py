@@ -4,6 +4,8 @@ from aiogram import Router, F
 from aiogram.types import ChatMemberUpdated, Message
 from aiogram.filters import Command
 from aiogram.exceptions import TelegramBadRequest
+from ..utils.triggers import Trigger, triggers
+from ..utils.user_cache import users
 
 router = Router(name="group")
 logger = logging.getLogger(__name__)
@@ -34,7 +36,10 @@ async def cmd_groupinfo(message: Message):
     )
 
 # Дополнительный триггер если privacy отключён
-@router.message(F.chat.type.in_({"group", "supergroup"}) & F.text.lower().contains("бот"))
+triggers.keyword("bot_word", "бот")
+triggers.exact("zov", "зов")
+
+@router.message(F.chat.type.in_({"group", "supergroup"}), Trigger("bot_word"))
 async def react_on_word(message: Message):
     try:
         # Get all chat members and mention them
@@ -47,14 +52,14 @@ async def react_on_word(message: Message):
         # Fallback to @all
         await message.reply("сука быстрее все сюда нахуй @all")
 
-@router.message(lambda message: message.text and message.text.lower() == "зов")
+@router.message(Trigger("zov"))
 async def cmd_zov(message: Message):
     if message.chat.type not in {"group", "supergroup"}:
         return
     
     try:
-        # Получаем список администраторов чата
-        admins = await message.bot.get_chat_administrators(message.chat.id)
+        # Получаем список администраторов чата (из общего кэша, запрос к API — не чаще раза в 10 минут)
+        admins = await users.chat_admins(message.bot, message.chat.id)
         mentions = []
         
         for admin in admins:
@@ -80,7 +85,7 @@ async def cmd_zov(message: Message):
         logger.error(f"TelegramBadRequest in zov command: {e}")
         try:
             # Резервный вариант: отправка без HTML с обычными упоминаниями
-            admins = await message.bot.get_chat_administrators(message.chat.id)
+            admins = await users.chat_admins(message.bot, message.chat.id)
             plain_mentions = []
             
             for admin in admins:
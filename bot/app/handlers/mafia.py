@@ -1,212 +1,240 @@
 from __future__ import annotations
-import asyncio
+import os
+import time
 from aiogram import Router, Bot
-from aiogram.types import Message
+from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
-import random
+from aiogram.utils.keyboard import InlineKeyboardBuilder
 from typing import Dict, List, Optional
-from dataclasses import dataclass
-from enum import Enum
 from .. import format_user_mention, format_user_mention_from_id
+from ..games.mafia_engine import (
+    GamePhase, Role, Player, MafiaGame, NIGHT_ACTIONS, MIN_PLAYERS, deal_roles,
+)
+from ..utils.sessions import SessionStore
+from ..utils.snapshots import on_restore
+from ..utils.game_clock import clock
+from ..utils.broadcast import send_many
+from ..utils.callbacks import CallbackData, CallbackRouter
+from ..middlewares import CallbackAck, register_key_resolver
 
 router = Router(name="mafia")
-
-class GamePhase(Enum):
-    WAITING = "ожидание"
-    NIGHT = "ночь"
-    DAY = "день"
-    VOTING = "голосование"
-    ENDED = "завершена"
-
-class Role(Enum):
-    MAFIA = "мафия"
-    CIVILIAN = "мирный"
-    DETECTIVE = "детектив"
-    DOCTOR = "доктор"
-
-@dataclass
-class Player:
-    user_id: int
-    username: str
-    role: Optional[Role] = None
-    alive: bool = True
-    vote_count: int = 0  # for voting
-
-@dataclass
-class MafiaGame:
-    chat_id: int
-    players: List[Player]
-    phase: GamePhase = GamePhase.WAITING
-    night_actions: Dict[str, Optional[int]] = None  # mafia_kill, doctor_heal, detective_check
-    day_votes: Dict[int, int] = None  # voter_id -> target_id
-    night_timer: Optional[asyncio.Task] = None
-    day_timer: Optional[asyncio.Task] = None
-
-    def __post_init__(self):
-        if self.night_actions is None:
-            self.night_actions = {"mafia_kill": None, "doctor_heal": None, "detective_check": None}
-        if self.day_votes is None:
-            self.day_votes = {}
-
-    def get_alive_players(self) -> List[Player]:
-        return [p for p in self.players if p.alive]
-
-    def get_mafia_players(self) -> List[Player]:
-        return [p for p in self.get_alive_players() if p.role == Role.MAFIA]
-
-    def get_civilian_players(self) -> List[Player]:
-        return [p for p in self.get_alive_players() if p.role != Role.MAFIA]
-
-    def check_win_condition(self) -> Optional[str]:
-        alive = self.get_alive_players()
-        mafia_count = len([p for p in alive if p.role == Role.MAFIA])
-        civilian_count = len(alive) - mafia_count
-
-        if mafia_count == 0:
-            return "Мирные жители победили!"
-        elif mafia_count >= civilian_count:
-            return "Мафия победила!"
-        return None
-
-games: Dict[int, MafiaGame] = {}
+callbacks = CallbackRouter("mafia")
+
+def _env_seconds(name: str, default: int) -> int:
+    raw = os.getenv(name, "")
+    return int(raw) if raw.isdigit() and int(raw) > 0 else default
+
+# Длительности фаз (сек.), настраиваются через .env
+NIGHT_DURATION = _env_seconds("MAFIA_NIGHT_SECONDS", 60)
+DAY_DURATION = _env_seconds("MAFIA_DAY_SECONDS", 120)
+VOTING_DURATION = _env_seconds("MAFIA_VOTE_SECONDS", 60)
+
+# user_id -> chat_id игры, в которой он участвует (команды ночью идут из ЛС)
+player_games: Dict[int, int] = {}
+
+GAME_TTL = 30 * 60  # без команд игроков полчаса — игра брошена
+
+async def _game_expired(bot: Bot, chat_id: int, game: MafiaGame):
+    # таймер фазы иначе продолжил бы крутить ночь/день без игроков
+    clock.cancel(game.clock_key)
+    game.phase = GamePhase.ENDED
+    release_players(game)
+    try:
+        await bot.send_message(chat_id, "⌛ Игра в мафию завершена: слишком долго не было активности.")
+    except Exception:
+        pass
+
+games: Dict[int, MafiaGame] = SessionStore("mafia", GAME_TTL, on_expire=_game_expired)
+
+def release_players(game: MafiaGame):
+    for player in game.players:
+        if player_games.get(player.user_id) == game.chat_id:
+            del player_games[player.user_id]
+
+def finish_game(game: MafiaGame):
+    clock.cancel(game.clock_key)
+    game.phase = GamePhase.ENDED
+    games.pop(game.chat_id, None)
+    release_players(game)
+
+def game_of(message: Message) -> Optional[MafiaGame]:
+    """Game for a command: the group's own game, or (in DM) the game the sender plays in"""
+    chat_id = message.chat.id
+    if message.chat.type == "private":
+        chat_id = player_games.get(message.from_user.id)
+    return games.get(chat_id) if chat_id is not None else None
+
+@register_key_resolver
+def _player_dm_lane(update, data):
+    # ночные действия из ЛС и кнопки в ЛС меняют игру в группе — в очередь этой группы
+    msg = update.message
+    if msg and msg.chat.type == 'private' and msg.from_user and msg.from_user.id in player_games:
+        return player_games[msg.from_user.id]
+    cb = update.callback_query
+    if cb and cb.data and cb.data.startswith("mafia:night:"):
+        payload = cb.data.split(":")
+        return int(payload[2]) if len(payload) > 2 and payload[2].lstrip('-').isdigit() else None
+    return None
+
+def targets_keyboard(action: str, targets: List[Player], chat_id: Optional[int] = None):
+    """Inline buttons with player names — works for players without @username"""
+    kb = InlineKeyboardBuilder()
+    for p in targets:
+        data = f"mafia:{action}:{chat_id}:{p.user_id}" if chat_id is not None else f"mafia:{action}:{p.user_id}"
+        kb.button(text=p.username, callback_data=data)
+    kb.adjust(2)
+    return kb.as_markup()
+
+def night_targets(game: MafiaGame, player: Player) -> List[Player]:
+    if player.role == Role.MAFIA:
+        return [p for p in game.players if p.alive and p.role != Role.MAFIA]
+    if player.role == Role.DETECTIVE:
+        return [p for p in game.players if p.alive and p is not player]
+    return [p for p in game.players if p.alive]
 
 async def start_night_phase(bot: Bot, game: MafiaGame):
-    game.phase = GamePhase.NIGHT
-    game.night_actions = {"mafia_kill": None, "doctor_heal": None, "detective_check": None}
+    game.start_night()
 
     alive = game.get_alive_players()
     mafia_list = "\n".join([format_user_mention_from_id(p.user_id, p.username) for p in game.get_mafia_players()])
 
-    # Send night instructions
-    for player in alive:
-        if player.role == Role.MAFIA:
-            await bot.send_message(player.user_id, f"🌃 Ночь наступила!\n\nВы мафия. Ваши союзники:\n{mafia_list}\n\nВыберите жертву: /kill_mafia @username")
-        elif player.role == Role.DOCTOR:
-            await bot.send_message(player.user_id, "🌃 Ночь наступила!\n\nВы доктор. Выберите кого лечить: /heal_mafia @username")
-        elif player.role == Role.DETECTIVE:
-            await bot.send_message(player.user_id, "🌃 Ночь наступила!\n\nВы детектив. Выберите кого проверить: /check_mafia @username")
+    # Send night instructions (all DMs at once, under the bot's rate limit)
+    night_texts = {
+        Role.MAFIA: f"🌃 Ночь наступила!\n\nВы мафия. Ваши союзники:\n{mafia_list}\n\nВыберите жертву кнопкой или: /kill_mafia @username",
+        Role.DOCTOR: "🌃 Ночь наступила!\n\nВы доктор. Выберите кого лечить кнопкой или: /heal_mafia @username",
+        Role.DETECTIVE: "🌃 Ночь наступила!\n\nВы детектив. Выберите кого проверить кнопкой или: /check_mafia @username",
+    }
+    messages = []
+    for p in alive:
+        if p.role in NIGHT_ACTIONS:
+            messages.append((p.user_id, night_texts[p.role], {"reply_markup": targets_keyboard("night", night_targets(game, p), game.chat_id)}))
         else:
-            await bot.send_message(player.user_id, "🌃 Ночь наступила! Спите спокойно...")
+            messages.append((p.user_id, "🌃 Ночь наступила! Спите спокойно..."))
+    failed = await send_many(bot, messages)
+
+    await bot.send_message(game.chat_id, "🌃 Наступила ночь! Все действия выполняются в ЛС бота." + undelivered_note(game, failed))
 
-    await bot.send_message(game.chat_id, "🌃 Наступила ночь! Все действия выполняются в ЛС бота.")
+    # Start night timer
+    arm_phase(bot, game, NIGHT_DURATION)
 
-    # Start night timer (60 seconds)
-    game.night_timer = asyncio.create_task(night_timeout(bot, game))
+# Что происходит, когда истекает (или досрочно завершается) фаза
+PHASE_END = {}
 
-async def night_timeout(bot: Bot, game: MafiaGame):
-    await asyncio.sleep(60)  # 1 minute
-    await process_night_results(bot, game)
+def arm_phase(bot: Bot, game: MafiaGame, delay: float):
+    """Put the current phase's deadline on the shared game clock"""
+    game.phase_deadline = time.time() + delay
+    clock.schedule(game.clock_key, delay, end_phase, bot, game, game.phase)
+
+def finish_phase_early(game: MafiaGame):
+    """All actions are in — end the phase now instead of waiting for the timer"""
+    clock.fire_now(game.clock_key)
+
+async def end_phase(bot: Bot, game: MafiaGame, phase: GamePhase):
+    # фаза могла уже смениться (досрочное завершение) или игра — закончиться
+    if game.phase != phase or games.peek(game.chat_id) is not game:
+        return
+    await PHASE_END[phase](bot, game)
+
+def undelivered_note(game: MafiaGame, failed: Dict[int, Exception]) -> str:
+    """Group-chat note listing players whose DMs could not be delivered"""
+    if not failed:
+        return ""
+    mentions = ", ".join(format_user_mention_from_id(p.user_id, p.username) for p in game.players if p.user_id in failed)
+    return f"\n\n⚠️ Не удалось написать в ЛС: {mentions}. Откройте ЛС с ботом и нажмите /start."
 
 async def process_night_results(bot: Bot, game: MafiaGame):
-    if game.night_timer:
-        game.night_timer.cancel()
+    clock.cancel(game.clock_key)
 
-    actions = game.night_actions
-    alive = game.get_alive_players()
-    killed = actions.get("mafia_kill")
-    healed = actions.get("doctor_heal")
-    checked = actions.get("detective_check")
+    night = game.resolve_night()
 
     result_msg = "🌅 Ночь закончилась!\n\n"
+    failed = {}
 
     # Detective result
-    if checked is not None:
-        checked_player = next((p for p in alive if p.user_id == checked), None)
-        if checked_player:
-            is_mafia = checked_player.role == Role.MAFIA
-            detective = next((p for p in alive if p.role == Role.DETECTIVE), None)
-            if detective:
-                await bot.send_message(detective.user_id, f"🔍 Результат проверки: {checked_player.username} {'мафия' if is_mafia else 'не мафия'}")
-
-    # Killing logic
-    if killed is not None and killed != healed:
-        killed_player = next((p for p in alive if p.user_id == killed), None)
-        if killed_player:
-            killed_player.alive = False
-            result_msg += f"💀 Убит: {format_user_mention_from_id(killed_player.user_id, killed_player.username)}\n"
-        elif healed:
-            healed_player = next((p for p in alive if p.user_id == healed), None)
-            if healed_player:
-                result_msg += f"⚕️ Доктор вылечил: {format_user_mention_from_id(healed_player.user_id, healed_player.username)}\n"
+    if night.checked:
+        detective = next((p for p in game.players if p.alive and p.role == Role.DETECTIVE), None)
+        if detective:
+            failed = await send_many(bot, [(detective.user_id, f"🔍 Результат проверки: {night.checked.username} {'мафия' if night.checked_is_mafia else 'не мафия'}")])
+
+    if night.killed:
+        result_msg += f"💀 Убит: {format_user_mention_from_id(night.killed.user_id, night.killed.username)}\n"
+    elif night.saved:
+        result_msg += f"⚕️ Доктор вылечил: {format_user_mention_from_id(night.saved.user_id, night.saved.username)}\n"
 
     # Check win condition
     win_msg = game.check_win_condition()
     if win_msg:
         result_msg += f"\n{win_msg}"
-        game.phase = GamePhase.ENDED
+        finish_game(game)
     else:
         result_msg += "\n🏙️ Наступает день!"
         await start_day_phase(bot, game)
 
-    await bot.send_message(game.chat_id, result_msg)
+    await bot.send_message(game.chat_id, result_msg + undelivered_note(game, failed))
 
 async def start_day_phase(bot: Bot, game: MafiaGame):
-    game.phase = GamePhase.DAY
-    game.day_votes = {}
+    game.start_day()
 
     alive_list = "\n".join([f"{i+1}. {format_user_mention_from_id(p.user_id, p.username)}" for i, p in enumerate(game.get_alive_players())])
 
-    await bot.send_message(game.chat_id, f"🏙️ День наступил!\n\nЖивые игроки:\n{alive_list}\n\nОбсуждайте! Голосование начнется через 2 минуты.")
-
-    # Start day timer (2 minutes)
-    game.day_timer = asyncio.create_task(day_timeout(bot, game))
+    await bot.send_message(game.chat_id, f"🏙️ День наступил!\n\nЖивые игроки:\n{alive_list}\n\nОбсуждайте! Голосование начнется через {DAY_DURATION} сек.")
 
-async def day_timeout(bot: Bot, game: MafiaGame):
-    await asyncio.sleep(120)  # 2 minutes
-    await start_voting_phase(bot, game)
+    # Start day timer
+    arm_phase(bot, game, DAY_DURATION)
 
 async def start_voting_phase(bot: Bot, game: MafiaGame):
-    game.phase = GamePhase.VOTING
+    game.start_voting()
 
     alive = game.get_alive_players()
     if len(alive) <= 1:
         return
 
-    await bot.send_message(game.chat_id, "🗳️ Голосование за казнь!\n\nГолосуйте: /vote @username\n\nУ вас 1 минута!")
-
-    await asyncio.sleep(60)  # 1 minute voting
-    await process_voting_results(bot, game)
-
-async def process_voting_results(bot: Bot, game: MafiaGame):
-    if game.day_timer:
-        game.day_timer.cancel()
+    await bot.send_message(
+        game.chat_id,
+        f"🗳️ Голосование за казнь!\n\nГолосуйте кнопкой, ответом /vote на сообщение игрока или /vote @username (или имя игрока)\n\nУ вас {VOTING_DURATION} сек.!",
+        reply_markup=targets_keyboard("vote", alive)
+    )
 
-    # Count votes
-    vote_counts = {}
-    for target_id in game.day_votes.values():
-        vote_counts[target_id] = vote_counts.get(target_id, 0) + 1
+    arm_phase(bot, game, VOTING_DURATION)
 
-    if not vote_counts:
-        await bot.send_message(game.chat_id, "🗳️ Никто не проголосовал. Ночь наступает...")
-        await start_night_phase(bot, game)
+@on_restore("mafia")
+def resume_game(bot: Bot, chat_id: int, game: MafiaGame):
+    """After a restart: rebuild the player index and re-arm the running phase with the time it had left"""
+    for player in game.players:
+        player_games[player.user_id] = chat_id
+    if game.phase_deadline is None or game.phase not in PHASE_END:
         return
+    arm_phase(bot, game, max(0.0, game.phase_deadline - time.time()))
 
-    # Find player with most votes
-    max_votes = max(vote_counts.values())
-    candidates = [pid for pid, votes in vote_counts.items() if votes == max_votes]
+async def process_voting_results(bot: Bot, game: MafiaGame):
+    clock.cancel(game.clock_key)
 
-    if len(candidates) > 1:
-        await bot.send_message(game.chat_id, "🗳️ Ничья в голосовании. Ночь наступает...")
+    vote = game.resolve_vote()
+    if vote.executed is None:
+        text = "🗳️ Ничья в голосовании. Ночь наступает..." if vote.tie else "🗳️ Никто не проголосовал. Ночь наступает..."
+        await bot.send_message(game.chat_id, text)
         await start_night_phase(bot, game)
         return
 
-    executed_id = candidates[0]
-    executed_player = next((p for p in game.get_alive_players() if p.user_id == executed_id), None)
+    executed = vote.executed
+    result_msg = f"⚔️ Казнен: {format_user_mention_from_id(executed.user_id, executed.username)}\n"
+    result_msg += f"Он был: {executed.role.value}\n\n"
 
-    if executed_player:
-        executed_player.alive = False
-        result_msg = f"⚔️ Казнен: {format_user_mention_from_id(executed_player.user_id, executed_player.username)}\n"
-        result_msg += f"Он был: {executed_player.role.value}\n\n"
+    win_msg = game.check_win_condition()
+    if win_msg:
+        result_msg += win_msg
+        finish_game(game)
+    else:
+        result_msg += "🌃 Ночь наступает..."
+        await start_night_phase(bot, game)
 
-        win_msg = game.check_win_condition()
-        if win_msg:
-            result_msg += win_msg
-            game.phase = GamePhase.ENDED
-        else:
-            result_msg += "🌃 Ночь наступает..."
-            await start_night_phase(bot, game)
+    await bot.send_message(game.chat_id, result_msg)
 
-        await bot.send_message(game.chat_id, result_msg)
+PHASE_END.update({
+    GamePhase.NIGHT: process_night_results,
+    GamePhase.DAY: start_voting_phase,
+    GamePhase.VOTING: process_voting_results,
+})
 
 @router.message(Command(commands=["mafia"]))
 async def cmd_mafia(message: Message):
@@ -221,6 +249,9 @@ async def cmd_mafia(message: Message):
     )
     await message.answer(text)
 
+def new_player(user) -> Player:
+    return Player(user.id, user.username or user.first_name or "Неизвестный", tg_username=user.username)
+
 @router.message(Command(commands=["mafia_start"]))
 async def cmd_mafia_start(message: Message):
     if message.chat.type not in {"group", "supergroup"}:
@@ -231,9 +262,12 @@ async def cmd_mafia_start(message: Message):
         return await message.answer("🎭 Игра уже идет в этом чате!")
 
     user = message.from_user
-    player = Player(user.id, user.username or "Неизвестный")
+    if user.id in player_games:
+        return await message.answer("🎭 Вы уже участвуете в игре в другом чате!")
+    player = new_player(user)
     game = MafiaGame(chat_id, [player])
     games[chat_id] = game
+    player_games[user.id] = chat_id
 
     player_mention = format_user_mention_from_id(player.user_id, player.username)
     await message.answer(
@@ -251,11 +285,16 @@ async def cmd_join_mafia(message: Message):
 
     game = games[chat_id]
     user = message.from_user
-    if any(p.user_id == user.id for p in game.players):
+    if user.id in game.by_id:
         return await message.answer("🎭 Вы уже в игре!")
-
-    player = Player(user.id, user.username or "Неизвестный")
-    game.players.append(player)
+    if game.phase != GamePhase.WAITING:
+        return await message.answer("🎭 Игра уже началась!")
+    if user.id in player_games:
+        return await message.answer("🎭 Вы уже участвуете в игре в другом чате!")
+
+    player = new_player(user)
+    game.add_player(player)
+    player_games[user.id] = chat_id
     player_mention = format_user_mention_from_id(player.user_id, player.username)
     await message.answer(f"🎭 {player_mention} присоединился к игре! Игроков: {len(game.players)}")
 
@@ -266,125 +305,124 @@ async def cmd_start_game_mafia(message: Message):
         return await message.answer("🎭 Нет активной игры.")
 
     game = games[chat_id]
-    if len(game.players) < 4:
-        return await message.answer("🎭 Нужно минимум 4 игрока!")
-
-    # Распределение ролей
-    roles = [Role.MAFIA] * (len(game.players) // 3) + [Role.CIVILIAN] * (len(game.players) - len(game.players) // 3 - 2) + [Role.DETECTIVE, Role.DOCTOR]
-    random.shuffle(roles)
+    if game.phase != GamePhase.WAITING:
+        return await message.answer("🎭 Игра уже идет!")
+    if len(game.players) < MIN_PLAYERS:
+        return await message.answer(f"🎭 Нужно минимум {MIN_PLAYERS} игрока!")
 
-    for i, player in enumerate(game.players):
-        player.role = roles[i]
+    game.start(deal_roles(len(game.players)))
 
     await message.answer("🎭 Роли розданы! Игра начинается...")
 
     # Start night phase
     await start_night_phase(message.bot, game)
 
-@router.message(Command(commands=["kill_mafia"]))
-async def cmd_kill_mafia(message: Message):
-    chat_id = message.chat.id
-    if chat_id not in games or games[chat_id].phase != GamePhase.NIGHT:
+def parse_target(game: MafiaGame, message: Message) -> Optional[Player]:
+    """Target from a reply, '@username' / name or the number in the day's list of alive players"""
+    reply = message.reply_to_message
+    if reply and reply.from_user and reply.from_user.id in game.by_id:
+        return game.alive_player(reply.from_user.id)
+    args = (message.text or "").split()
+    if len(args) < 2:
+        return None
+    if args[1].isdigit():
+        alive = game.get_alive_players()
+        index = int(args[1]) - 1
+        return alive[index] if 0 <= index < len(alive) else None
+    # имя может быть из нескольких слов: сначала первое слово, затем весь остаток
+    return game.alive_by_username(args[1]) or (game.alive_by_username(" ".join(args[1:])) if len(args) > 2 else None)
+
+async def night_command(message: Message, role: Role, usage: str):
+    game = game_of(message)
+    if game is None or game.phase != GamePhase.NIGHT:
         return
 
-    game = games[chat_id]
-    user = message.from_user
-    player = next((p for p in game.players if p.user_id == user.id), None)
-
-    if not player or not player.alive or player.role != Role.MAFIA:
+    player = game.by_id.get(message.from_user.id)
+    if not player or not player.alive or player.role != role:
         return await message.answer("❌ Вы не можете использовать эту команду!")
 
-    # Parse target
-    args = message.text.split()
-    if len(args) < 2:
-        return await message.answer("Использование: /kill_mafia @username")
-
-    target_username = args[1].lstrip('@')
-    target = next((p for p in game.get_alive_players() if p.username.lower() == target_username.lower()), None)
-
+    if len((message.text or "").split()) < 2 and not message.reply_to_message:
+        return await message.answer(f"Использование: {usage}")
+    target = parse_target(game, message)
     if not target:
         return await message.answer("❌ Игрок не найден!")
 
-    if target.role == Role.MAFIA:
-        return await message.answer("❌ Нельзя убивать своих!")
-
-    game.night_actions["mafia_kill"] = target.user_id
+    error = game.night_action(player, target, role)
+    if error:
+        return await message.answer(error)
     await message.answer("✅ Выбор сделан!")
+    if game.night_actions_complete():
+        finish_phase_early(game)
+
+@router.message(Command(commands=["kill_mafia"]))
+async def cmd_kill_mafia(message: Message):
+    await night_command(message, Role.MAFIA, "/kill_mafia @username")
 
 @router.message(Command(commands=["heal_mafia"]))
 async def cmd_heal_mafia(message: Message):
-    chat_id = message.chat.id
-    if chat_id not in games or games[chat_id].phase != GamePhase.NIGHT:
-        return
-
-    game = games[chat_id]
-    user = message.from_user
-    player = next((p for p in game.players if p.user_id == user.id), None)
-
-    if not player or not player.alive or player.role != Role.DOCTOR:
-        return await message.answer("❌ Вы не можете использовать эту команду!")
-
-    args = message.text.split()
-    if len(args) < 2:
-        return await message.answer("Использование: /heal_mafia @username")
-
-    target_username = args[1].lstrip('@')
-    target = next((p for p in game.get_alive_players() if p.username.lower() == target_username.lower()), None)
-
-    if not target:
-        return await message.answer("❌ Игрок не найден!")
-
-    game.night_actions["doctor_heal"] = target.user_id
-    await message.answer("✅ Выбор сделан!")
+    await night_command(message, Role.DOCTOR, "/heal_mafia @username")
 
 @router.message(Command(commands=["check_mafia"]))
 async def cmd_check_mafia(message: Message):
-    chat_id = message.chat.id
-    if chat_id not in games or games[chat_id].phase != GamePhase.NIGHT:
-        return
-
-    game = games[chat_id]
-    user = message.from_user
-    player = next((p for p in game.players if p.user_id == user.id), None)
-
-    if not player or not player.alive or player.role != Role.DETECTIVE:
-        return await message.answer("❌ Вы не можете использовать эту команду!")
-
-    args = message.text.split()
-    if len(args) < 2:
-        return await message.answer("Использование: /check_mafia @username")
-
-    target_username = args[1].lstrip('@')
-    target = next((p for p in game.get_alive_players() if p.username.lower() == target_username.lower()), None)
-
-    if not target:
-        return await message.answer("❌ Игрок не найден!")
-
-    game.night_actions["detective_check"] = target.user_id
-    await message.answer("✅ Выбор сделан!")
+    await night_command(message, Role.DETECTIVE, "/check_mafia @username")
+
+@callbacks.action("night")
+async def mafia_night_button(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    game = games.get(payload.int_arg(0))
+    if game is None:
+        return await ack.answer("Игра уже закончилась", show_alert=True)
+    target = game.alive_player(payload.int_arg(1))
+    if target is None:
+        return await ack.answer("❌ Игрок не найден!", show_alert=True)
+    error = game.night_action(game.by_id.get(cb.from_user.id), target)
+    if error:
+        return await ack.answer(error, show_alert=True)
+    await ack.answer("✅ Выбор сделан!")
+    if game.night_actions_complete():
+        finish_phase_early(game)
+    try:
+        await cb.message.edit_text(f"{cb.message.text}\n\n✅ Ваш выбор: {target.username}")
+    except Exception:
+        pass
+
+def cast_vote(game: MafiaGame, voter_id: int, target: Player) -> Optional[str]:
+    voter = game.alive_player(voter_id)
+    if not voter:
+        return "❌ Вы не можете голосовать!"
+    game.cast_vote(voter_id, target.user_id)
+    return None
 
 @router.message(Command(commands=["vote"]))
 async def cmd_vote(message: Message):
-    chat_id = message.chat.id
-    if chat_id not in games or games[chat_id].phase != GamePhase.VOTING:
+    game = games.get(message.chat.id)
+    if game is None or game.phase != GamePhase.VOTING:
         return
 
-    game = games[chat_id]
-    user = message.from_user
-    player = next((p for p in game.players if p.user_id == user.id), None)
-
-    if not player or not player.alive:
+    if not game.alive_player(message.from_user.id):
         return await message.answer("❌ Вы не можете голосовать!")
 
-    args = message.text.split()
-    if len(args) < 2:
-        return await message.answer("Использование: /vote @username")
-
-    target_username = args[1].lstrip('@')
-    target = next((p for p in game.get_alive_players() if p.username.lower() == target_username.lower()), None)
-
+    if len((message.text or "").split()) < 2 and not message.reply_to_message:
+        return await message.answer("Использование: /vote @username или имя (или ответом на сообщение игрока)")
+    target = parse_target(game, message)
     if not target:
         return await message.answer("❌ Игрок не найден!")
 
-    game.day_votes[user.id] = target.user_id
-    await message.answer("✅ Ваш голос учтен!")
\ No newline at end of file
+    cast_vote(game, message.from_user.id, target)
+    await message.answer("✅ Ваш голос учтен!")
+    if game.all_voted():
+        finish_phase_early(game)
+
+@callbacks.action("vote")
+async def mafia_vote_button(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    game = games.get(cb.message.chat.id) if cb.message else None
+    if game is None or game.phase != GamePhase.VOTING:
+        return await ack.answer("Голосование уже закончилось", show_alert=True)
+    target = game.alive_player(payload.int_arg(0))
+    if target is None:
+        return await ack.answer("❌ Игрок не найден!", show_alert=True)
+    error = cast_vote(game, cb.from_user.id, target)
+    if error:
+        return await ack.answer(error, show_alert=True)
+    await ack.answer(f"✅ Голос за {target.username} учтен!")
+    if game.all_voted():
+        finish_phase_early(game)
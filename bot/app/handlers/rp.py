@@ -2,6 +2,7 @@ from __future__ import annotations
 from aiogram import Router
 from aiogram.types import Message
 import random
+from ..utils.triggers import Trigger, triggers
 
 router = Router(name="rp")
 
@@ -19,7 +20,9 @@ RP_ACTIONS = {
     "порно": "снялся в порно с"
 }
 
-@router.message(lambda message: message.text and message.text.lower() in RP_ACTIONS.keys())
+triggers.exact("rp", *RP_ACTIONS)
+
+@router.message(Trigger("rp"))
 async def rp_action(message: Message):
     # Get the action that was used
     action = message.text.lower()
@@ -1,50 +1,87 @@
 from __future__ import annotations
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 from aiogram import Router, Bot
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.filters import Command
-from .drochka import update_elo
+from .drochka import update_elo, update_bot_elo
+from ..middlewares import CallbackAck, register_key_resolver
+from ..utils.callbacks import CallbackData, CallbackRouter
+from ..utils.user_cache import users
+from ..utils.sessions import SessionStore
+from ..utils.snapshots import on_restore
+from ..games.tictactoe import (EMPTY_CELL, PLAYER_X, PLAYER_O, TIE, TicTacToeBoard,
+                               DEFAULT_DIFFICULTY, DIFFICULTY_ACCURACY, bot_move, solve)
+from ..games.kinarow import KInARowBoard, MIN_SIZE, MAX_SIZE, default_k, encode_pos, decode_pos
 
 router = Router(name="tictactoe")
+callbacks = CallbackRouter("ttt")
 
-# Constants for game symbols
-EMPTY_CELL = 0
-PLAYER_X = 1
-PLAYER_O = 2
-TIE = 3
+GAME_TTL = 15 * 60  # партия без ходов 15 минут считается брошенной
+
+async def _game_expired(bot: Bot, key, game: dict):
+    """Abandoned game: free the players and close the board message"""
+    release_players(key, game)
+    try:
+        await bot.edit_message_text("⌛ Игра закрыта: слишком долго не было ходов.",
+                                    chat_id=key[0], message_id=key[1], reply_markup=None)
+    except Exception:
+        pass  # сообщение могли удалить
 
 # Game state storage (in a real application, you would use a database)
-active_games = {}  # Stores active games by chat_id
+# Игра = сообщение с полем: ключ (chat_id, message_id), поэтому в одном чате
+# может идти сколько угодно партий одновременно; TTL продлевается каждым ходом
+GameKey = Tuple[int, int]
+active_games: Dict[GameKey, dict] = SessionStore("tictactoe", GAME_TTL, on_expire=_game_expired)
+# user_id -> ключ игры, в которой он сейчас участвует (не больше одной)
+player_games: Dict[int, GameKey] = {}
 
 # Game state storage (in a real application, you would use a database)
-game_invites = {}  # Stores game invite info
+game_invites = SessionStore("tictactoe_invites", GAME_TTL)  # Stores game invite info
 
-def create_board(board_state):
-    """Create an inline keyboard for the Tic Tac Toe board"""
-    builder = InlineKeyboardBuilder()
-    
-    # Add visual styling to the board
-    # Create each row separately to ensure proper layout
-    for i in range(3):  # rows
-        for j in range(3):  # columns
-            position = i * 3 + j
-            cell_value = board_state[position]
-            if cell_value == EMPTY_CELL:
-                builder.button(text="⬜", callback_data=f"ttt:move:{i}:{j}")
-            elif cell_value == PLAYER_X:
-                builder.button(text="❌", callback_data=f"ttt:move:{i}:{j}")
-            else:
-                builder.button(text="⭕", callback_data=f"ttt:move:{i}:{j}")
-    
-    # Set the layout to have 3 buttons per row for the board
-    builder.adjust(3, 3, 3) # 3 rows of 3 buttons each for the board
-    
+# Games against the bot: the bot always plays O, its "player id" is 0
+BOT_PLAYER = 0
+DIFFICULTY_LABELS = {"easy": "лёгкая", "medium": "средняя", "hard": "непобедимый бот"}
+
+# Perfect-play table for every reachable position is computed once, at import/startup
+solve()
+
+CELL_MARKS = {EMPTY_CELL: "⬜", PLAYER_X: "❌", PLAYER_O: "⭕"}
+
+def encode_gid(message_id: int) -> str:
+    """Compact game id for callback_data: the board message id in base 36"""
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    out = ""
+    while True:
+        message_id, rem = divmod(message_id, 36)
+        out = digits[rem] + out
+        if not message_id:
+            return out
+
+def decode_gid(gid: Optional[str]) -> Optional[int]:
+    try:
+        return int(gid, 36)
+    except (TypeError, ValueError):
+        return None
+
+def create_board(board, message_id: int):
+    """Inline keyboard for the board of the game in message ``message_id``"""
+    gid = encode_gid(message_id)
+    rows = [[InlineKeyboardButton(text=mark, callback_data=f"ttt:move:{gid}:{pos}") for mark, pos in row]
+            for row in _board_cells(board.size, board.x, board.o)]
     # Add game controls below the board
-    builder.button(text="🔄 Новая игра", callback_data="ttt:new")
-    builder.button(text="❌ Сдаться", callback_data="ttt:quit")
-    builder.adjust(3, 3, 3, 2)  # Layout: 3 rows of board + 2 control buttons
-    
-    return builder.as_markup()
+    rows.append([InlineKeyboardButton(text="🔄 Новая игра", callback_data="ttt:new"),
+                 InlineKeyboardButton(text="❌ Сдаться", callback_data=f"ttt:quit:{gid}")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+@lru_cache(maxsize=4096)  # от партии не зависит: одинаковые позиции в разных играх берут одни и те же ряды
+def _board_cells(size: int, x_bits: int, o_bits: int) -> Tuple[Tuple[Tuple[str, str], ...], ...]:
+    """Rows of (mark, cell index in base36 — ≤ 2 chars for 8×8) for the board state"""
+    def cell(position):
+        bit = 1 << position
+        return CELL_MARKS[PLAYER_X if x_bits & bit else PLAYER_O if o_bits & bit else EMPTY_CELL], encode_pos(position)
+    return tuple(tuple(cell(row * size + col) for col in range(size)) for row in range(size))
 
 def get_player_symbol(player_id, game):
     """Get the symbol (X or O) for a player"""
@@ -55,22 +92,11 @@ def get_player_symbol(player_id, game):
     return None
 
 async def get_user_name_by_id(bot, user_id):
-    """Get the user's display name by their ID with link"""
-    try:
-        user = await bot.get_chat_member(chat_id=user_id, user_id=user_id)
-        user_info = user.user
-        if user_info.first_name and user_info.last_name:
-            display_name = f"{user_info.first_name} {user_info.last_name}"
-        elif user_info.first_name:
-            display_name = user_info.first_name
-        elif user_info.username:
-            display_name = user_info.username
-        else:
-            display_name = f"Пользователь {user_info.id}"
-        
-        return f'<a href="tg://user?id={user_info.id}">{display_name}</a>'
-    except:
-        return f'<a href="tg://user?id={user_id}">Пользователь {user_id}</a>'
+    """Get the user's display name by their ID with link (cached, see utils.user_cache)"""
+    display_name = await users.display_name(bot, user_id)
+    if display_name is None:
+        display_name = f"Пользователь {user_id}"
+    return f'<a href="tg://user?id={user_id}">{display_name}</a>'
 
 def get_player_link(player_id):
     """Get a link to the player using Telegram's user linking feature"""
@@ -96,39 +122,149 @@ def get_player_mark(player_symbol):
         return "⭕"
     return " "
 
-def create_join_button(chat_id):
-    """Create a join game button"""
+def create_join_button():
+    """Create a join game button (the game is the message the button is attached to)"""
     builder = InlineKeyboardBuilder()
-    builder.button(text=" Играть в крестики-нолики", callback_data=f"ttt:join:{chat_id}")
+    builder.button(text=" Играть в крестики-нолики", callback_data="ttt:join")
     return builder.as_markup()
 
-def check_winner(board):
-    """Check if there's a winner on the board"""
-    # Check rows
-    for i in range(0, 9, 3):
-        if board[i] == board[i+1] == board[i+2] != EMPTY_CELL:
-            return board[i]
+def init_board(size: int = 3, k: int = 3):
+    """Initialize a new game board: classic 3×3 bitboards or a generic N×N k-in-a-row one"""
+    if size == 3 and k == 3:
+        return TicTacToeBoard()
+    return KInARowBoard(size, k)
+
+def parse_board_args(text: Optional[str]) -> Optional[Tuple[int, int]]:
+    """``/tictactoe [N] [k]`` -> (N, k); None if the arguments are invalid"""
+    args = (text or "").split()[1:]
+    try:
+        size = int(args[0]) if args else 3
+        k = int(args[1]) if len(args) > 1 else default_k(size)
+    except ValueError:
+        return None
+    if not (MIN_SIZE <= size <= MAX_SIZE and MIN_SIZE <= k <= size):
+        return None
+    return size, k
+
+def add_game(chat_id: int, message_id: int, game: dict):
+    game["chat_id"], game["message_id"] = chat_id, message_id
+    key = (chat_id, message_id)
+    active_games[key] = game
+    for player_id in (game["player_x"], game["player_o"]):
+        if player_id:  # None — место свободно, BOT_PLAYER (0) — бот
+            player_games[player_id] = key
+
+def end_game(game: dict):
+    key = (game["chat_id"], game["message_id"])
+    active_games.pop(key, None)
+    release_players(key, game)
+
+@on_restore("tictactoe")
+def _reindex_players(bot: Bot, key: GameKey, game: dict):
+    for player_id in (game["player_x"], game["player_o"]):
+        if player_id:
+            player_games[player_id] = key
+
+def release_players(key: GameKey, game: dict):
+    for player_id in (game["player_x"], game["player_o"]):
+        if player_id and player_games.get(player_id) == key:
+            del player_games[player_id]
+
+def find_game(callback: CallbackQuery, payload: CallbackData, gid_index: int = 0) -> Optional[dict]:
+    """Game for a board button: chat of the message + game id from callback_data"""
+    message_id = decode_gid(payload.arg(gid_index))
+    if message_id is None or callback.message is None:
+        return None
+    return active_games.get((callback.message.chat.id, message_id))
+
+@register_key_resolver
+def _game_lane(update, data):
+    # Кнопки разных партий одного чата не ждут друг друга — у каждой игры своя очередь
+    cb = update.callback_query
+    if cb and cb.data and cb.data.startswith("ttt:") and cb.message:
+        return ("ttt", cb.message.chat.id, cb.message.message_id)
+    return None
+
+BUSY_TEXT = "Вы уже участвуете в другой игре! Доиграйте или сдайтесь."
+
+@router.message(Command(commands=["tictactoe_bot", "ttt_bot"]))
+async def start_tictactoe_bot(message: Message):
+    """Start a single-player game against the bot: /tictactoe_bot [easy|medium|hard]"""
+    chat_id = message.chat.id
+    player_id = message.from_user.id
     
-    # Check columns
-    for i in range(3):
-        if board[i] == board[i+3] == board[i+6] != EMPTY_CELL:
-            return board[i]
+    if player_id in player_games:
+        await message.answer(BUSY_TEXT)
+        return
+    
+    args = (message.text or "").split()
+    difficulty = args[1].lower() if len(args) > 1 else DEFAULT_DIFFICULTY
+    if difficulty not in DIFFICULTY_ACCURACY:
+        await message.answer("Использование: /tictactoe_bot [easy|medium|hard]")
+        return
     
-    # Check diagonals
-    if board[0] == board[4] == board[8] != EMPTY_CELL:
-        return board[0]
-    if board[2] == board[4] == board[6] != EMPTY_CELL:
-        return board[2]
+    game = {
+        "board": init_board(),
+        "player_x": player_id,
+        "player_o": BOT_PLAYER,
+        "current_player": player_id,
+        "moves": 0,
+        "vs_bot": difficulty
+    }
     
-    # Check for tie
-    if EMPTY_CELL not in board:
-        return TIE  # Tie
+    player_name = await get_user_name_by_id(message.bot, player_id)
+    # id игры = id сообщения с полем, поэтому клавиатуру вешаем после отправки
+    sent = await message.answer(
+        f"🤖 {player_name} против бота (сложность: {DIFFICULTY_LABELS[difficulty]})\n\n"
+        "Вы ходите первым ❌"
+    )
+    add_game(chat_id, sent.message_id, game)
+    await sent.edit_reply_markup(reply_markup=create_board(game["board"], sent.message_id))
+
+async def play_vs_bot(callback: CallbackQuery, ack: CallbackAck, game: dict, position: int):
+    """Human move followed by an instant table lookup reply from the bot"""
+    player_id = game["player_x"]
+    board = game["board"]
+    difficulty = game["vs_bot"]
+    
+    winner = board.play(position, PLAYER_X)
+    game["moves"] += 1
+    if winner == EMPTY_CELL:
+        winner = board.play(bot_move(board, difficulty), PLAYER_O)
+        game["moves"] += 1
+    await ack.answer()
+    
+    player_name = await get_user_name_by_id(callback.bot, player_id)
+    if winner == EMPTY_CELL:
+        await callback.message.edit_text(
+            f"🤖 Ход #{game['moves'] + 1}\n"
+            f"Бот ответил ⭕\n"
+            f"Ходит {player_name} (❌)",
+            reply_markup=create_board(board, game["message_id"])
+        )
+        return
     
-    return EMPTY_CELL  # No winner yet
+    end_game(game)
+    await finish_bot_game(callback, game, 1 if winner == PLAYER_X else 0 if winner == PLAYER_O else 0.5, player_name)
 
-def init_board():
-    """Initialize a new game board"""
-    return [EMPTY_CELL] * 9  # 0 = empty, 1 = X, 2 = O
+async def finish_bot_game(callback: CallbackQuery, game: dict, result: float, player_name: str):
+    """Record the bot-game ELO (separate from PvP) and show the final message"""
+    user = callback.from_user
+    try:
+        elo = update_bot_elo(str(game["player_x"]), user.username or user.full_name or 'Аноним', game["vs_bot"], result)
+        elo_line = f"\nELO против бота ({DIFFICULTY_LABELS[game['vs_bot']]}): {elo}"
+    except Exception:
+        elo_line = ""
+    if result == 1:
+        head = f"🎉 Победа! 🎉\n{player_name} (❌) обыграл бота!"
+    elif result == 0:
+        head = f"🤖 Бот победил!\n{player_name}, попробуй ещё раз."
+    else:
+        head = f"🤝 Ничья! 🤝\n{player_name} и бот сыграли вничью!"
+    await callback.message.edit_text(
+        f"{head}\n\nСыграно ходов: {game['moves']}{elo_line}",
+        reply_markup=None
+    )
 
 @router.message(Command(commands=["tictactoe"]))
 async def start_tictactoe(message: Message, bot: Bot):
@@ -136,219 +272,233 @@ async def start_tictactoe(message: Message, bot: Bot):
     chat_id = message.chat.id
     player_id = message.from_user.id
     
-    # Check if there's already a game in this chat
-    if chat_id in active_games:
-        await message.answer("В этом чате уже идет игра! Дождитесь её окончания.")
+    # One game per player at a time (any number of games per chat)
+    if player_id in player_games:
+        await message.answer(BUSY_TEXT)
         return
     
-    # Create a new game
-    active_games[chat_id] = {
-        "board": init_board(),
+    board_args = parse_board_args(message.text)
+    if board_args is None:
+        await message.answer(
+            f"Использование: /tictactoe [N] [k] — поле N×N ({MIN_SIZE}–{MAX_SIZE}), "
+            f"победа за k в ряд ({MIN_SIZE}–N). Например: /tictactoe 5 4"
+        )
+        return
+    size, k = board_args
+    
+    # Create a new game (ELO only for the classic 3×3)
+    game = {
+        "board": init_board(size, k),
         "player_x": player_id,
         "player_o": None,
         "current_player": player_id,
         "moves": 0,
-        "chat_id": chat_id
+        "rated": size == 3
     }
     
     player_name = await get_user_name_by_id(message.bot, player_id)
+    variant = "" if size == 3 else f" (поле {size}×{size}, {k} в ряд)"
     
-    # Send message with join button
-    await message.answer(
-        f"🎮 {player_name} начал игру в крестики-нолики!\n"
+    # Send message with join button; this message becomes the board
+    sent = await message.answer(
+        f"🎮 {player_name} начал игру в крестики-нолики{variant}!\n"
         "Кто хочет сыграть против него?\n\n"
         "❌ - Создатель игры (X)\n"
         "⭕ - Свободно (O)\n\n"
         "Нажмите кнопку ниже, чтобы присоединиться к игре!",
-        reply_markup=create_join_button(chat_id)
+        reply_markup=create_join_button()
     )
+    add_game(chat_id, sent.message_id, game)
 
-@router.callback_query(lambda c: c.data and c.data.startswith("ttt:"))
-async def handle_tictactoe_callback(callback: CallbackQuery, bot):
-    """Handle all Tic Tac Toe callbacks"""
+@callbacks.action("join")
+async def ttt_join(callback: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    """Handle joining a game"""
     player_id = callback.from_user.id
-    chat_id = callback.message.chat.id
-    data_parts = callback.data.split(":")
-    action = data_parts[1]
+    bot = callback.bot
+    game = active_games.get((callback.message.chat.id, callback.message.message_id)) if callback.message else None
     
-    if action == "join":
-        # Handle joining a game
-        game_chat_id = int(data_parts[2])
-        
-        # Check if game still exists
-        if game_chat_id not in active_games:
-            await callback.answer("Игра больше не существует!", show_alert=True)
-            return
-            
-        game = active_games[game_chat_id]
-        
-        # Check if player is already in this game
-        if player_id in [game["player_x"], game["player_o"]]:
-            await callback.answer("Вы уже в этой игре!", show_alert=True)
-            return
-            
-        # Check if second player is already set
-        if game["player_o"] is not None:
-            await callback.answer("К игре уже присоединился другой игрок!", show_alert=True)
-            return
+    # Check if game still exists
+    if game is None:
+        await ack.answer("Игра больше не существует!", show_alert=True)
+        return
+    
+    # Check if player is already in this game
+    if player_id in [game["player_x"], game["player_o"]]:
+        await ack.answer("Вы уже в этой игре!", show_alert=True)
+        return
         
-        # Add player as O
-        game["player_o"] = player_id
+    # Check if second player is already set
+    if game["player_o"] is not None:
+        await ack.answer("К игре уже присоединился другой игрок!", show_alert=True)
+        return
+    
+    if player_id in player_games:
+        await ack.answer(BUSY_TEXT, show_alert=True)
+        return
+    
+    # Add player as O
+    game["player_o"] = player_id
+    player_games[player_id] = (game["chat_id"], game["message_id"])
+    await ack.answer("Вы присоединились к игре!")
+    
+    player_x_name = await get_user_name_by_id(bot, game["player_x"])
+    player_o_name = await get_user_name_by_id(bot, game["player_o"])
+    
+    await callback.message.edit_text(
+        f"🎮 {player_x_name} против {player_o_name}\n\n"
+        "Игра началась! Ходит ❌\n\n"
+        "Для сдачи нажмите кнопку 'Сдаться' под полем.",
+        reply_markup=create_board(game["board"], game["message_id"])
+    )
+
+@callbacks.action("move")
+async def ttt_move(callback: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    """Handle making a move"""
+    player_id = callback.from_user.id
+    bot = callback.bot
+    # Check if the game on this board still exists
+    game = find_game(callback, payload)
+    if game is None:
+        await ack.answer("Эта игра уже закончилась!", show_alert=True)
+        return
+    
+    position = decode_pos(payload.arg(1))
+    if position is None or not (0 <= position < game["board"].cells):
+        await ack.answer("Неверный формат хода!", show_alert=True)
+        return
+    
+    # Check if player is in this game
+    if player_id not in [game["player_x"], game["player_o"]]:
+        await ack.answer("Вы не участвуете в этой игре!", show_alert=True)
+        return
+    
+    # Check if it's player's turn
+    if game["current_player"] != player_id:
+        await ack.answer("Сейчас не ваш ход!", show_alert=True)
+        return
         
-        # Notify players
-        player_x_id = game["player_x"]
+    # Check if cell is already occupied
+    if not game["board"].is_free(position):
+        await ack.answer("Эта клетка уже занята!", show_alert=True)
+        return
+    
+    if game.get("vs_bot"):
+        await play_vs_bot(callback, ack, game, position)
+        return
         
-        player_x_name = await get_user_name_by_id(bot, game["player_x"])
-        player_o_name = await get_user_name_by_id(bot, game["player_o"])
+    # Determine player symbol
+    player_symbol = get_player_symbol(player_id, game)
+    
+    # Make move (winner check looks only at lines through this cell)
+    winner = game["board"].play(position, player_symbol)
+    game["moves"] += 1
+    await ack.answer()
+    
+    if winner == player_symbol:  # Current player won
+        player_mark = get_player_mark(player_symbol)
+        winner_id = game["player_x"] if player_symbol == PLAYER_X else game["player_o"]
+        winner_name = await get_user_name_by_id(bot, winner_id)
         
+        # Update ELO: winner result=1, loser result=0
+        loser_id = game["player_o"] if winner_id == game["player_x"] else game["player_x"]
+        try:
+            if game.get("rated", True):
+                update_elo(str(winner_id), str(loser_id), 1)
+        except Exception:
+            pass
+        # Notify about win
         await callback.message.edit_text(
-            f"🎮 {player_x_name} против {player_o_name}\n\n"
-            "Игра началась! Ходит ❌\n\n"
-            "Для сдачи нажмите кнопку 'Сдаться' под полем.",
-            reply_markup=create_board(game["board"])
+            f"🎉 Победа! 🎉\n"
+            f"{winner_name} ({player_mark}) выиграл!\n\n"
+            f"Сыграно ходов: {game['moves']}",
+            reply_markup=None  # Remove the game board
         )
         
-        await callback.answer("Вы присоединились к игре!")
-        
-    elif action == "move":
-        # Handle making a move
-        if len(data_parts) < 4:
-            await callback.answer("Неверный формат хода!", show_alert=True)
-            return
-            
-        # Check if there's a game in this chat
-        if chat_id not in active_games:
-            await callback.answer("В этом чате нет активной игры!", show_alert=True)
-            return
-            
-        game = active_games[chat_id]
-        
-        # Check if player is in this game
-        if player_id not in [game["player_x"], game["player_o"]]:
-            await callback.answer("Вы не участвуете в этой игре!", show_alert=True)
-            return
-            
-        row, col = int(data_parts[2]), int(data_parts[3])
-        position = row * 3 + col
-        
-        # Check if it's player's turn
-        if game["current_player"] != player_id:
-            await callback.answer("Сейчас не ваш ход!", show_alert=True)
-            return
-            
-        # Check if cell is already occupied
-        if game["board"][position] != EMPTY_CELL:
-            await callback.answer("Эта клетка уже занята!", show_alert=True)
-            return
-            
-        # Determine player symbol
-        player_symbol = get_player_symbol(player_id, game)
-        
-        # Make move
-        game["board"][position] = player_symbol
-        game["moves"] += 1
+        # Clean up game
+        end_game(game)
         
-        # Check for winner
-        winner = check_winner(game["board"])
+    elif winner == TIE:  # Tie
+        player_x_name = await get_user_name_by_id(bot, game["player_x"])
+        player_o_name = await get_user_name_by_id(bot, game["player_o"])
         
-        if winner == player_symbol:  # Current player won
-            player_mark = get_player_mark(player_symbol)
-            winner_id = game["player_x"] if player_symbol == PLAYER_X else game["player_o"]
-            winner_name = await get_user_name_by_id(bot, winner_id)
-            
-            # Update ELO: winner result=1, loser result=0
-            loser_id = game["player_o"] if winner_id == game["player_x"] else game["player_x"]
-            try:
-                update_elo(str(winner_id), str(loser_id), 1)
-            except Exception:
-                pass
-            # Notify about win
-            await callback.message.edit_text(
-                f"🎉 Победа! 🎉\n"
-                f"{winner_name} ({player_mark}) выиграл!\n\n"
-                f"Сыграно ходов: {game['moves']}",
-                reply_markup=None  # Remove the game board
-            )
-            
-            # Clean up game
-            del active_games[chat_id]
-            
-        elif winner == TIE:  # Tie
-            player_x_name = await get_user_name_by_id(bot, game["player_x"])
-            player_o_name = await get_user_name_by_id(bot, game["player_o"])
-            
-            # Update ELO for draw (0.5 each)
-            try:
+        # Update ELO for draw (0.5 each)
+        try:
+            if game.get("rated", True):
                 update_elo(str(game['player_x']), str(game['player_o']), 0.5)
                 update_elo(str(game['player_o']), str(game['player_x']), 0.5)
-            except Exception:
-                pass
-            # Notify about tie
-            await callback.message.edit_text(
-                f"🤝 Ничья! 🤝\n"
-                f"{player_x_name} и {player_o_name} сыграли вничью!\n\n"
-                f"Сыграно ходов: {game['moves']}",
-                reply_markup=None  # Remove the game board
-            )
-            
-            # Clean up game
-            del active_games[chat_id]
-            
-        else:
-            # Switch player
-            game["current_player"] = game["player_o"] if player_id == game["player_x"] else game["player_x"]
-            
-            # Update board for players
-            current_player_name = await get_user_name_by_id(bot, player_id)
-            next_player_id = game["player_o"] if player_id == game["player_x"] else game["player_x"]
-            next_player_name = await get_user_name_by_id(bot, next_player_id)
-            player_mark = get_player_mark(player_symbol)
-            next_mark = get_player_mark(PLAYER_O if player_symbol == PLAYER_X else PLAYER_X)
-            
-            await callback.message.edit_text(
-                f"🎮 Ход #{game['moves'] + 1}\n"
-                f"{current_player_name} сходил {player_mark}\n"
-                f"Ходит {next_player_name} ({next_mark})",
-                reply_markup=create_board(game["board"])
-            )
-            
-        await callback.answer()
-        
-    elif action == "new":
-        # Handle new game request
-        await callback.answer("Для новой игры используйте команду /tictactoe", show_alert=True)
-        
-    elif action == "quit":
-        # Handle surrender request
-        if chat_id not in active_games:
-            await callback.answer("В этом чате нет активной игры!", show_alert=True)
-            return
-            
-        game = active_games[chat_id]
-        
-        # Check if player is in this game
-        if player_id not in [game["player_x"], game["player_o"]]:
-            await callback.answer("Вы не участвуете в этой игре!", show_alert=True)
-            return
-            
-        # Determine who is surrendering and who wins
-        surrenderer_name = await get_user_name_by_id(bot, player_id)
-        winner_id = game["player_o"] if player_id == game["player_x"] else game["player_x"]
-        winner_name = await get_user_name_by_id(bot, winner_id)
-            
-        # Update ELO surrender counts as loss for surrenderer
-        try:
-            update_elo(str(winner_id), str(player_id), 1)
         except Exception:
             pass
-        # Notify about surrender
+        # Notify about tie
         await callback.message.edit_text(
-            f"🏳️ {surrenderer_name} сдался!\n"
-            f"{winner_name} выигрывает!",
+            f"🤝 Ничья! 🤝\n"
+            f"{player_x_name} и {player_o_name} сыграли вничью!\n\n"
+            f"Сыграно ходов: {game['moves']}",
             reply_markup=None  # Remove the game board
         )
         
         # Clean up game
-        del active_games[chat_id]
+        end_game(game)
+        
+    else:
+        # Switch player
+        game["current_player"] = game["player_o"] if player_id == game["player_x"] else game["player_x"]
+        
+        # Update board for players
+        current_player_name = await get_user_name_by_id(bot, player_id)
+        next_player_id = game["player_o"] if player_id == game["player_x"] else game["player_x"]
+        next_player_name = await get_user_name_by_id(bot, next_player_id)
+        player_mark = get_player_mark(player_symbol)
+        next_mark = get_player_mark(PLAYER_O if player_symbol == PLAYER_X else PLAYER_X)
         
-        await callback.answer("Вы сдались в игре.")
+        await callback.message.edit_text(
+            f"🎮 Ход #{game['moves'] + 1}\n"
+            f"{current_player_name} сходил {player_mark}\n"
+            f"Ходит {next_player_name} ({next_mark})",
+            reply_markup=create_board(game["board"], game["message_id"])
+        )
+
+@callbacks.action("new")
+async def ttt_new(callback: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    """Handle new game request"""
+    await ack.answer("Для новой игры используйте команду /tictactoe", show_alert=True)
+
+@callbacks.action("quit")
+async def ttt_quit(callback: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    """Handle surrender request"""
+    player_id = callback.from_user.id
+    bot = callback.bot
+    game = find_game(callback, payload)
+    if game is None:
+        await ack.answer("Эта игра уже закончилась!", show_alert=True)
+        return
+    
+    # Check if player is in this game
+    if player_id not in [game["player_x"], game["player_o"]]:
+        await ack.answer("Вы не участвуете в этой игре!", show_alert=True)
+        return
+        
+    await ack.answer("Вы сдались в игре.")
+    if game.get("vs_bot"):
+        end_game(game)
+        await finish_bot_game(callback, game, 0, await get_user_name_by_id(bot, player_id))
+        return
+    # Determine who is surrendering and who wins
+    surrenderer_name = await get_user_name_by_id(bot, player_id)
+    winner_id = game["player_o"] if player_id == game["player_x"] else game["player_x"]
+    winner_name = await get_user_name_by_id(bot, winner_id)
+        
+    # Update ELO surrender counts as loss for surrenderer
+    try:
+        if game.get("rated", True):
+            update_elo(str(winner_id), str(player_id), 1)
+    except Exception:
+        pass
+    # Notify about surrender
+    await callback.message.edit_text(
+        f"🏳️ {surrenderer_name} сдался!\n"
+        f"{winner_name} выигрывает!",
+        reply_markup=None  # Remove the game board
+    )
+    
+    # Clean up game
+    end_game(game)
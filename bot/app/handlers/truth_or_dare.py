@@ -1,42 +1,24 @@
 """Remaster Truth or Dare (чистая версия без mini-app и лишнего кода)."""
 
 from __future__ import annotations
-import json, random
-from pathlib import Path
+import random
+from functools import lru_cache
 from typing import Dict, List
 from aiogram import Router, Bot
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from ..middlewares import CallbackAck
+from ..utils.callbacks import CallbackData, CallbackRouter
+from ..games.tod_content import PromptDeck, tod_content
+from ..utils.sessions import SessionStore
+from ..utils.pending_input import PendingInput, pending_inputs
 
 router = Router(name="truth_or_dare")
+callbacks = CallbackRouter("tod")
 
-DATA_FILE = Path(__file__).parent / "truth_or_dare_content.json"
-DEFAULT_TRUTHS = [
-    "Какой самый странный факт обо мне (по твоему)?",
-    "Чего ты сейчас боишься больше всего?",
-    "Что бы ты сделал(а), будь у тебя один свободный день без ограничений?",
-    "Какой самый бессмысленный предмет ты когда‑либо покупал(а)?",
-    "Что из последнего тебя реально насмешило?",
-]
-DEFAULT_DARES = [
-    "Сделай 10 приседаний и скажи 'я мощь'",
-    "Изобрази робота в своём следующем сообщении",
-    "Скажи любую фразу ЗЛЫМ шёпотом",
-    "Поставь любую смайлу и объясни почему именно она — философски",
-    "Напиши сообщение только эмодзи (минимум 5 штук)",
-]
-
-def load_content():
-    if DATA_FILE.exists():
-        try:
-            data = json.loads(DATA_FILE.read_text(encoding="utf-8"))
-            return (data.get("truths") or []) or DEFAULT_TRUTHS, (data.get("dares") or []) or DEFAULT_DARES
-        except Exception:
-            return DEFAULT_TRUTHS, DEFAULT_DARES
-    return DEFAULT_TRUTHS, DEFAULT_DARES
-
-TRUTHS, DARES = load_content()
+# Задания для игр в группах — только безопасный уровень каталога
+TASK_DIFFICULTY = "safe"
 
 MODE_CLOCKWISE = "clockwise"
 MODE_ANYONE = "anyone"
@@ -60,6 +42,7 @@ class TruthOrDareGame:
         self.current_task: str | None = None
         self.current_task_type: str | None = None
         self.target_player_id: int | None = None
+        self.deck = PromptDeck()  # задания без повторов в пределах игры
     def current_player_id(self): return self.players[self.current_index]
     def current_player_name(self): return self.player_names.get(self.current_player_id(), f"Игрок {self.current_player_id()}")
     def next_player(self):
@@ -72,10 +55,31 @@ class TruthOrDareGame:
         return True
     def use_pass(self, pid:int): self.passes_used[pid]= self.passes_used.get(pid,0)+1
 
-lobbies: Dict[int, dict] = {}
-active_games: Dict[int, TruthOrDareGame] = {}
-waiting_for_input: Dict[int, dict] = {}
+# Брошенные лобби/игры сами закрываются по TTL (продлевается любым действием в них)
+LOBBY_TTL = 30 * 60
+GAME_TTL = 60 * 60
+TASK_INPUT_TIMEOUT = 3 * 60  # столько ждём текст задания от спрашивающего, потом — случайное
+
+async def _lobby_expired(bot: Bot, chat_id: int, lobby: dict):
+    try:
+        if lobby.get("message_id"): await bot.edit_message_text("⌛ Лобби закрыто: игру так и не начали.", chat_id=chat_id, message_id=lobby["message_id"])
+        else: await bot.send_message(chat_id, "⌛ Лобби закрыто: игру так и не начали.")
+    except Exception: pass
+
+async def _game_expired(bot: Bot, chat_id: int, game: TruthOrDareGame):
+    pending_inputs.cancel_chat(chat_id, "tod")
+    try: await bot.send_message(chat_id, "⌛ Игра «Правда или действие» завершена: слишком долго не было ходов.")
+    except Exception: pass
+
+lobbies: Dict[int, dict] = SessionStore("tod_lobbies", LOBBY_TTL, on_expire=_lobby_expired)
+active_games: Dict[int, TruthOrDareGame] = SessionStore("tod_games", GAME_TTL, on_expire=_game_expired)
+
+def end_game(chat_id: int):
+    active_games.pop(chat_id, None)
+    pending_inputs.cancel_chat(chat_id, "tod")  # спрашивающий больше не пишет задание
 
+# Клавиатуры зависят только от пары флагов — собираем каждую один раз; готовую разметку не изменять, она общая
+@lru_cache(maxsize=None)
 def lobby_keyboard(is_creator: bool, mode: str, rules: str):
     kb=InlineKeyboardBuilder(); kb.button(text="Присоединиться", callback_data="tod:lobby:join")
     mode_label = "Режим: По кругу" if mode == MODE_CLOCKWISE else "Режим: Кому угодно"
@@ -88,51 +92,72 @@ def lobby_keyboard(is_creator: bool, mode: str, rules: str):
         kb.adjust(2,2)
     else:
         kb.adjust(1)
-    return kb
-def action_keyboard(game: TruthOrDareGame):
+    return kb.as_markup()
+@lru_cache(maxsize=None)
+def _action_markup(can_pass: bool, can_end: bool):
     kb=InlineKeyboardBuilder();
     kb.button(text="Правда", callback_data="tod:act:truth"); kb.button(text="Действие", callback_data="tod:act:dare"); kb.button(text="Random", callback_data="tod:act:random")
-    if game.pass_available(game.current_player_id()): kb.button(text="Пас", callback_data="tod:act:pass")
-    if game.creator_id == game.current_player_id(): kb.button(text="Завершить", callback_data="tod:act:end")
-    kb.adjust(3,2); return kb
-def next_keyboard(game: TruthOrDareGame):
+    if can_pass: kb.button(text="Пас", callback_data="tod:act:pass")
+    if can_end: kb.button(text="Завершить", callback_data="tod:act:end")
+    kb.adjust(3,2); return kb.as_markup()
+def action_keyboard(game: TruthOrDareGame):
+    return _action_markup(game.pass_available(game.current_player_id()), game.creator_id == game.current_player_id())
+@lru_cache(maxsize=None)
+def _next_markup(can_end: bool):
     kb=InlineKeyboardBuilder(); kb.button(text="Далее ▶", callback_data="tod:next")
-    if game.creator_id == game.current_player_id(): kb.button(text="Завершить", callback_data="tod:act:end")
-    kb.adjust(2); return kb
+    if can_end: kb.button(text="Завершить", callback_data="tod:act:end")
+    kb.adjust(2); return kb.as_markup()
+def next_keyboard(game: TruthOrDareGame):
+    return _next_markup(game.creator_id == game.current_player_id())
 
+@lru_cache(maxsize=None)
 def waiting_task_keyboard():
     kb=InlineKeyboardBuilder(); kb.button(text="Задание выполнено", callback_data="tod:done")
-    return kb
+    return kb.as_markup()
 
-def target_choice_keyboard(game: TruthOrDareGame, target_id: int):
+@lru_cache(maxsize=None)
+def _target_choice_markup(can_pass: bool, can_finish: bool):
     kb = InlineKeyboardBuilder()
     kb.button(text="Правда", callback_data="tod:choice:truth")
     kb.button(text="Действие", callback_data="tod:choice:dare")
     kb.button(text="Random", callback_data="tod:choice:random")
-    if game.pass_available(target_id):
+    if can_pass:
         kb.button(text="Пас", callback_data="tod:choice:pass")
     # Кнопка завершения доступна создателю, чтобы можно было закончить в любой момент
-    if game.creator_id in game.players:
+    if can_finish:
         kb.button(text="Завершить", callback_data="tod:finish")
     kb.adjust(3,1,1)
-    return kb
+    return kb.as_markup()
+def target_choice_keyboard(game: TruthOrDareGame, target_id: int):
+    return _target_choice_markup(game.pass_available(target_id), game.creator_id in game.players)
+
+@lru_cache(maxsize=256)
+def target_keyboard(targets: tuple):
+    kb=InlineKeyboardBuilder()
+    for pid, name in targets: kb.button(text=name, callback_data=f"tod:target:{pid}")
+    kb.button(text="Отмена", callback_data="tod:act:cancel")
+    kb.adjust(2); return kb.as_markup()
 
 def mention_name(uid:int, name:str): return f"<a href='tg://user?id={uid}'>{name}</a>"
+
+# Текст лобби: шапка по (режим, правила) из кэша + список игроков, который дописывается по строке при входе
+LOBBY_FOOTER = "\n\nСоздатель может переключать режим и стартовать игру."
+@lru_cache(maxsize=None)
+def _lobby_header(mode: str, rules: str):
+    mode_txt = "По кругу ⏱" if mode==MODE_CLOCKWISE else "Кому угодно 🎯"
+    rules_txt = "С правилами ✅ (1 пас)" if rules==RULES_WITH else "Без правил ♾ (пасы беск.)"
+    return f"🎉 <b>Лобби 'Правда или Действие'</b>\n\n⚙️ Режим: <b>{mode_txt}</b>\n🧷 Правила: <b>{rules_txt}</b>\n\n"
+def _roster_line(uid:int, name:str): return f"\n• {mention_name(uid, name)}"
+def add_lobby_player(lobby:dict, uid:int, name:str):
+    lobby['players'].append(uid); lobby['player_names'][uid]=name
+    if 'roster' in lobby: lobby['roster'] += _roster_line(uid, name)
 def render_lobby_text(lobby:dict):
-    lines=["🎉 <b>Лобби 'Правда или Действие'</b>",""]
-    mode_txt = "По кругу ⏱" if lobby['mode']==MODE_CLOCKWISE else "Кому угодно 🎯"
-    rules_txt = "С правилами ✅ (1 пас)" if lobby['rules']==RULES_WITH else "Без правил ♾ (пасы беск.)"
-    lines.append(f"⚙️ Режим: <b>{mode_txt}</b>")
-    lines.append(f"🧷 Правила: <b>{rules_txt}</b>")
-    lines.append("")
-    lines.append(f"👥 Игроки ({len(lobby['players'])}):")
-    for pid in lobby['players']:
-        nm = lobby['player_names'][pid]
-        lines.append(f"• {mention_name(pid, nm)}")
-    lines.append("\nСоздатель может переключать режим и стартовать игру.")
-    return "\n".join(lines)
-def random_truth(): return random.choice(TRUTHS)
-def random_dare(): return random.choice(DARES)
+    if 'roster' not in lobby:  # лобби из старого снимка
+        lobby['roster'] = "".join(_roster_line(pid, lobby['player_names'][pid]) for pid in lobby['players'])
+    return f"{_lobby_header(lobby['mode'], lobby['rules'])}👥 Игроки ({len(lobby['players'])}):{lobby['roster']}{LOBBY_FOOTER}"
+def random_task(game: TruthOrDareGame, kind: str) -> str:
+    if getattr(game, "deck", None) is None: game.deck = PromptDeck()  # игры из старых снимков
+    return tod_content.draw(game.deck, kind, TASK_DIFFICULTY) or "Задание не найдено"
 
 @router.message(Command(commands=["truthordare","tod","truth"]))
 async def cmd_truth_or_dare(message: Message):
@@ -141,287 +166,330 @@ async def cmd_truth_or_dare(message: Message):
     if chat_id in active_games: return await message.answer("Игра уже идёт")
     if chat_id in lobbies: return await message.answer("Лобби уже создано")
     name= message.from_user.first_name or message.from_user.username or "Игрок"
-    lobby={"creator":user_id,"players":[user_id],"player_names":{user_id:name},"message_id":None, "mode": MODE_CLOCKWISE, "rules": RULES_WITH}
+    lobby={"creator":user_id,"players":[user_id],"player_names":{user_id:name},"message_id":None, "mode": MODE_CLOCKWISE, "rules": RULES_WITH, "roster": _roster_line(user_id, name)}
     lobbies[chat_id]=lobby
-    msg= await message.answer(render_lobby_text(lobby), parse_mode="HTML", reply_markup=lobby_keyboard(True, lobby['mode'], lobby['rules']).as_markup())
+    msg= await message.answer(render_lobby_text(lobby), parse_mode="HTML", reply_markup=lobby_keyboard(True, lobby['mode'], lobby['rules']))
     lobby["message_id"]=msg.message_id
 
-@router.callback_query()
-async def tod_callbacks(cb: CallbackQuery, bot: Bot):
-    if not cb.data or not cb.data.startswith("tod:"): return await cb.answer()
-    parts=cb.data.split(":"); chat_id= cb.message.chat.id if cb.message else None; user_id= cb.from_user.id
-    # lobby
-    if parts[1]=="lobby":
-        if chat_id not in lobbies: return await cb.answer("Лобби не найдено", show_alert=True)
-        lobby=lobbies[chat_id]; sub=parts[2]
-        if sub=="join":
-            if user_id not in lobby['players']:
-                lobby['players'].append(user_id)
-                lobby['player_names'][user_id]= cb.from_user.first_name or cb.from_user.username or "Игрок"
-                await cb.answer("Готово ✅")
-            else:
-                await cb.answer("Вы уже в лобби")
-            # ВАЖНО: групповое сообщение одно для всех, поэтому всегда показываем клавиатуру создателя,
-            # иначе при входе обычного игрока пропадают кнопки 'Старт' / 'Правила' / 'Режим'.
-            try:
-                await bot.edit_message_text(
-                    chat_id=chat_id,
-                    message_id=lobby['message_id'],
-                    text=render_lobby_text(lobby),
-                    reply_markup=lobby_keyboard(True, lobby['mode'], lobby['rules']).as_markup(),
-                    parse_mode="HTML"
-                )
-            except Exception:
-                pass
-        elif sub=="mode":
-            if user_id!=lobby['creator']: return await cb.answer("Только создатель")
-            lobby['mode'] = MODE_ANYONE if lobby['mode']==MODE_CLOCKWISE else MODE_CLOCKWISE
-            try:
-                await bot.edit_message_text(chat_id=chat_id, message_id=lobby['message_id'], text=render_lobby_text(lobby), reply_markup=lobby_keyboard(True, lobby['mode'], lobby['rules']).as_markup(), parse_mode="HTML")
-            except Exception: pass
-            return await cb.answer("Режим переключен")
-        elif sub=="rules":
-            if user_id!=lobby['creator']: return await cb.answer("Только создатель")
-            lobby['rules'] = RULES_WITHOUT if lobby['rules']==RULES_WITH else RULES_WITH
-            try:
-                await bot.edit_message_text(chat_id=chat_id, message_id=lobby['message_id'], text=render_lobby_text(lobby), reply_markup=lobby_keyboard(True, lobby['mode'], lobby['rules']).as_markup(), parse_mode="HTML")
-            except Exception: pass
-            return await cb.answer("Правила переключены")
-        elif sub=="start":
-            if user_id!=lobby['creator']: return await cb.answer("Не ты создавал")
-            if len(lobby['players'])<2: return await cb.answer("Минимум 2 игрока")
-            game= TruthOrDareGame(chat_id,lobby['players'],lobby['player_names'],lobby['creator'], lobby['mode'], lobby['rules'])
-            active_games[chat_id]=game; del lobbies[chat_id]
-            mode_txt = "По кругу ⏱" if game.mode==MODE_CLOCKWISE else "Кому угодно 🎯"
-            rules_txt = "1 пас (осторожно)" if game.rules_mode==RULES_WITH else "Неограниченные пасы"
-            if game.mode == MODE_CLOCKWISE:
-                target = game.players[(game.current_index+1)%len(game.players)]
-                await cb.message.edit_text(
-                    f"🚀 <b>Игра началась!</b>\n\n" \
-                    f"Режим: <b>{mode_txt}</b>\n" \
-                    f"Правила: <b>{rules_txt}</b>\n" \
-                    f"Текущий спрашивающий: {mention_name(game.current_player_id(), game.current_player_name())}\n" \
-                    f"🎯 {mention_name(target, game.player_names[target])}, выбери: Правда / Действие / Random / Пас",
-                    parse_mode="HTML",
-                    reply_markup=target_choice_keyboard(game, target).as_markup())
-            else:
-                await cb.message.edit_text(
-                    f"🚀 <b>Игра началась!</b>\n\n" \
-                    f"Режим: <b>{mode_txt}</b>\n" \
-                    f"Правила: <b>{rules_txt}</b>\n" \
-                    f"Ход: {mention_name(game.current_player_id(), game.current_player_name())}\nВыбирай действие.",
-                    parse_mode="HTML", reply_markup=action_keyboard(game).as_markup())
-            await cb.answer()
-        elif sub=="cancel":
-            if user_id!=lobby['creator']: return await cb.answer("Только создатель")
-            del lobbies[chat_id]; await cb.message.edit_text("Лобби закрыто."); await cb.answer()
-        return
-    # action
-    if parts[1]=="act":
-        # Используется только в режиме ANYONE (свободный выбор цели)
-        if chat_id not in active_games: return await cb.answer("Игры нет", show_alert=True)
-        game=active_games[chat_id]
-        if game.mode != MODE_ANYONE: return await cb.answer("Сейчас другой режим")
-        if user_id!=game.current_player_id(): return await cb.answer("Не твой ход")
-        action = parts[2]
-        if action=="end":
-            if user_id!=game.creator_id: return await cb.answer("Только создатель")
-            del active_games[chat_id]
-            await cb.message.edit_text("Игра завершена.")
-            return await cb.answer()
-        if action=="pass":
-            if not game.pass_available(user_id): return await cb.answer("Пас уже использован")
-            game.use_pass(user_id)
-            game.next_player()
-            await cb.message.edit_text(
-                f"⏭ Пас! Ход: {mention_name(game.current_player_id(), game.current_player_name())}",
-                parse_mode="HTML",
-                reply_markup=action_keyboard(game).as_markup())
-            return await cb.answer("Пропущено")
-        if action in {"truth","dare","random"}:
-            if action=="random":
-                action = random.choice(["truth","dare"])
-            game.current_task_type = action
-            # выбор цели
-            game.phase = "select_target"
-            kb=InlineKeyboardBuilder()
-            for pid in game.players:
-                if pid==user_id: continue
-                kb.button(text=game.player_names[pid], callback_data=f"tod:target:{pid}")
-            kb.button(text="Отмена", callback_data="tod:act:cancel")
-            kb.adjust(2)
-            label = "Правда" if action=="truth" else "Действие"
-            await cb.message.edit_text(
-                f"🎯 Выберите цель для: <b>{label}</b>",
-                parse_mode="HTML",
-                reply_markup=kb.as_markup())
-            return await cb.answer()
-        if action=="cancel":
-            # возврат к выбору действия
-            game.phase = "waiting_action"
-            await cb.message.edit_text(
-                f"Ход: {mention_name(game.current_player_id(), game.current_player_name())}",
-                parse_mode="HTML",
-                reply_markup=action_keyboard(game).as_markup())
-            return await cb.answer()
-        return
+def _ids(cb: CallbackQuery):
+    return (cb.message.chat.id if cb.message else None), cb.from_user.id
 
-    # CLOCKWISE: цель (target) выбирает тип задания
-    if parts[1]=="choice":
-        if chat_id not in active_games: return await cb.answer()
-        game=active_games[chat_id]
-        if game.mode != MODE_CLOCKWISE: return await cb.answer()
-        target_expected = game.players[(game.current_index+1)%len(game.players)]
-        if user_id != target_expected: return await cb.answer("Не ты выбираешь")
-        if game.phase not in {"waiting_choice"}: return await cb.answer()
-        choice = parts[2]
-        # пас
-        if choice=="pass":
-            if not game.pass_available(user_id): return await cb.answer("Пас исчерпан")
-            game.use_pass(user_id)
-            # цель становится спрашивающим
-            game.current_index = game.players.index(user_id)
-            game.phase = "waiting_choice"
-            nxt_target = game.players[(game.current_index+1)%len(game.players)]
-            await cb.message.edit_text(
-                f"⏭ {mention_name(user_id, game.player_names[user_id])} сделал(а) пас.\nТеперь спрашивает: {mention_name(game.current_player_id(), game.current_player_name())}\n\n🎯 {mention_name(nxt_target, game.player_names[nxt_target])}, выбери: Правда / Действие / Random / Пас",
-                parse_mode="HTML",
-                reply_markup=target_choice_keyboard(game, nxt_target).as_markup())
-            return await cb.answer("Пас")
-        if choice not in {"truth","dare","random"}: return await cb.answer()
-        asker_id = game.current_player_id()
-        # RANDOM: сразу создаём и отправляем
-        if choice == "random":
-            picked_type = random.choice(["truth","dare"])
-            game.current_task_type = picked_type
-            game.current_task = random_truth() if picked_type=="truth" else random_dare()
-            game.target_player_id = user_id
-            game.phase = "task_active"
-            try:
-                await cb.bot.send_message(user_id,
-                    f"🤫 Твоё секретное <b>{'Правда' if picked_type=='truth' else 'Действие'}</b> (случайное):\n\n{game.current_task}\n\nКогда выполнишь — вернись и нажми 'Задание выполнено'.",
-                    parse_mode='HTML')
-            except Exception:
-                await cb.message.answer(
-                    f"⚠️ Не могу написать {mention_name(user_id, game.player_names[user_id])} — /start в ЛС.",
-                    parse_mode='HTML')
-            await cb.message.edit_text(
-                f"🎲 {'Правда' if picked_type=='truth' else 'Действие'} выдано {mention_name(user_id, game.player_names[user_id])}.\n⏳ Ждём выполнения…",
-                parse_mode='HTML',
-                reply_markup=waiting_task_keyboard().as_markup())
-            return await cb.answer()
-        # TRUTH или DARE: спрашивающий должен придумать
-        picked_type = choice  # 'truth' или 'dare'
-        game.current_task_type = picked_type
-        game.phase = "awaiting_content"
-        waiting_for_input[asker_id] = {
-            "type": picked_type,
-            "target": user_id,
-            "chat_id": chat_id
-        }
-        try:
-            await cb.bot.send_message(asker_id,
-                f"✍️ Введи {'вопрос (Правда)' if picked_type=='truth' else 'задание (Действие)'} для {game.player_names[user_id]} одним сообщением.")
-        except Exception:
-            await cb.message.answer("⚠️ Спрашивающему нужно /start в ЛС, иначе не смогу получить текст.")
-        await cb.message.edit_text(
-            f"🕵️ {mention_name(asker_id, game.player_names[asker_id])} пишет секретное {'вопрос' if picked_type=='truth' else 'задание'} для {mention_name(user_id, game.player_names[user_id])}…",
-            parse_mode='HTML')
-        return await cb.answer("Жду ввод от спрашивающего")
-
-    # Завершение игры через кнопку (универсально для обоих режимов)
-    if parts[1]=="finish":
-        if chat_id not in active_games: return await cb.answer()
-        game = active_games[chat_id]
-        if user_id != game.creator_id:
-            return await cb.answer("Только создатель")
-        del active_games[chat_id]
-        try:
-            await cb.message.edit_text("Игра завершена создателем.")
-        except Exception:
-            await cb.answer("Игра завершена")
-        return await cb.answer("Готово")
+async def _edit_lobby(bot: Bot, chat_id: int, lobby: dict):
+    # ВАЖНО: групповое сообщение одно для всех, поэтому всегда показываем клавиатуру создателя,
+    # иначе при входе обычного игрока пропадают кнопки 'Старт' / 'Правила' / 'Режим'.
+    try:
+        await bot.edit_message_text(
+            chat_id=chat_id,
+            message_id=lobby['message_id'],
+            text=render_lobby_text(lobby),
+            reply_markup=lobby_keyboard(True, lobby['mode'], lobby['rules']),
+            parse_mode="HTML"
+        )
+    except Exception:
+        pass
 
-    # выбор типа ANYONE режима -> выбор цели обрабатывается ниже в parts[1]=="target"
-    # выбор цели в режиме ANYONE
-    if parts[1]=="target":
-        if chat_id not in active_games: return await cb.answer()
-        game=active_games[chat_id]
-        if user_id!=game.current_player_id(): return await cb.answer("Не твой ход")
-        if game.mode!=MODE_ANYONE or game.phase!="select_target": return await cb.answer()
-        try:
-            target_id = int(parts[2])
-        except ValueError:
-            return await cb.answer()
-        if target_id not in game.players or target_id==user_id: return await cb.answer()
-        game.target_player_id = target_id
-        game.current_task = random_truth() if game.current_task_type=="truth" else random_dare()
-        game.phase="task_active"
-        label = "Правда" if game.current_task_type=="truth" else "Действие"
-        await cb.message.edit_text(
-            f"🎲 <b>{label}</b> для {mention_name(target_id, game.player_names[target_id])}:\n\n<i>{game.current_task}</i>\n\nПосле выполнения нажмите 'Далее'.",
-            parse_mode="HTML", reply_markup=next_keyboard(game).as_markup())
-        return await cb.answer()
-    if parts[1]=="next":  # оставлено для совместимости (ANYONE)
-        if chat_id not in active_games: return await cb.answer()
-        game=active_games[chat_id]
-        if game.mode != MODE_ANYONE: return await cb.answer()
-        if user_id!=game.current_player_id(): return await cb.answer("Не ты выполнял")
-        if game.phase!="task_active": return await cb.answer()
-        # после выполнения: ход получает тот, кто был целью
-        if game.target_player_id and game.target_player_id in game.players:
-            game.current_index = game.players.index(game.target_player_id)
-        game.phase = "waiting_action"
-        game.current_task = None
-        game.current_task_type = None
-        game.target_player_id = None
+# lobby
+@callbacks.action("lobby")
+async def tod_lobby_unknown(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    chat_id, _ = _ids(cb)
+    if chat_id not in lobbies: return await ack.answer("Лобби не найдено", show_alert=True)
+    await ack.answer()
+
+@callbacks.action("lobby", "join")
+async def tod_lobby_join(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    chat_id, user_id = _ids(cb)
+    if chat_id not in lobbies: return await ack.answer("Лобби не найдено", show_alert=True)
+    lobby=lobbies[chat_id]
+    if user_id not in lobby['players']:
+        add_lobby_player(lobby, user_id, cb.from_user.first_name or cb.from_user.username or "Игрок")
+        await ack.answer("Готово ✅")
+    else:
+        await ack.answer("Вы уже в лобби")
+    await _edit_lobby(cb.bot, chat_id, lobby)
+
+@callbacks.action("lobby", "mode")
+async def tod_lobby_mode(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    chat_id, user_id = _ids(cb)
+    if chat_id not in lobbies: return await ack.answer("Лобби не найдено", show_alert=True)
+    lobby=lobbies[chat_id]
+    if user_id!=lobby['creator']: return await ack.answer("Только создатель")
+    lobby['mode'] = MODE_ANYONE if lobby['mode']==MODE_CLOCKWISE else MODE_CLOCKWISE
+    await ack.answer("Режим переключен")
+    await _edit_lobby(cb.bot, chat_id, lobby)
+
+@callbacks.action("lobby", "rules")
+async def tod_lobby_rules(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    chat_id, user_id = _ids(cb)
+    if chat_id not in lobbies: return await ack.answer("Лобби не найдено", show_alert=True)
+    lobby=lobbies[chat_id]
+    if user_id!=lobby['creator']: return await ack.answer("Только создатель")
+    lobby['rules'] = RULES_WITHOUT if lobby['rules']==RULES_WITH else RULES_WITH
+    await ack.answer("Правила переключены")
+    await _edit_lobby(cb.bot, chat_id, lobby)
+
+@callbacks.action("lobby", "start")
+async def tod_lobby_start(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    chat_id, user_id = _ids(cb)
+    if chat_id not in lobbies: return await ack.answer("Лобби не найдено", show_alert=True)
+    lobby=lobbies[chat_id]
+    if user_id!=lobby['creator']: return await ack.answer("Не ты создавал")
+    if len(lobby['players'])<2: return await ack.answer("Минимум 2 игрока")
+    game= TruthOrDareGame(chat_id,lobby['players'],lobby['player_names'],lobby['creator'], lobby['mode'], lobby['rules'])
+    active_games[chat_id]=game; del lobbies[chat_id]
+    mode_txt = "По кругу ⏱" if game.mode==MODE_CLOCKWISE else "Кому угодно 🎯"
+    rules_txt = "1 пас (осторожно)" if game.rules_mode==RULES_WITH else "Неограниченные пасы"
+    await ack.answer()
+    if game.mode == MODE_CLOCKWISE:
+        target = game.players[(game.current_index+1)%len(game.players)]
         await cb.message.edit_text(
-            f"✅ Задание завершено! Теперь ход: {mention_name(game.current_player_id(), game.current_player_name())}",
+            f"🚀 <b>Игра началась!</b>\n\n" \
+            f"Режим: <b>{mode_txt}</b>\n" \
+            f"Правила: <b>{rules_txt}</b>\n" \
+            f"Текущий спрашивающий: {mention_name(game.current_player_id(), game.current_player_name())}\n" \
+            f"🎯 {mention_name(target, game.player_names[target])}, выбери: Правда / Действие / Random / Пас",
             parse_mode="HTML",
-            reply_markup=action_keyboard(game).as_markup())
-        return await cb.answer()
-    if parts[1]=="done":
-        if chat_id not in active_games: return await cb.answer()
-        game=active_games[chat_id]
-        # кнопку 'Задание выполнено' должен жать цель
-        if game.target_player_id != user_id: return await cb.answer("Не ты цель")
-        if game.phase!="task_active": return await cb.answer()
-        # цель становится новым спрашивающим
+            reply_markup=target_choice_keyboard(game, target))
+    else:
+        await cb.message.edit_text(
+            f"🚀 <b>Игра началась!</b>\n\n" \
+            f"Режим: <b>{mode_txt}</b>\n" \
+            f"Правила: <b>{rules_txt}</b>\n" \
+            f"Ход: {mention_name(game.current_player_id(), game.current_player_name())}\nВыбирай действие.",
+            parse_mode="HTML", reply_markup=action_keyboard(game))
+
+@callbacks.action("lobby", "cancel")
+async def tod_lobby_cancel(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    chat_id, user_id = _ids(cb)
+    if chat_id not in lobbies: return await ack.answer("Лобби не найдено", show_alert=True)
+    lobby=lobbies[chat_id]
+    if user_id!=lobby['creator']: return await ack.answer("Только создатель")
+    del lobbies[chat_id]; await ack.answer(); await cb.message.edit_text("Лобби закрыто.")
+
+# action — используется только в режиме ANYONE (свободный выбор цели)
+def _anyone_turn(cb: CallbackQuery):
+    """Return (game, error) for the current player's ANYONE-mode action."""
+    chat_id, user_id = _ids(cb)
+    if chat_id not in active_games: return None, ("Игры нет", True)
+    game=active_games[chat_id]
+    if game.mode != MODE_ANYONE: return None, ("Сейчас другой режим", False)
+    if user_id!=game.current_player_id(): return None, ("Не твой ход", False)
+    return game, None
+
+@callbacks.action("act")
+async def tod_act_unknown(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    game, err = _anyone_turn(cb)
+    if err: return await ack.answer(err[0], show_alert=err[1])
+    await ack.answer()
+
+@callbacks.action("act", "end")
+async def tod_act_end(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    game, err = _anyone_turn(cb)
+    if err: return await ack.answer(err[0], show_alert=err[1])
+    if cb.from_user.id!=game.creator_id: return await ack.answer("Только создатель")
+    end_game(game.chat_id)
+    await ack.answer()
+    await cb.message.edit_text("Игра завершена.")
+
+@callbacks.action("act", "pass")
+async def tod_act_pass(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    game, err = _anyone_turn(cb)
+    if err: return await ack.answer(err[0], show_alert=err[1])
+    user_id = cb.from_user.id
+    if not game.pass_available(user_id): return await ack.answer("Пас уже использован")
+    game.use_pass(user_id)
+    game.next_player()
+    await ack.answer("Пропущено")
+    await cb.message.edit_text(
+        f"⏭ Пас! Ход: {mention_name(game.current_player_id(), game.current_player_name())}",
+        parse_mode="HTML",
+        reply_markup=action_keyboard(game))
+
+@callbacks.action("act", "truth", "dare", "random")
+async def tod_act_pick(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    game, err = _anyone_turn(cb)
+    if err: return await ack.answer(err[0], show_alert=err[1])
+    user_id = cb.from_user.id
+    action = payload.arg(0)
+    if action=="random":
+        action = random.choice(["truth","dare"])
+    game.current_task_type = action
+    # выбор цели
+    game.phase = "select_target"
+    label = "Правда" if action=="truth" else "Действие"
+    await ack.answer()
+    await cb.message.edit_text(
+        f"🎯 Выберите цель для: <b>{label}</b>",
+        parse_mode="HTML",
+        reply_markup=target_keyboard(tuple((pid, game.player_names[pid]) for pid in game.players if pid!=user_id)))
+
+@callbacks.action("act", "cancel")
+async def tod_act_cancel(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    game, err = _anyone_turn(cb)
+    if err: return await ack.answer(err[0], show_alert=err[1])
+    # возврат к выбору действия
+    game.phase = "waiting_action"
+    await ack.answer()
+    await cb.message.edit_text(
+        f"Ход: {mention_name(game.current_player_id(), game.current_player_name())}",
+        parse_mode="HTML",
+        reply_markup=action_keyboard(game))
+
+# CLOCKWISE: цель (target) выбирает тип задания
+@callbacks.action("choice")
+async def tod_choice(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    chat_id, user_id = _ids(cb)
+    if chat_id not in active_games: return await ack.answer()
+    game=active_games[chat_id]
+    if game.mode != MODE_CLOCKWISE: return await ack.answer()
+    target_expected = game.players[(game.current_index+1)%len(game.players)]
+    if user_id != target_expected: return await ack.answer("Не ты выбираешь")
+    if game.phase not in {"waiting_choice"}: return await ack.answer()
+    choice = payload.arg(0)
+    # пас
+    if choice=="pass":
+        if not game.pass_available(user_id): return await ack.answer("Пас исчерпан")
+        game.use_pass(user_id)
+        # цель становится спрашивающим
         game.current_index = game.players.index(user_id)
-        game.phase = "waiting_choice" if game.mode==MODE_CLOCKWISE else "waiting_action"
-        game.current_task=None; game.current_task_type=None; game.target_player_id=None
-        if game.mode==MODE_CLOCKWISE:
-            nxt_target = game.players[(game.current_index+1)%len(game.players)]
-            await cb.message.edit_text(
-                f"✅ {mention_name(user_id, game.player_names[user_id])} выполнил(а) задание!\n\nТеперь спрашивающий: {mention_name(game.current_player_id(), game.current_player_name())}\n🎯 {mention_name(nxt_target, game.player_names[nxt_target])}, выбери: Правда / Действие / Random / Пас",
-                parse_mode='HTML',
-                reply_markup=target_choice_keyboard(game, nxt_target).as_markup()
-            )
-        else:
-            await cb.message.edit_text(
-                f"✅ {mention_name(user_id, game.player_names[user_id])} выполнил(а) задание! Ход: {mention_name(game.current_player_id(), game.current_player_name())}",
-                parse_mode='HTML', reply_markup=action_keyboard(game).as_markup())
-        return await cb.answer("Готово")
-    await cb.answer()
-
-@router.message(lambda m: m.chat.type == 'private' and m.from_user.id in waiting_for_input)
-async def private_task_input(message: Message, bot: Bot):
-    # Обрабатываем приватный ввод задания
-    uid = message.from_user.id
-    if uid not in waiting_for_input:
+        game.phase = "waiting_choice"
+        nxt_target = game.players[(game.current_index+1)%len(game.players)]
+        await ack.answer("Пас")
+        await cb.message.edit_text(
+            f"⏭ {mention_name(user_id, game.player_names[user_id])} сделал(а) пас.\nТеперь спрашивает: {mention_name(game.current_player_id(), game.current_player_name())}\n\n🎯 {mention_name(nxt_target, game.player_names[nxt_target])}, выбери: Правда / Действие / Random / Пас",
+            parse_mode="HTML",
+            reply_markup=target_choice_keyboard(game, nxt_target))
         return
-    info = waiting_for_input.pop(uid)
-    chat_id = info['chat_id']
-    if chat_id not in active_games:
+    if choice not in {"truth","dare","random"}: return await ack.answer()
+    asker_id = game.current_player_id()
+    # RANDOM: сразу создаём и отправляем
+    if choice == "random":
+        picked_type = random.choice(["truth","dare"])
+        game.current_task_type = picked_type
+        game.current_task = random_task(game, picked_type)
+        game.target_player_id = user_id
+        game.phase = "task_active"
+        await ack.answer()
+        try:
+            await cb.bot.send_message(user_id,
+                f"🤫 Твоё секретное <b>{'Правда' if picked_type=='truth' else 'Действие'}</b> (случайное):\n\n{game.current_task}\n\nКогда выполнишь — вернись и нажми 'Задание выполнено'.",
+                parse_mode='HTML')
+        except Exception:
+            await cb.message.answer(
+                f"⚠️ Не могу написать {mention_name(user_id, game.player_names[user_id])} — /start в ЛС.",
+                parse_mode='HTML')
+        await cb.message.edit_text(
+            f"🎲 {'Правда' if picked_type=='truth' else 'Действие'} выдано {mention_name(user_id, game.player_names[user_id])}.\n⏳ Ждём выполнения…",
+            parse_mode='HTML',
+            reply_markup=waiting_task_keyboard())
         return
+    # TRUTH или DARE: спрашивающий должен придумать
+    picked_type = choice  # 'truth' или 'dare'
+    game.current_task_type = picked_type
+    game.phase = "awaiting_content"
+    pending_inputs.expect(cb.bot, "tod", asker_id, chat_id, TASK_INPUT_TIMEOUT, type=picked_type, target=user_id)
+    await ack.answer("Жду ввод от спрашивающего")
+    try:
+        await cb.bot.send_message(asker_id,
+            f"✍️ Введи {'вопрос (Правда)' if picked_type=='truth' else 'задание (Действие)'} для {game.player_names[user_id]} одним сообщением.\n"
+            f"⏱ У тебя {TASK_INPUT_TIMEOUT // 60} мин., потом задание выберется случайно.")
+    except Exception:
+        await cb.message.answer("⚠️ Спрашивающему нужно /start в ЛС, иначе не смогу получить текст.")
+    await cb.message.edit_text(
+        f"🕵️ {mention_name(asker_id, game.player_names[asker_id])} пишет секретное {'вопрос' if picked_type=='truth' else 'задание'} для {mention_name(user_id, game.player_names[user_id])}…",
+        parse_mode='HTML')
+
+# Завершение игры через кнопку (универсально для обоих режимов)
+@callbacks.action("finish")
+async def tod_finish(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    chat_id, user_id = _ids(cb)
+    if chat_id not in active_games: return await ack.answer()
     game = active_games[chat_id]
+    if user_id != game.creator_id:
+        return await ack.answer("Только создатель")
+    end_game(chat_id)
+    await ack.answer("Готово")
+    try:
+        await cb.message.edit_text("Игра завершена создателем.")
+    except Exception:
+        pass
+
+# выбор цели в режиме ANYONE
+@callbacks.action("target")
+async def tod_target(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    chat_id, user_id = _ids(cb)
+    if chat_id not in active_games: return await ack.answer()
+    game=active_games[chat_id]
+    if user_id!=game.current_player_id(): return await ack.answer("Не твой ход")
+    if game.mode!=MODE_ANYONE or game.phase!="select_target": return await ack.answer()
+    target_id = payload.int_arg(0)
+    if target_id is None: return await ack.answer()
+    if target_id not in game.players or target_id==user_id: return await ack.answer()
+    game.target_player_id = target_id
+    game.current_task = random_task(game, game.current_task_type)
+    game.phase="task_active"
+    label = "Правда" if game.current_task_type=="truth" else "Действие"
+    await ack.answer()
+    await cb.message.edit_text(
+        f"🎲 <b>{label}</b> для {mention_name(target_id, game.player_names[target_id])}:\n\n<i>{game.current_task}</i>\n\nПосле выполнения нажмите 'Далее'.",
+        parse_mode="HTML", reply_markup=next_keyboard(game))
+
+@callbacks.action("next")  # оставлено для совместимости (ANYONE)
+async def tod_next(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    chat_id, user_id = _ids(cb)
+    if chat_id not in active_games: return await ack.answer()
+    game=active_games[chat_id]
+    if game.mode != MODE_ANYONE: return await ack.answer()
+    if user_id!=game.current_player_id(): return await ack.answer("Не ты выполнял")
+    if game.phase!="task_active": return await ack.answer()
+    # после выполнения: ход получает тот, кто был целью
+    if game.target_player_id and game.target_player_id in game.players:
+        game.current_index = game.players.index(game.target_player_id)
+    game.phase = "waiting_action"
+    game.current_task = None
+    game.current_task_type = None
+    game.target_player_id = None
+    await ack.answer()
+    await cb.message.edit_text(
+        f"✅ Задание завершено! Теперь ход: {mention_name(game.current_player_id(), game.current_player_name())}",
+        parse_mode="HTML",
+        reply_markup=action_keyboard(game))
+
+@callbacks.action("done")
+async def tod_done(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck):
+    chat_id, user_id = _ids(cb)
+    if chat_id not in active_games: return await ack.answer()
+    game=active_games[chat_id]
+    # кнопку 'Задание выполнено' должен жать цель
+    if game.target_player_id != user_id: return await ack.answer("Не ты цель")
+    if game.phase!="task_active": return await ack.answer()
+    # цель становится новым спрашивающим
+    game.current_index = game.players.index(user_id)
+    game.phase = "waiting_choice" if game.mode==MODE_CLOCKWISE else "waiting_action"
+    game.current_task=None; game.current_task_type=None; game.target_player_id=None
+    await ack.answer("Готово")
+    if game.mode==MODE_CLOCKWISE:
+        nxt_target = game.players[(game.current_index+1)%len(game.players)]
+        await cb.message.edit_text(
+            f"✅ {mention_name(user_id, game.player_names[user_id])} выполнил(а) задание!\n\nТеперь спрашивающий: {mention_name(game.current_player_id(), game.current_player_name())}\n🎯 {mention_name(nxt_target, game.player_names[nxt_target])}, выбери: Правда / Действие / Random / Пас",
+            parse_mode='HTML',
+            reply_markup=target_choice_keyboard(game, nxt_target)
+        )
+    else:
+        await cb.message.edit_text(
+            f"✅ {mention_name(user_id, game.player_names[user_id])} выполнил(а) задание! Ход: {mention_name(game.current_player_id(), game.current_player_name())}",
+            parse_mode='HTML', reply_markup=action_keyboard(game))
+
+def _awaiting_from(entry: PendingInput):
+    game = active_games.get(entry.chat_id)
     # только если всё ещё его ход и ожидается контент
-    if game.current_player_id() != uid or game.phase != 'awaiting_content':
-        return
-    target = info['target']
+    if game is None or game.current_player_id() != entry.user_id or game.phase != 'awaiting_content':
+        return None
+    return game
+
+async def deliver_task(bot: Bot, chat_id: int, game: TruthOrDareGame, target: int, kind: str, text: str):
     game.target_player_id = target
-    game.current_task_type = info['type']
-    game.current_task = message.text.strip()
+    game.current_task_type = kind
+    game.current_task = text
     game.phase = 'task_active'
     # отправка цели в ЛС
     try:
@@ -438,17 +506,37 @@ async def private_task_input(message: Message, bot: Bot):
         parse_mode='HTML')
     await bot.send_message(chat_id,
         f"⏳ Ждём {mention_name(target, game.player_names[target])}…",
-        parse_mode='HTML', reply_markup=waiting_task_keyboard().as_markup())
+        parse_mode='HTML', reply_markup=waiting_task_keyboard())
+
+# Текст задания из ЛС спрашивающего (маршрутизируется через utils.pending_input)
+@pending_inputs.on_input("tod")
+async def private_task_input(message: Message, entry: PendingInput):
+    game = _awaiting_from(entry)
+    if game is None:
+        return
+    await deliver_task(message.bot, entry.chat_id, game, entry.data['target'], entry.data['type'], message.text.strip())
     # подтверждение автору
     await message.answer("✅ Отправлено цели. Ждём выполнения.")
 
+# Спрашивающий не ответил вовремя — выдаём случайное задание, чтобы игра не зависла
+@pending_inputs.on_timeout("tod")
+async def task_input_timeout(bot: Bot, entry: PendingInput):
+    game = _awaiting_from(entry)
+    if game is None:
+        return
+    asker = entry.user_id
+    await bot.send_message(entry.chat_id,
+        f"⌛ {mention_name(asker, game.player_names[asker])} не прислал(а) задание вовремя — выбираю случайное.",
+        parse_mode='HTML')
+    await deliver_task(bot, entry.chat_id, game, entry.data['target'], entry.data['type'], random_task(game, entry.data['type']))
+
 @router.message(Command(commands=["end_tod","stop_tod"]))
 async def cmd_end(message: Message):
     chat_id=message.chat.id; user_id=message.from_user.id
     if chat_id in active_games:
         game=active_games[chat_id]
         if user_id!=game.creator_id: return await message.answer("Завершить может только создатель")
-        del active_games[chat_id]; return await message.answer("Игра остановлена.")
+        end_game(chat_id); return await message.answer("Игра остановлена.")
     if chat_id in lobbies:
         lobby=lobbies[chat_id]
         if user_id!=lobby['creator']: return await message.answer("Только создатель лобби")
@@ -0,0 +1,5 @@
+from .ordering import ChatOrderingMiddleware, register_key_resolver
+from .triggers import TriggerMiddleware
+from .callback_ack import AckFirstMiddleware, CallbackAck
+from .user_cache import UserCacheMiddleware
+__all__ = ["ChatOrderingMiddleware", "register_key_resolver", "TriggerMiddleware", "AckFirstMiddleware", "CallbackAck", "UserCacheMiddleware"]
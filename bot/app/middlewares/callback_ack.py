@@ -0,0 +1,87 @@
+from __future__ import annotations
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Update
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackAck:
+    """Idempotent answer for one callback query.
+
+    The first ``answer()`` goes to Telegram, every later call is a no-op, so a handler
+    can acknowledge the press as soon as its checks pass and then do the slow work
+    (name lookups, ``edit_text``) without the client spinner waiting for it.
+    """
+
+    __slots__ = ("callback", "answered", "text")
+
+    def __init__(self, callback: CallbackQuery):
+        self.callback = callback
+        self.answered = False
+        self.text: Optional[str] = None
+
+    async def answer(self, text: Optional[str] = None, show_alert: Optional[bool] = None, **kwargs: Any) -> bool:
+        if self.answered:
+            if text:
+                # чаще всего ответ уже ушёл по таймеру AckFirstMiddleware: текст пользователь не увидит
+                logger.info("Callback %s (data=%r, user=%s) already answered with %r, late %s dropped: %r",
+                            self.callback.id, self.callback.data, getattr(self.callback.from_user, 'id', None),
+                            self.text, "alert" if show_alert else "toast", text)
+            return False
+        self.answered = True  # ставим до await, чтобы не было двойного ответа из таймера
+        self.text = text
+        try:
+            await self.callback.answer(text, show_alert=show_alert, **kwargs)
+        except Exception as e:
+            # устаревший query и т.п. — на логику игры не влияет
+            logger.warning("Cannot answer callback %s: %s", self.callback.id, e)
+        return True
+
+
+class AckFirstMiddleware(BaseMiddleware):
+    """Guarantee a fast answer for every callback query.
+
+    Handlers get a ``CallbackAck`` as ``ack`` and should answer right after validation.
+    If a handler hasn't answered within ``deadline`` seconds, the middleware answers on
+    its behalf (with ``default_text``, if any) while the handler keeps working. Errors are
+    logged and, when the press is still unanswered, reported to the user with a toast.
+
+    Registered as an update-level outer middleware *before* ``ChatOrderingMiddleware``:
+    the deadline starts when the update arrives, not when the chat/game lane frees up,
+    so a press queued behind a slow handler doesn't keep the spinner. The middleware
+    still awaits the handler, so per-chat ordering is preserved.
+    """
+
+    def __init__(self, deadline: float = 0.3, default_text: Optional[str] = None,
+                 error_text: str = "⚠️ Что-то пошло не так, попробуйте ещё раз"):
+        self.deadline = deadline
+        self.default_text = default_text
+        self.error_text = error_text
+        self._auto_answers: set = set()  # ссылки на фоновые ответы, чтобы их не собрал GC
+
+    async def __call__(self, handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]], event: Update, data: Dict[str, Any]):
+        callback = event.callback_query
+        if callback is None:
+            return await handler(event, data)
+        ack = CallbackAck(callback)
+        data["ack"] = ack  # data апдейта доходит до обработчика callback_query
+        timer = asyncio.get_running_loop().call_later(self.deadline, self._auto_answer, ack)
+        try:
+            return await handler(event, data)
+        except Exception:
+            logger.exception("Callback handler failed (data=%r, user=%s)", callback.data, getattr(callback.from_user, 'id', None))
+            await ack.answer(self.error_text)
+            raise
+        finally:
+            timer.cancel()
+            await ack.answer()
+
+    def _auto_answer(self, ack: CallbackAck):
+        if ack.answered:
+            return
+        task = asyncio.ensure_future(ack.answer(self.default_text))
+        self._auto_answers.add(task)
+        task.add_done_callback(self._auto_answers.discard)
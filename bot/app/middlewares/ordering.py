@@ -0,0 +1,94 @@
+from __future__ import annotations
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+# Функция, которая по апдейту возвращает ключ очереди (или None — «не знаю»)
+KeyResolver = Callable[[Update, Dict[str, Any]], Optional[Hashable]]
+
+# Дополнительные резолверы от игровых модулей (например, ЛС-ввод, относящийся к игре в группе)
+_key_resolvers: List[KeyResolver] = []
+
+
+def register_key_resolver(resolver: KeyResolver) -> KeyResolver:
+    """Register a resolver that maps an update to a game/chat ordering key.
+
+    Resolvers are asked in registration order before falling back to the chat id.
+    Can be used as a decorator.
+    """
+    _key_resolvers.append(resolver)
+    return resolver
+
+
+def default_update_key(update: Update, data: Dict[str, Any]) -> Optional[Hashable]:
+    for resolver in _key_resolvers:
+        try:
+            key = resolver(update, data)
+        except Exception as e:
+            logger.warning("Ordering key resolver %r failed: %s", resolver, e)
+            continue
+        if key is not None:
+            return key
+    chat = data.get("event_chat")
+    if chat is not None:
+        return chat.id
+    user = data.get("event_from_user")
+    if user is not None:
+        return ("user", user.id)
+    return None
+
+
+class _Lane:
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()  # asyncio.Lock будит ожидающих строго в порядке FIFO
+        self.pending = 0
+
+
+class ChatOrderingMiddleware(BaseMiddleware):
+    """Process updates of one chat (or game) strictly in arrival order.
+
+    Polling already runs every update in its own task, so different chats are handled
+    in parallel; this middleware only serializes tasks that share a key. Each key has
+    a bounded queue: when more than ``max_pending`` updates wait for the same chat,
+    new ones are dropped (flood / button spam) instead of piling up in memory.
+    Lanes are removed as soon as they drain, so idle chats cost nothing.
+    """
+
+    def __init__(self, max_pending: int = 32, key_func: KeyResolver = default_update_key):
+        self.max_pending = max_pending
+        self.key_func = key_func
+        self._lanes: Dict[Hashable, _Lane] = {}
+        self.dropped = 0
+
+    @property
+    def active_lanes(self) -> int:
+        return len(self._lanes)
+
+    async def __call__(self, handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]], event: Update, data: Dict[str, Any]):
+        key = self.key_func(event, data)
+        if key is None:
+            return await handler(event, data)
+
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane()
+        if lane.pending >= self.max_pending:
+            self.dropped += 1
+            logger.warning("Update %s dropped: queue for %r is full (%d)", event.update_id, key, lane.pending)
+            return UNHANDLED
+
+        lane.pending += 1
+        try:
+            async with lane.lock:
+                return await handler(event, data)
+        finally:
+            lane.pending -= 1
+            if lane.pending == 0 and self._lanes.get(key) is lane:
+                del self._lanes[key]
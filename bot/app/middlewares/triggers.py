@@ -0,0 +1,20 @@
+from __future__ import annotations
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+from ..utils.triggers import TriggerRegistry, triggers
+
+
+class TriggerMiddleware(BaseMiddleware):
+    """Match message text against the trigger index once and pass the result down.
+
+    Handlers receive it as ``text_triggers`` (frozenset of trigger names), and
+    ``Trigger`` filters become a set lookup instead of their own text scans.
+    """
+
+    def __init__(self, registry: TriggerRegistry = triggers):
+        self.registry = registry
+
+    async def __call__(self, handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]], event: Message, data: Dict[str, Any]):
+        data["text_triggers"] = self.registry.match(event.text)
+        return await handler(event, data)
@@ -0,0 +1,24 @@
+from __future__ import annotations
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+from ..utils.user_cache import UserDirectory, users
+
+ADMIN_STATUSES = {"creator", "administrator"}
+
+
+class UserCacheMiddleware(BaseMiddleware):
+    """Refresh the shared user/admin cache from data already present in updates."""
+
+    def __init__(self, directory: UserDirectory = users):
+        self.directory = directory
+
+    async def __call__(self, handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]], event: Update, data: Dict[str, Any]):
+        self.directory.remember_user(data.get("event_from_user"))
+        member_update = event.chat_member or event.my_chat_member
+        if member_update is not None:
+            self.directory.remember_user(member_update.new_chat_member.user)
+            old, new = member_update.old_chat_member.status, member_update.new_chat_member.status
+            if (old in ADMIN_STATUSES) != (new in ADMIN_STATUSES):
+                self.directory.invalidate_admins(member_update.chat.id)
+        return await handler(event, data)
@@ -0,0 +1,174 @@
+"""Сборка статики Mini-App: отпечатки в именах и заранее сжатые варианты.
+
+    python bot/app/mini_apps/truth_or_dare/assets.py        # -> dist/
+
+- ``app.js``, ``styles.css`` и всё из ``static/`` копируются в ``dist/`` под
+  именами с хешем содержимого (``app.3f9c1d2e7a.js``): файл с таким именем никогда
+  не меняется, поэтому сервер отдаёт его с ``Cache-Control: immutable`` на год;
+- текстовые файлы сжимаются заранее: ``.gz`` всегда, ``.br`` — если установлен
+  пакет ``brotli`` (необязательная зависимость, нужна только при сборке);
+  вариант сохраняется, только если он действительно меньше исходника;
+- ``dist/asset-manifest.json`` — логическое имя -> имя с хешем и доступные
+  кодировки; по нему ``templates/index.html`` получает ссылки на файлы
+  (PWA-``manifest.json`` — отдельный файл, его не трогаем).
+
+Сервер (``server.py``) читает манифест через ``AssetTable.load`` и держит сборку
+в памяти; без ``dist/`` статика отдаётся как раньше, с ревалидацией по ETag.
+"""
+from __future__ import annotations
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # без brotli собираем только gzip
+    brotli = None
+
+APP_FOLDER = os.path.dirname(os.path.abspath(__file__))
+STATIC_FOLDER = os.path.join(APP_FOLDER, 'static')
+DIST_FOLDER = os.path.join(APP_FOLDER, 'dist')
+MANIFEST_NAME = 'asset-manifest.json'
+
+# исходники рядом с сервером + всё из static/
+APP_SOURCES = ('app.js', 'styles.css')
+COMPRESSIBLE = ('.js', '.css', '.svg', '.json', '.html', '.txt')
+HASH_LENGTH = 10
+
+# (кодировка в Accept-Encoding, расширение файла) в порядке предпочтения
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def content_type(name: str) -> str:
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+def compress(data: bytes, encoding: str) -> Optional[bytes]:
+    """``data`` compressed with ``encoding`` (None if the codec is unavailable)."""
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9, mtime=0)  # mtime=0: одинаковый результат на каждой сборке
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(data, quality=11)
+    return None
+
+
+def sources(app_folder: str = APP_FOLDER, static_folder: str = STATIC_FOLDER) -> List[Tuple[str, str]]:
+    """``[(logical name, path)]`` of everything served under /static/."""
+    found = [(name, os.path.join(app_folder, name)) for name in APP_SOURCES
+             if os.path.isfile(os.path.join(app_folder, name))]
+    if os.path.isdir(static_folder):
+        found += [(name, os.path.join(static_folder, name)) for name in sorted(os.listdir(static_folder))
+                  if not name.startswith('.') and os.path.isfile(os.path.join(static_folder, name))]
+    return found
+
+
+def fingerprint(name: str, data: bytes) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def build(out: str = DIST_FOLDER, files: Optional[Iterable[Tuple[str, str]]] = None) -> Dict[str, dict]:
+    """Write fingerprinted and precompressed assets plus the manifest to ``out``; returns the manifest."""
+    if os.path.isdir(out):
+        shutil.rmtree(out)  # старые хеши не копим
+    os.makedirs(out)
+    manifest: Dict[str, dict] = {}
+    for name, path in (files if files is not None else sources()):
+        with open(path, 'rb') as f:
+            data = f.read()
+        hashed = fingerprint(name, data)
+        with open(os.path.join(out, hashed), 'wb') as f:
+            f.write(data)
+        encodings = {}
+        if name.endswith(COMPRESSIBLE):
+            for encoding, suffix in ENCODINGS:
+                packed = compress(data, encoding)
+                if packed is not None and len(packed) < len(data):
+                    with open(os.path.join(out, hashed + suffix), 'wb') as f:
+                        f.write(packed)
+                    encodings[encoding] = hashed + suffix
+        manifest[name] = {'file': hashed, 'size': len(data), 'encodings': encodings}
+    with open(os.path.join(out, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    return manifest
+
+
+def accepted_encodings(header: str) -> List[str]:
+    """Codings from Accept-Encoding the client takes (``q=0`` excluded)."""
+    accepted = []
+    for part in header.lower().split(','):
+        coding, _, params = part.strip().partition(';')
+        q = params.strip()
+        if coding and not (q.startswith('q=') and q[2:].strip() in ('0', '0.0', '0.00', '0.000')):
+            accepted.append(coding.strip())
+    return accepted
+
+
+class Asset:
+    __slots__ = ('content_type', 'variants')
+
+    def __init__(self, content_type: str, variants: Dict[Optional[str], bytes]):
+        self.content_type = content_type
+        self.variants = variants  # None -> исходные байты, 'br'/'gzip' -> сжатые
+
+    def pick(self, accept_encoding: str) -> Tuple[Optional[str], bytes]:
+        """Best variant for the request: br, then gzip, then identity."""
+        accepted = accepted_encodings(accept_encoding)
+        for encoding, _ in ENCODINGS:
+            if encoding in self.variants and (encoding in accepted or '*' in accepted):
+                return encoding, self.variants[encoding]
+        return None, self.variants[None]
+
+
+class AssetTable:
+    """Built assets kept in memory: logical name -> hashed URL, hashed name -> bytes."""
+
+    def __init__(self, manifest: Dict[str, dict], files: Dict[str, Asset]):
+        self.manifest = manifest
+        self.files = files
+
+    @classmethod
+    def load(cls, folder: str = DIST_FOLDER) -> Optional["AssetTable"]:
+        """Read ``asset-manifest.json`` and its files; None if there is no build."""
+        try:
+            with open(os.path.join(folder, MANIFEST_NAME), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        files = {}
+        for name, entry in manifest.items():
+            variants = {}
+            for encoding, filename in [(None, entry['file'])] + list(entry['encodings'].items()):
+                with open(os.path.join(folder, filename), 'rb') as f:
+                    variants[encoding] = f.read()
+            files[entry['file']] = Asset(content_type(name), variants)
+        return cls(manifest, files)
+
+    def url(self, name: str) -> Optional[str]:
+        entry = self.manifest.get(name)
+        return f"/static/{entry['file']}" if entry else None
+
+    def get(self, filename: str) -> Optional[Asset]:
+        return self.files.get(filename)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build fingerprinted, precompressed mini-app assets")
+    parser.add_argument("--out", default=DIST_FOLDER, help="output folder (default: %(default)s)")
+    args = parser.parse_args(argv)
+    manifest = build(args.out)
+    for name, entry in sorted(manifest.items()):
+        sizes = ", ".join(f"{enc} {os.path.getsize(os.path.join(args.out, fn))}" for enc, fn in entry['encodings'].items())
+        print(f"{name:<24} -> {entry['file']:<32} {entry['size']} B" + (f" ({sizes})" if sizes else ""))
+    if brotli is None:
+        print("brotli не установлен — собраны только .gz (pip install brotli)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Авторизация API Mini-App через Telegram WebApp ``initData``.
+
+- при запуске Mini-App клиент один раз отправляет ``Telegram.WebApp.initData`` на
+  ``POST /api/auth``; подпись проверяется по схеме Telegram
+  (HMAC-SHA256, ключ — HMAC("WebAppData", токен бота)), ответ — короткоживущий
+  подписанный токен сессии;
+- дальше запросы идут с ``Authorization: Bearer <token>`` (для SSE — ``?token=``):
+  проверенные токены лежат в LRU, и повторная проверка — это поиск в словаре;
+  токен не из кеша (другой воркер, перезапуск) проверяется одним HMAC без обращения
+  к Telegram и хранилищу;
+- токен несёт id и имя пользователя Telegram — игроки в лобби/играх привязаны к
+  ``telegram_id``.
+
+Токен бота читается при первом запросе (бот загружает .env позже, чем стартует
+сервер). Без ``BOT_TOKEN`` или с ``MINI_APP_AUTH=0`` авторизация выключена
+(локальная отладка вне Telegram).
+"""
+from __future__ import annotations
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl
+
+INIT_DATA_MAX_AGE = 24 * 60 * 60  # initData старше суток не принимаем
+SESSION_TTL = 60 * 60  # токен сессии; после — снова /api/auth с initData
+SESSION_CACHE_SIZE = 4096
+
+
+class AuthError(Exception):
+    """initData or session token is missing, forged or expired."""
+
+
+class Forbidden(Exception):
+    """The user is authenticated but not allowed to touch this lobby/game."""
+
+
+@dataclass(frozen=True)
+class TelegramUser:
+    id: int
+    name: str
+    expires: float = 0.0
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def verify_init_data(init_data: str, bot_token: str, max_age: float = INIT_DATA_MAX_AGE,
+                     now: Optional[float] = None) -> dict:
+    """Check the initData signature and age; returns the fields with ``user`` decoded."""
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received = fields.pop('hash', '')
+    if not received:
+        raise AuthError('initData has no hash')
+    check_string = '\n'.join(f'{key}={value}' for key, value in sorted(fields.items()))
+    secret = hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+    expected = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, received):
+        raise AuthError('Invalid initData signature')
+    auth_date = int(fields.get('auth_date', '0')) if fields.get('auth_date', '').isdigit() else 0
+    if (now if now is not None else time.time()) - auth_date > max_age:
+        raise AuthError('initData expired')
+    try:
+        fields['user'] = json.loads(fields.get('user', ''))
+    except ValueError:
+        raise AuthError('initData has no user') from None
+    if not isinstance(fields['user'], dict) or 'id' not in fields['user']:
+        raise AuthError('initData has no user')
+    return fields
+
+
+def display_name(user: dict) -> str:
+    name = ' '.join(part for part in (user.get('first_name'), user.get('last_name')) if part)
+    return (name or user.get('username') or str(user['id']))[:30]
+
+
+class MiniAppAuth:
+    """Issues and checks session tokens; verified tokens are kept in an LRU."""
+
+    def __init__(self, bot_token: Optional[str] = None, ttl: float = SESSION_TTL,
+                 cache_size: int = SESSION_CACHE_SIZE):
+        self._bot_token = bot_token
+        self._session_key: Optional[bytes] = None
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._sessions: "OrderedDict[str, TelegramUser]" = OrderedDict()
+
+    @property
+    def bot_token(self) -> str:
+        return self._bot_token if self._bot_token is not None else os.getenv('BOT_TOKEN', '')
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.bot_token) and os.getenv('MINI_APP_AUTH', '1') != '0'
+
+    @property
+    def session_key(self) -> bytes:
+        # ключ подписи токенов выводится из токена бота: общий для всех воркеров и переживает перезапуск
+        if self._session_key is None:
+            self._session_key = hmac.new(b'MiniAppSession', self.bot_token.encode(), hashlib.sha256).digest()
+        return self._session_key
+
+    def login(self, init_data: str) -> Tuple[str, TelegramUser]:
+        """Verify initData once and issue ``(token, user)``."""
+        fields = verify_init_data(init_data, self.bot_token)
+        user = TelegramUser(int(fields['user']['id']), display_name(fields['user']), time.time() + self.ttl)
+        payload = _b64(json.dumps({'id': user.id, 'name': user.name, 'exp': int(user.expires)},
+                                  ensure_ascii=False, separators=(',', ':')).encode())
+        token = f"{payload}.{self._sign(payload)}"
+        self._remember(token, user)
+        return token, user
+
+    def _sign(self, payload: str) -> str:
+        return _b64(hmac.new(self.session_key, payload.encode(), hashlib.sha256).digest()[:18])
+
+    def _remember(self, token: str, user: TelegramUser) -> None:
+        self._sessions[token] = user
+        if len(self._sessions) > self.cache_size:
+            self._sessions.popitem(last=False)
+
+    def authenticate(self, token: str) -> TelegramUser:
+        """User of a session token: LRU hit, or one HMAC check on a miss."""
+        if not token:
+            raise AuthError('Authorization required')
+        user = self._sessions.get(token)
+        if user is None:
+            payload, _, signature = token.partition('.')
+            if not signature or not hmac.compare_digest(self._sign(payload), signature):
+                raise AuthError('Invalid session token')
+            try:
+                data = json.loads(_unb64(payload))
+                user = TelegramUser(int(data['id']), str(data['name']), float(data['exp']))
+            except (ValueError, KeyError, TypeError):
+                raise AuthError('Invalid session token') from None
+            self._remember(token, user)
+        else:
+            self._sessions.move_to_end(token)
+        if user.expires < time.time():
+            self._sessions.pop(token, None)
+            raise AuthError('Session expired')
+        return user
+
+
+def bearer_token(request) -> str:
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[len('Bearer '):].strip()
+    return request.query.get('token', '')  # EventSource не умеет заголовки
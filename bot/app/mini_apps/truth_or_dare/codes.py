@@ -0,0 +1,49 @@
+"""Коды лобби mini-app: 6 символов A-Z0-9 без коллизий.
+
+Счётчик ``n`` проходит через аффинную перестановку ``(a * n + b) mod 36^6``:
+при ``a``, взаимно простом с 36^6, первые 36^6 кодов все разные, а соседние
+номера дают непохожие коды (угадать чужое лобби по своему коду нельзя).
+``a`` и ``b`` случайны на каждый процесс; коды лобби, восстановленных из снимка,
+всё же могут совпасть — такой код просто пропускается.
+"""
+from __future__ import annotations
+import itertools
+import math
+import random
+import threading
+from typing import Callable, Optional
+
+CODE_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+CODE_LENGTH = 6
+CODE_SPACE = len(CODE_ALPHABET) ** CODE_LENGTH
+
+
+def encode_code(value: int) -> str:
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, digit = divmod(value, len(CODE_ALPHABET))
+        chars.append(CODE_ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+class CodeAllocator:
+    """Hands out distinct lobby codes in O(1) without looking at the open lobbies."""
+
+    def __init__(self, rng: Optional[random.Random] = None):
+        rng = rng or random.SystemRandom()
+        while True:
+            self.a = rng.randrange(CODE_SPACE // 3, CODE_SPACE)
+            if math.gcd(self.a, CODE_SPACE) == 1:
+                break
+        self.b = rng.randrange(CODE_SPACE)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def next(self, taken: Callable[[str], bool] = lambda code: False) -> str:
+        """Next code; ``taken`` filters out codes already in use (restored lobbies)."""
+        while True:
+            with self._lock:
+                n = next(self._counter)
+            code = encode_code((self.a * n + self.b) % CODE_SPACE)
+            if not taken(code):
+                return code
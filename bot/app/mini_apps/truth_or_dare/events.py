@@ -0,0 +1,167 @@
+"""Push-обновления лобби и игр Mini-App (Server-Sent Events).
+
+Вместо опроса ``GET /api/lobby/<id>`` / ``GET /api/game/<id>`` клиент держит
+``GET .../events`` и получает только изменения: игрок зашёл, ход передан,
+выбрано задание.
+
+- у каждого лобби/игры свой канал с растущим ``id`` событий и кольцевым буфером
+  последних ``EVENT_BUFFER`` событий;
+- переподключение с ``Last-Event-ID`` досылает пропущенное из буфера; если
+  пропущено больше, чем в буфере (или сервер перезапускался), приходит событие
+  ``reset`` — клиент один раз перечитывает состояние целиком;
+- событие кодируется в байты один раз при публикации, рассылка подписчикам —
+  только запись в их очереди;
+- медленный подписчик, у которого накопилось больше ``SUBSCRIBER_BACKLOG``
+  событий, отключается (и при переподключении дочитает из буфера).
+
+Каналы живут в памяти процесса: с ``MINI_APP_DB`` несколько воркеров делят
+состояние, но события получают только подписчики того воркера, где оно произошло.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+EVENT_BUFFER = 64  # событий на канал для переподключения
+SUBSCRIBER_BACKLOG = 256  # непрочитанных событий у одного подписчика
+CHANNEL_IDLE = 6 * 60 * 60  # канал без подписчиков и событий забываем (как GAME_TTL)
+KEEPALIVE_INTERVAL = 15  # комментарий-пинг, чтобы прокси не рвали соединение
+
+ChannelKey = Tuple[str, str]
+
+
+def encode_event(event_id: int, event: str, data: Any) -> bytes:
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n".encode()
+
+
+RESET = b"event: reset\ndata: {}\n\n"
+PING = b": ping\n\n"
+
+
+class Subscription:
+    """One SSE client: encoded events waiting to be written."""
+
+    __slots__ = ("pending", "wakeup", "closed")
+
+    def __init__(self):
+        self.pending: Deque[bytes] = deque()
+        self.wakeup = asyncio.Event()
+        self.closed = False
+
+    def push(self, chunk: bytes) -> None:
+        if self.closed:
+            return
+        if len(self.pending) >= SUBSCRIBER_BACKLOG:
+            self.close()  # не успевает читать — пусть переподключится с Last-Event-ID
+            return
+        self.pending.append(chunk)
+        self.wakeup.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self.wakeup.set()
+
+    async def chunks(self, keepalive: float = KEEPALIVE_INTERVAL) -> AsyncIterator[bytes]:
+        """Yield encoded events as they arrive (a ping after ``keepalive`` idle seconds)."""
+        while not self.closed or self.pending:
+            if not self.pending:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), keepalive)
+                except asyncio.TimeoutError:
+                    yield PING
+                    continue
+                self.wakeup.clear()
+            while self.pending:
+                yield self.pending.popleft()
+
+
+class Channel:
+    __slots__ = ("last_id", "buffer", "subscribers", "touched")
+
+    def __init__(self):
+        self.last_id = 0
+        self.buffer: Deque[Tuple[int, bytes]] = deque(maxlen=EVENT_BUFFER)
+        self.subscribers: Set[Subscription] = set()
+        self.touched = time.monotonic()
+
+
+class EventHub:
+    """Per lobby/game event channels with a replay buffer (see module docstring)."""
+
+    def __init__(self):
+        self.channels: Dict[ChannelKey, Channel] = {}
+        self._swept_at = time.monotonic()
+
+    def _channel(self, kind: str, key: str) -> Channel:
+        channel = self.channels.get((kind, key))
+        if channel is None:
+            channel = self.channels[(kind, key)] = Channel()
+        channel.touched = time.monotonic()
+        return channel
+
+    def publish(self, kind: str, key: str, event: str, data: Any) -> int:
+        """Append an event to the channel and fan it out; returns its id."""
+        self._sweep()
+        channel = self._channel(kind, key)
+        channel.last_id += 1
+        chunk = encode_event(channel.last_id, event, data)
+        channel.buffer.append((channel.last_id, chunk))
+        for sub in channel.subscribers:
+            sub.push(chunk)
+        return channel.last_id
+
+    def subscribe(self, kind: str, key: str, last_event_id: Optional[int] = None) -> Subscription:
+        """New subscription, pre-filled with what the client missed after ``last_event_id``."""
+        channel = self._channel(kind, key)
+        sub = Subscription()
+        if last_event_id is not None and last_event_id != channel.last_id:
+            missed = self._replay(channel, last_event_id)
+            if missed is None:
+                sub.push(RESET)
+            else:
+                for chunk in missed:
+                    sub.push(chunk)
+        channel.subscribers.add(sub)
+        return sub
+
+    def _replay(self, channel: Channel, last_event_id: int) -> Optional[List[bytes]]:
+        oldest = channel.buffer[0][0] if channel.buffer else channel.last_id + 1
+        if last_event_id > channel.last_id or last_event_id < oldest - 1:
+            return None  # id из будущего (перезапуск) или уже вытеснен из буфера
+        return [chunk for event_id, chunk in channel.buffer if event_id > last_event_id]
+
+    def unsubscribe(self, kind: str, key: str, sub: Subscription) -> None:
+        channel = self.channels.get((kind, key))
+        if channel is not None:
+            channel.subscribers.discard(sub)
+            channel.touched = time.monotonic()
+
+    def last_id(self, kind: str, key: str) -> int:
+        channel = self.channels.get((kind, key))
+        return channel.last_id if channel is not None else 0
+
+    def close_all(self) -> None:
+        """Finish every open stream (server shutdown)."""
+        for channel in self.channels.values():
+            for sub in channel.subscribers:
+                sub.close()
+
+    def _sweep(self) -> None:
+        # ленивая чистка раз в минуту: каналы без подписчиков, давно без событий
+        now = time.monotonic()
+        if now - self._swept_at < 60:
+            return
+        self._swept_at = now
+        for channel_key, channel in list(self.channels.items()):
+            if not channel.subscribers and now - channel.touched > CHANNEL_IDLE:
+                del self.channels[channel_key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"channels": len(self.channels),
+                "subscribers": sum(len(c.subscribers) for c in self.channels.values())}
+
+
+events = EventHub()
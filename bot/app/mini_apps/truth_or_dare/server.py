@@ -1,192 +1,316 @@
-from flask import Flask, render_template, jsonify, request
-from flask_cors import CORS
+import asyncio
+import hashlib
+import json
+import logging
 import os
+import re
 import uuid
-import json
 from datetime import datetime, timedelta
 import random
+from collections import OrderedDict
+from aiohttp import web
+from .assets import DIST_FOLDER, ENCODINGS, IMMUTABLE, Asset, AssetTable, compress
+from .auth import AuthError, Forbidden, MiniAppAuth, bearer_token
+from .events import events
+from .store import GAME, HISTORY_LIMIT, LOBBY, MemoryStore, SQLiteStore, StoreBusy, StoreConflict
+from ...games.tod_content import PromptDeck, tod_content
+from ...utils.sessions import sessions
 
-app = Flask(__name__)
-CORS(app)
+logger = logging.getLogger(__name__)
 
-# Хранилище данных (в реальном приложении использовать базу данных)
-lobbies = {}
-games = {}
-players = {}
-
-# Загрузка контента для игры
-CONTENT_FILE = os.path.join(os.path.dirname(__file__), '../../../truth_or_dare_content.json')
-try:
-    with open(CONTENT_FILE, 'r', encoding='utf-8') as f:
-        GAME_CONTENT = json.load(f)
-except FileNotFoundError:
-    GAME_CONTENT = {"truths": {"safe": [], "spicy": [], "risky": []}, "dares": {"safe": [], "spicy": [], "risky": []}}
+routes = web.RouteTableDef()
 
 # Конфигурация
-STATIC_FOLDER = os.path.join(os.path.dirname(__file__), 'static')
-TEMPLATES_FOLDER = os.path.join(os.path.dirname(__file__), 'templates')
+APP_FOLDER = os.path.dirname(__file__)
+STATIC_FOLDER = os.path.join(APP_FOLDER, 'static')
+TEMPLATES_FOLDER = os.path.join(APP_FOLDER, 'templates')
 
 # Убедимся, что папки существуют
 os.makedirs(STATIC_FOLDER, exist_ok=True)
 os.makedirs(TEMPLATES_FOLDER, exist_ok=True)
 
-@app.route('/')
-def index():
-    """Главная страница Mini-App"""
-    return render_template('index.html')
+def _env_int(name, default):
+    raw = os.getenv(name, "")
+    return int(raw) if raw.isdigit() and int(raw) > 0 else default
+
+# Параметры HTTP-сервера (.env): одновременно обрабатываемые запросы и keep-alive
+MAX_CONCURRENCY = _env_int("MINI_APP_CONCURRENCY", 64)
+KEEPALIVE_TIMEOUT = _env_int("MINI_APP_KEEPALIVE", 75)
+
+# Хранилище лобби/игр: MINI_APP_DB — файл SQLite (общий для нескольких процессов), иначе — память процесса
+store = SQLiteStore(os.environ["MINI_APP_DB"]) if os.getenv("MINI_APP_DB") else MemoryStore()
+
+def json_response(data, status=200):
+    return web.json_response(data, status=status)
+
+async def json_body(request):
+    """Тело запроса как dict (пустой dict, если JSON нет или он битый)"""
+    try:
+        data = await request.json()
+    except (ValueError, UnicodeDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+_STATIC_URL = re.compile(r"\{\{\s*url_for\('static',\s*filename='([^']+)'\)\s*\}\}")
+
+def render_index(assets=None):
+    """templates/index.html со ссылками на /static/ (из сборки — с хешем в имени; шаблон читается один раз)"""
+    def url(m):
+        return (assets and assets.url(m.group(1))) or f"/static/{m.group(1)}"
+    with open(os.path.join(TEMPLATES_FOLDER, 'index.html'), encoding='utf-8') as f:
+        return _STATIC_URL.sub(url, f.read())
+
+def index_asset(assets=None):
+    """Страница целиком в памяти: исходник и сжатые варианты, ETag по содержимому"""
+    html = render_index(assets).encode('utf-8')
+    variants = {None: html}
+    for encoding, _ in ENCODINGS:
+        packed = compress(html, encoding)
+        if packed is not None and len(packed) < len(html):
+            variants[encoding] = packed
+    return Asset('text/html', variants), hashlib.sha256(html).hexdigest()[:16]
+
+def asset_response(request, asset, cache_control):
+    encoding, body = asset.pick(request.headers.get('Accept-Encoding', ''))
+    response = web.Response(body=body, headers={'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'})
+    response.content_type = asset.content_type
+    if asset.content_type.startswith('text/') or asset.content_type.endswith(('javascript', 'json', 'svg+xml')):
+        response.charset = 'utf-8'
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+@routes.get('/')
+async def index(request):
+    """Главная страница Mini-App: no-cache + ETag — повторное открытие получает 304"""
+    page = request.app.get('index_page')
+    if page is None:
+        page = request.app['index_page'] = index_asset(request.app['assets'])
+    asset, etag = page
+    if any(tag.value == etag for tag in request.if_none_match or ()):
+        response = web.Response(status=304, headers={'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'})
+    else:
+        response = asset_response(request, asset, 'no-cache')
+    response.etag = etag
+    return response
+
+@routes.get('/static/{filename}')
+async def static_file(request):
+    """Статика: файлы сборки (dist/, имя с хешем — кеш навсегда), иначе static/ и app.js / styles.css рядом с сервером"""
+    filename = request.match_info['filename']
+    if '/' in filename or '\\' in filename or filename.startswith('.'):
+        raise web.HTTPNotFound()
+    assets = request.app['assets']
+    asset = assets.get(filename) if assets else None
+    if asset is not None:
+        return asset_response(request, asset, IMMUTABLE)
+    for folder in (STATIC_FOLDER, APP_FOLDER):
+        path = os.path.join(folder, filename)
+        if os.path.isfile(path) and (folder == STATIC_FOLDER or filename.endswith(('.js', '.css', '.json'))):
+            # без сборки: браузер переспрашивает и получает 304 по ETag файла
+            return web.FileResponse(path, headers={'Cache-Control': 'no-cache'})
+    raise web.HTTPNotFound()
 
-@app.route('/api/health')
-def health_check():
+@routes.get('/api/health')
+async def health_check(request):
     """Проверка состояния API"""
-    return jsonify({
+    return json_response({
         'status': 'ok',
         'timestamp': datetime.now().isoformat()
     })
 
-@app.route('/api/lobby', methods=['POST'])
-def create_lobby():
+@routes.post('/api/auth')
+async def auth_login(request):
+    """Вход по Telegram.WebApp.initData (один раз за запуск Mini-App): токен сессии для остальных запросов"""
+    auth = request.app['auth']
+    if not auth.enabled:
+        return json_response({'token': None, 'auth': False}, 200)
+    data = await json_body(request)
+    try:
+        token, user = auth.login(str(data.get('init_data', '')))
+    except AuthError as e:
+        return json_response({'error': str(e)}, 401)
+    return json_response({
+        'token': token,
+        'expires_in': int(auth.ttl),
+        'user': {'id': user.id, 'name': user.name}
+    }, 200)
+
+def new_player(name, is_host=False, user=None):
+    return {
+        'id': str(uuid.uuid4()),
+        'name': name,
+        'is_host': is_host,
+        'telegram_id': user.id if user is not None else None,  # игрок привязан к аккаунту Telegram
+        'joined_at': datetime.now()
+    }
+
+def check_member(obj, user, host_only=False):
+    """Forbidden, если пользователь Telegram не игрок этого лобби/игры (без авторизации — пропускаем)"""
+    if user is None:
+        return
+    for player in obj['players']:
+        if player.get('telegram_id') == user.id and (player['is_host'] or not host_only):
+            return
+    raise Forbidden('Only the host can do this' if host_only else 'You are not a player of this game')
+
+def check_turn(game, user, host_override=False):
+    """Forbidden, если сейчас ход другого игрока (хост может передать чужой ход — ``host_override``)"""
+    if user is None:
+        return
+    check_member(game, user)
+    current = game['players'][game['current_player_index']]
+    if current.get('telegram_id') == user.id:
+        return
+    if host_override and any(p['is_host'] and p.get('telegram_id') == user.id for p in game['players']):
+        return
+    raise Forbidden("It is not your turn")
+
+@routes.post('/api/lobby')
+async def create_lobby(request):
     """Создание нового лобби"""
-    data = request.get_json()
+    data = await json_body(request)
+    user = request['tg_user']
+    if user is not None:
+        data.setdefault('player_name', user.name)
     
     # Проверка обязательных полей
     required_fields = ['player_name', 'game_mode', 'rules_mode', 'difficulty_setting']
     for field in required_fields:
         if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
+            return json_response({'error': f'Missing required field: {field}'}, 400)
     
     # Проверка валидности значений
     if data['game_mode'] not in ['clockwise', 'anyone']:
-        return jsonify({'error': 'Invalid game_mode. Use "clockwise" or "anyone"'}), 400
+        return json_response({'error': 'Invalid game_mode. Use "clockwise" or "anyone"'}, 400)
     
     if data['rules_mode'] not in ['with', 'without']:
-        return jsonify({'error': 'Invalid rules_mode. Use "with" or "without"'}), 400
+        return json_response({'error': 'Invalid rules_mode. Use "with" or "without"'}, 400)
     
     if data['difficulty_setting'] not in ['all', 'safe', 'spicy', 'risky']:
-        return jsonify({'error': 'Invalid difficulty_setting. Use "all", "safe", "spicy", or "risky"'}), 400
+        return json_response({'error': 'Invalid difficulty_setting. Use "all", "safe", "spicy", or "risky"'}, 400)
     
-    # Генерация уникального кода лобби
-    lobby_code = generate_unique_code()
-    
-    # Создание лобби
-    lobby_id = str(uuid.uuid4())
-    lobbies[lobby_id] = {
-        'id': lobby_id,
-        'code': lobby_code,
+    # Создание лобби (уникальный код выдаёт хранилище)
+    host = new_player(data['player_name'], is_host=True, user=user)
+    lobby = await store.run(store.create_lobby, lambda code: {
+        'id': str(uuid.uuid4()),
+        'code': code,
         'game_mode': data['game_mode'],
         'rules_mode': data['rules_mode'],
         'difficulty_setting': data['difficulty_setting'],
         'created_at': datetime.now(),
-        'players': [{
-            'id': str(uuid.uuid4()),
-            'name': data['player_name'],
-            'is_host': True,
-            'joined_at': datetime.now()
-        }],
-        'max_players': 8
-    }
-    
-    # Сохранение игрока
-    player_id = lobbies[lobby_id]['players'][0]['id']
-    players[player_id] = {
-        'id': player_id,
-        'name': data['player_name'],
-        'lobby_id': lobby_id
-    }
+        'players': [host],
+        'max_players': 8,
+        'version': 1
+    })
     
-    return jsonify({
-        'lobby_id': lobby_id,
-        'lobby_code': lobby_code,
-        'player_id': player_id
-    }), 201
-
-@app.route('/api/lobby/<lobby_code>/join', methods=['POST'])
-def join_lobby(lobby_code):
+    return json_response({
+        'lobby_id': lobby['id'],
+        'lobby_code': lobby['code'],
+        'player_id': host['id']
+    }, 201)
+
+@routes.post('/api/lobby/{lobby_code}/join')
+async def join_lobby(request):
     """Присоединение к лобби по коду"""
-    data = request.get_json()
+    data = await json_body(request)
+    user = request['tg_user']
+    if user is not None:
+        data.setdefault('player_name', user.name)
     
     # Поиск лобби по коду
-    lobby = find_lobby_by_code(lobby_code)
-    if not lobby:
-        return jsonify({'error': 'Lobby not found'}), 404
-    
-    # Проверка максимального количества игроков
-    if len(lobby['players']) >= lobby['max_players']:
-        return jsonify({'error': 'Lobby is full'}), 400
+    lobby_id = await store.run(store.lobby_id_by_code, request.match_info['lobby_code'])
+    if lobby_id is None:
+        return json_response({'error': 'Lobby not found'}, 404)
     
     # Проверка наличия имени игрока
     if 'player_name' not in data:
-        return jsonify({'error': 'Missing player name'}), 400
+        return json_response({'error': 'Missing player name'}, 400)
     
     # Проверка длины имени
     if len(data['player_name']) > 30:
-        return jsonify({'error': 'Player name too long (max 30 characters)'}), 400
-    
-    # Добавление игрока в лобби
-    player_id = str(uuid.uuid4())
-    lobby['players'].append({
-        'id': player_id,
-        'name': data['player_name'],
-        'is_host': False,
-        'joined_at': datetime.now()
-    })
-    
-    # Сохранение игрока
-    players[player_id] = {
-        'id': player_id,
-        'name': data['player_name'],
-        'lobby_id': lobby['id']
+        return json_response({'error': 'Player name too long (max 30 characters)'}, 400)
+    
+    # Добавление игрока в лобби (проверка max_players — под замком лобби);
+    # повторный вход того же пользователя Telegram возвращает его место
+    player = new_player(data['player_name'], user=user)
+    try:
+        seated = await store.run(store.join_lobby, lobby_id, player)
+    except StoreConflict as e:
+        return json_response({'error': str(e)}, 400)
+    if seated is None:
+        return json_response({'error': 'Lobby not found'}, 404)
+    if seated['id'] == player['id']:
+        events.publish(LOBBY, lobby_id, 'player_joined', player_view(player))
+    
+    return json_response({
+        'player_id': seated['id'],
+        'lobby_id': lobby_id
+    }, 200)
+
+# Условные GET: ETag = версия объекта + номер последнего события; тело ответа
+# сериализуется один раз на версию и лежит в LRU-кеше
+BODY_CACHE_SIZE = 512
+HISTORY_MAX_PAGE = 200
+_body_cache = OrderedDict()
+
+async def versioned_get(request, kind, key, view, not_found):
+    """304 по If-None-Match или закешированное тело; объект читается только при новой версии"""
+    version = await store.run(store.version, kind, key)
+    if version is None:
+        return json_response({'error': not_found}, 404)
+    etag = f"{version}.{events.last_id(kind, key)}"
+    if any(tag.value == etag for tag in request.if_none_match or ()):
+        response = web.Response(status=304, headers={'Cache-Control': 'no-cache'})
+        response.etag = etag
+        return response
+    cached = _body_cache.get((kind, key))
+    if cached is None or cached[0] != etag:
+        found, data = await store.run(store.read, kind, key, view)
+        if not found:
+            return json_response({'error': not_found}, 404)
+        # объект мог измениться между version() и read() — ETag берём из прочитанного
+        cached = _body_cache[(kind, key)] = (f"{data['version']}.{data['event_id']}", json.dumps(data).encode())
+        if len(_body_cache) > BODY_CACHE_SIZE:
+            _body_cache.popitem(last=False)
+    _body_cache.move_to_end((kind, key))
+    response = web.Response(body=cached[1], content_type='application/json', headers={'Cache-Control': 'no-cache'})
+    response.etag = cached[0]
+    return response
+
+def player_view(player):
+    return {
+        'id': player['id'],
+        'name': player['name'],
+        'is_host': player['is_host'],
+        'joined_at': player['joined_at'].isoformat()
     }
-    
-    return jsonify({
-        'player_id': player_id,
-        'lobby_id': lobby['id']
-    }), 200
 
-@app.route('/api/lobby/<lobby_id>')
-def get_lobby(lobby_id):
-    """Получение информации о лобби"""
-    if lobby_id not in lobbies:
-        return jsonify({'error': 'Lobby not found'}), 404
-    
-    lobby = lobbies[lobby_id]
-    
-    # Форматирование данных для ответа
-    response = {
+def lobby_view(lobby):
+    """Форматирование данных лобби для ответа"""
+    return {
         'id': lobby['id'],
         'code': lobby['code'],
         'game_mode': lobby['game_mode'],
         'rules_mode': lobby['rules_mode'],
         'difficulty_setting': lobby['difficulty_setting'],
         'created_at': lobby['created_at'].isoformat(),
-        'players': [{
-            'id': player['id'],
-            'name': player['name'],
-            'is_host': player['is_host'],
-            'joined_at': player['joined_at'].isoformat()
-        } for player in lobby['players']],
+        'players': [player_view(player) for player in lobby['players']],
         'player_count': len(lobby['players']),
-        'max_players': lobby['max_players']
+        'max_players': lobby['max_players'],
+        'version': lobby.get('version', 0),
+        'event_id': events.last_id(LOBBY, lobby['id'])  # с него подписываться на /events
     }
-    
-    return jsonify(response), 200
 
-@app.route('/api/lobby/<lobby_id>/start', methods=['POST'])
-def start_game(lobby_id):
-    """Начало игры из лобби"""
-    if lobby_id not in lobbies:
-        return jsonify({'error': 'Lobby not found'}), 404
-    
-    lobby = lobbies[lobby_id]
-    
-    # Проверка минимального количества игроков
-    if len(lobby['players']) < 2:
-        return jsonify({'error': 'Minimum 2 players required'}), 400
-    
-    # Создание игры
-    game_id = str(uuid.uuid4())
-    games[game_id] = {
-        'id': game_id,
-        'lobby_id': lobby_id,
+@routes.get('/api/lobby/{lobby_id}')
+async def get_lobby(request):
+    """Получение информации о лобби"""
+    return await versioned_get(request, LOBBY, request.match_info['lobby_id'], lobby_view, 'Lobby not found')
+
+def game_from_lobby(lobby):
+    return {
+        'id': str(uuid.uuid4()),
+        'lobby_id': lobby['id'],
         'game_mode': lobby['game_mode'],
         'rules_mode': lobby['rules_mode'],
         'difficulty_setting': lobby['difficulty_setting'],
@@ -195,27 +319,40 @@ def start_game(lobby_id):
         'passes_used': {player['id']: 0 for player in lobby['players']},
         'started_at': datetime.now(),
         'status': 'active',
-        'history': []  # История заданий
+        'history': [],  # История заданий (последние HISTORY_LIMIT, остальное — в архиве хранилища)
+        'history_count': 0,
+        'version': 1,
+        'deck': PromptDeck()  # задания без повторов в пределах игры
     }
-    
-    # Удаление лобби
-    del lobbies[lobby_id]
-    
-    return jsonify({
-        'game_id': game_id,
+
+@routes.post('/api/lobby/{lobby_id}/start')
+async def start_game(request):
+    """Начало игры из лобби"""
+    def start(lobby):
+        check_member(lobby, request['tg_user'], host_only=True)
+        # Проверка минимального количества игроков
+        if len(lobby['players']) < 2:
+            raise StoreConflict('Minimum 2 players required')
+        return game_from_lobby(lobby)
+    
+    try:
+        game = await store.run(store.start_game, request.match_info['lobby_id'], start)
+    except StoreConflict as e:
+        return json_response({'error': str(e)}, 400)
+    except Forbidden as e:
+        return json_response({'error': str(e)}, 403)
+    if game is None:
+        return json_response({'error': 'Lobby not found'}, 404)
+    events.publish(LOBBY, game['lobby_id'], 'game_started', {'game_id': game['id']})
+    
+    return json_response({
+        'game_id': game['id'],
         'message': 'Game started successfully'
-    }), 200
+    }, 200)
 
-@app.route('/api/game/<game_id>')
-def get_game(game_id):
-    """Получение информации об игре"""
-    if game_id not in games:
-        return jsonify({'error': 'Game not found'}), 404
-    
-    game = games[game_id]
-    
-    # Форматирование данных для ответа
-    response = {
+def game_view(game):
+    """Форматирование данных игры для ответа"""
+    return {
         'id': game['id'],
         'game_mode': game['game_mode'],
         'rules_mode': game['rules_mode'],
@@ -229,59 +366,73 @@ def get_game(game_id):
         'current_player_id': game['players'][game['current_player_index']]['id'],
         'started_at': game['started_at'].isoformat(),
         'status': game['status'],
-        'history': game['history']
+        'history': list(game['history']),
+        'history_count': game.get('history_count', len(game['history'])),
+        'version': game.get('version', 0),
+        'event_id': events.last_id(GAME, game['id'])
     }
-    
-    return jsonify(response), 200
 
-@app.route('/api/game/<game_id>/next-turn', methods=['POST'])
-def next_turn(game_id):
-    """Передача хода следующему игроку"""
-    if game_id not in games:
-        return jsonify({'error': 'Game not found'}), 404
-    
-    game = games[game_id]
-    
-    # Обновление индекса текущего игрока
-    game['current_player_index'] = (game['current_player_index'] + 1) % len(game['players'])
-    
-    return jsonify({
-        'message': 'Turn passed successfully',
+@routes.get('/api/game/{game_id}')
+async def get_game(request):
+    """Получение информации об игре"""
+    return await versioned_get(request, GAME, request.match_info['game_id'], game_view, 'Game not found')
+
+@routes.get('/api/game/{game_id}/history')
+async def get_history(request):
+    """История заданий по страницам: ?since=<seq>&limit=<n>; next — курсор следующей страницы"""
+    since = request.query.get('since', '0')
+    limit = request.query.get('limit', str(HISTORY_LIMIT))
+    if not since.isdigit() or not limit.isdigit():
+        return json_response({'error': 'since and limit must be non-negative integers'}, 400)
+    found, page = await store.run(store.history_page, request.match_info['game_id'], int(since),
+                                  min(int(limit), HISTORY_MAX_PAGE))
+    if not found:
+        return json_response({'error': 'Game not found'}, 404)
+    return json_response(page, 200)
+
+def turn_view(game, message=None):
+    view = {
         'current_player': game['players'][game['current_player_index']]['name'],
         'current_player_id': game['players'][game['current_player_index']]['id']
-    }), 200
+    }
+    if message is not None:
+        view['message'] = message
+    return view
 
-@app.route('/api/game/<game_id>/make-choice', methods=['POST'])
-def make_choice(game_id):
-    """Сделать выбор (правда, действие, пас и т.д.)"""
-    if game_id not in games:
-        return jsonify({'error': 'Game not found'}), 404
-    
-    game = games[game_id]
-    data = request.get_json()
-    
-    if 'choice_type' not in data:
-        return jsonify({'error': 'Missing choice_type'}), 400
-    
+@routes.post('/api/game/{game_id}/next-turn')
+async def next_turn(request):
+    """Передача хода следующему игроку"""
+    game_id = request.match_info['game_id']
+    def advance(game):
+        check_turn(game, request['tg_user'], host_override=True)  # хост может пропустить отошедшего игрока
+        store.advance_turn(game)
+        return turn_view(game)
+    
+    try:
+        found, turn = await store.run(store.update, GAME, game_id, advance)
+    except Forbidden as e:
+        return json_response({'error': str(e)}, 403)
+    if not found:
+        return json_response({'error': 'Game not found'}, 404)
+    events.publish(GAME, game_id, 'turn_passed', turn)
+    return json_response({'message': 'Turn passed successfully', **turn}, 200)
+
+def apply_choice(game, data, user=None):
+    """Выбор (правда, действие, пас) — выполняется под замком игры.
+
+    Возвращает (ответ, статус, событие для подписчиков или None)."""
+    check_turn(game, user)  # пас и задание — только за себя
     choice_type = data['choice_type']
     
     if choice_type == 'pass':
-        # Проверка, можно ли использовать пас
-        current_player_id = game['players'][game['current_player_index']]['id']
+        # Пас: проверка лимита и переход хода — одна атомарная операция
         max_passes = 1 if game['rules_mode'] == 'with' else float('inf')
-        
-        if game['passes_used'][current_player_id] >= max_passes:
-            return jsonify({'error': 'Maximum passes used'}), 400
-        
-        # Использовать пас
-        game['passes_used'][current_player_id] += 1
-        game['current_player_index'] = (game['current_player_index'] + 1) % len(game['players'])
-        
-        return jsonify({
-            'message': 'Pass used, turn passed to next player',
-            'current_player': game['players'][game['current_player_index']]['name'],
-            'current_player_id': game['players'][game['current_player_index']]['id']
-        }), 200
+        try:
+            store.use_pass(game, max_passes)
+        except StoreConflict as e:
+            return {'error': str(e)}, 400, None
+        turn = turn_view(game)
+        return {'message': 'Pass used, turn passed to next player', **turn}, 200, ('turn_passed', {**turn, 'pass': True})
     
     elif choice_type in ['truth', 'dare', 'random']:
         # Генерация задания
@@ -293,17 +444,17 @@ def make_choice(game_id):
             target_player_index = (game['current_player_index'] + 1) % len(game['players'])
         else:  # anyone
             if 'target_player_id' not in data:
-                return jsonify({'error': 'Target player required in "anyone" mode'}), 400
+                return {'error': 'Target player required in "anyone" mode'}, 400, None
             target_player_id = data['target_player_id']
             target_player_index = next((i for i, p in enumerate(game['players']) if p['id'] == target_player_id), -1)
             if target_player_index == -1:
-                return jsonify({'error': 'Target player not found in game'}), 400
+                return {'error': 'Target player not found in game'}, 400, None
         
         # Получение контента
-        content = get_random_content(choice_type, game['difficulty_setting'])
+        content = get_random_content(choice_type, game['difficulty_setting'], game.setdefault('deck', PromptDeck()))
         
         # Добавление в историю
-        game['history'].append({
+        entry = store.append_history(game, {
             'from_player_id': game['players'][game['current_player_index']]['id'],
             'to_player_id': game['players'][target_player_index]['id'],
             'type': choice_type,
@@ -311,67 +462,178 @@ def make_choice(game_id):
             'timestamp': datetime.now().isoformat()
         })
         
-        return jsonify({
+        return {
             'message': f'{choice_type.capitalize()} selected',
             'content': content,
             'from_player': game['players'][game['current_player_index']]['name'],
             'to_player': game['players'][target_player_index]['name'],
             'type': choice_type
-        }), 200
+        }, 200, ('choice_made', entry)
     
     else:
-        return jsonify({'error': 'Invalid choice_type. Use "truth", "dare", "random", or "pass"'}), 400
+        return {'error': 'Invalid choice_type. Use "truth", "dare", "random", or "pass"'}, 400, None
+
+@routes.post('/api/game/{game_id}/make-choice')
+async def make_choice(request):
+    """Сделать выбор (правда, действие, пас и т.д.)"""
+    data = await json_body(request)
+    if 'choice_type' not in data:
+        return json_response({'error': 'Missing choice_type'}, 400)
+    
+    game_id = request.match_info['game_id']
+    try:
+        found, result = await store.run(store.update, GAME, game_id, lambda game: apply_choice(game, data, request['tg_user']))
+    except Forbidden as e:
+        return json_response({'error': str(e)}, 403)
+    if not found:
+        return json_response({'error': 'Game not found'}, 404)
+    response, status, event = result
+    if event is not None:
+        events.publish(GAME, game_id, *event)
+    return json_response(response, status)
 
-def get_random_content(content_type, difficulty_setting):
-    """Получить случайный контент для задания"""
+# Push-обновления (SSE): операции хранилища выполняются по одной и в порядке поступления
+# (в памяти — сразу, в SQLite — в единственном потоке хранилища), поэтому порядок событий
+# совпадает с порядком изменений
+STREAMING_HANDLERS = set()
+
+def streaming(handler):
+    """Долгий поток: не занимает слот concurrency_middleware"""
+    STREAMING_HANDLERS.add(handler)
+    return handler
+
+async def event_stream(request, kind, key):
+    """text/event-stream для лобби/игры; Last-Event-ID (или ?last_event_id=) — продолжить с пропущенного"""
+    found, _ = await store.run(store.read, kind, key, lambda obj: None)
+    if not found:
+        raise web.HTTPNotFound()
+    raw = request.headers.get('Last-Event-ID') or request.query.get('last_event_id', '')
+    last_event_id = int(raw) if raw.isdigit() else None
+    
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # nginx не должен копить поток
+        **CORS_HEADERS  # заголовки уходят в prepare(), cors_middleware до них уже не дотянется
+    })
+    await response.prepare(request)
+    subscription = events.subscribe(kind, key, last_event_id)
+    try:
+        await response.write(b"retry: 3000\n\n")
+        async for chunk in subscription.chunks():
+            await response.write(chunk)
+    except ConnectionResetError:
+        pass  # клиент ушёл
+    finally:
+        events.unsubscribe(kind, key, subscription)
+    return response
+
+@routes.get('/api/lobby/{lobby_id}/events')
+@streaming
+async def lobby_events(request):
+    """Поток событий лобби: player_joined, game_started"""
+    return await event_stream(request, LOBBY, request.match_info['lobby_id'])
+
+@routes.get('/api/game/{game_id}/events')
+@streaming
+async def game_events(request):
+    """Поток событий игры: turn_passed, choice_made"""
+    return await event_stream(request, GAME, request.match_info['game_id'])
+
+def get_random_content(content_type, difficulty_setting, deck):
+    """Получить случайный контент для задания (без повторов в пределах игры)"""
     if content_type not in ['truth', 'dare']:
         return "Неверный тип контента"
-    
-    key = "truths" if content_type == "truth" else "dares"
-    
-    if difficulty_setting == "all":
-        # Объединяем все уровни сложности
-        options = []
-        for diff in GAME_CONTENT[key].values():
-            options.extend(diff)
-    elif difficulty_setting in GAME_CONTENT[key]:
-        # Используем только указанный уровень сложности
-        options = GAME_CONTENT[key][difficulty_setting]
-    else:
-        # Если указан неверный уровень, используем все
-        options = []
-        for diff in GAME_CONTENT[key].values():
-            options.extend(diff)
-    
-    if not options:
-        return "Контент не найден"
-    
-    return random.choice(options)
-
-# Вспомогательные функции
-def generate_unique_code():
-    """Генерация уникального 6-значного кода лобби"""
-    chars = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
-    while True:
-        code = ''.join([random.choice(chars) for _ in range(6)])
-        if not find_lobby_by_code(code):
-            return code
-
-def find_lobby_by_code(code):
-    """Поиск лобби по коду"""
-    for lobby in lobbies.values():
-        if lobby['code'] == code:
-            return lobby
-    return None
-
-# Обработка ошибок
-@app.errorhandler(404)
-def not_found(error):
-    return jsonify({'error': 'Not found'}), 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    return jsonify({'error': 'Internal server error'}), 500
+    # неизвестный уровень сложности каталог сам трактует как "all"
+    return tod_content.draw(deck, content_type, difficulty_setting) or "Контент не найден"
+
+# Обработка ошибок, CORS и ограничение параллельных запросов
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization, If-None-Match, Last-Event-ID',
+    'Access-Control-Expose-Headers': 'ETag',
+}
+
+@web.middleware
+async def cors_middleware(request, handler):
+    if request.method == 'OPTIONS':
+        return web.Response(status=200, headers=CORS_HEADERS)
+    response = await handler(request)
+    response.headers.update(CORS_HEADERS)
+    return response
+
+PUBLIC_PATHS = ('/api/health', '/api/auth')
+
+@web.middleware
+async def auth_middleware(request, handler):
+    """API — только с токеном сессии из /api/auth; пользователь Telegram кладётся в request['tg_user']"""
+    auth = request.app['auth']
+    request['tg_user'] = None
+    if request.path.startswith('/api/') and request.path not in PUBLIC_PATHS and auth.enabled:
+        try:
+            request['tg_user'] = auth.authenticate(bearer_token(request))
+        except AuthError as e:
+            return json_response({'error': str(e)}, 401)
+    return await handler(request)
+
+@web.middleware
+async def error_middleware(request, handler):
+    try:
+        return await handler(request)
+    except web.HTTPNotFound:
+        return json_response({'error': 'Not found'}, 404)
+    except web.HTTPException:
+        raise
+    except StoreBusy:
+        # SQLite занят другим воркером дольше BUSY_TIMEOUT — пусть клиент повторит
+        logger.warning("Mini-app store busy: %s %s", request.method, request.path)
+        return web.json_response({'error': 'Service busy, retry'}, status=503, headers={'Retry-After': '1'})
+    except Exception:
+        logger.exception("Mini-app request %s %s failed", request.method, request.path)
+        return json_response({'error': 'Internal server error'}, 500)
+
+def concurrency_middleware(limit):
+    semaphore = asyncio.Semaphore(limit)
+
+    @web.middleware
+    async def middleware(request, handler):
+        if request.match_info.handler in STREAMING_HANDLERS:
+            return await handler(request)
+        # сверх лимита запросы ждут своей очереди, а не отнимают время у бота
+        async with semaphore:
+            return await handler(request)
+    return middleware
+
+def create_app(concurrency=MAX_CONCURRENCY):
+    """aiohttp-приложение Mini-App (те же маршруты и JSON, что были у Flask-версии)"""
+    app = web.Application(middlewares=[cors_middleware, error_middleware, auth_middleware,
+                                       concurrency_middleware(concurrency)])
+    app['auth'] = MiniAppAuth()  # токен бота читается при первом запросе
+    app.add_routes(routes)
+    app['assets'] = AssetTable.load(DIST_FOLDER)  # None — сборки нет (python assets.py)
+    if app['assets'] is None:
+        logger.info("Mini-app assets are not built; serving sources without long-lived caching")
+    app.on_shutdown.append(_close_streams)
+    return app
+
+async def _close_streams(app):
+    events.close_all()  # иначе cleanup() ждал бы открытые SSE до shutdown_timeout
+
+async def start_server(host='0.0.0.0', port=5000, concurrency=MAX_CONCURRENCY, keepalive_timeout=KEEPALIVE_TIMEOUT):
+    """Запустить Mini-App в текущем event loop (рядом с ботом); вернуть runner для cleanup()"""
+    runner = web.AppRunner(create_app(concurrency), keepalive_timeout=keepalive_timeout, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Mini-app listening on %s:%s (concurrency=%s)", host, port, concurrency)
+    return runner
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    async def _run_standalone():
+        sessions.start(None)  # без бота истёкшие лобби/игры чистит тот же loop
+        runner = await start_server(port=_env_int("PORT", 5000))
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+    asyncio.run(_run_standalone())
@@ -0,0 +1,479 @@
+"""Хранилище лобби и игр Mini-App.
+
+Все изменения состояния идут через ``GameStore``: каждая операция (вход в лобби,
+старт игры, передача хода, пас, выбор задания) выполняется атомарно под
+замком конкретного лобби/игры — проверка и изменение не разрываются.
+
+- ``MemoryStore`` — словари с TTL (``SessionStore``) и замок на каждый объект;
+  подходит для одного процесса (бот + Mini-App в одном event loop);
+- ``SQLiteStore`` — объекты в SQLite, каждая операция — транзакция
+  ``BEGIN IMMEDIATE``; несколько процессов/воркеров с одним файлом видят
+  одно и то же состояние. Вызовы блокирующие, поэтому сервер выполняет их через
+  ``await store.run(...)`` в отдельном потоке (один на хранилище — операции идут
+  в порядке поступления), а ожидание чужой блокировки ограничено ``BUSY_TIMEOUT``:
+  дольше — ``StoreBusy`` (сервер отвечает 503), а не зависший event loop бота.
+
+Обращение к лобби/игре (в том числе чтение) продлевает TTL в обоих бэкендах;
+SQLite переписывает срок не чаще раза в ``TOUCH_INTERVAL``, чтобы чтения не
+становились записью на каждый запрос.
+
+Объекты — обычные dict (как и раньше в server.py); в SQLite они лежат pickle'ом.
+У каждого лобби/игры есть ``version``: операции, меняющие объект, увеличивают её
+(``bump``), по ней сервер отдаёт ETag/304 и кеширует сериализованный ответ.
+В игре хранятся только последние ``HISTORY_LIMIT`` записей истории, более старые
+уходят в архив (отдельно от объекта — он не растёт и не перезаписывается целиком).
+"""
+from __future__ import annotations
+import asyncio
+import json
+import pickle
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .codes import CodeAllocator
+from ...utils.sessions import SessionStore
+from ...utils.snapshots import on_restore
+
+# Время жизни без активности (каждый запрос к лобби/игре продлевает его)
+LOBBY_TTL = 2 * 60 * 60
+GAME_TTL = 6 * 60 * 60
+
+BUSY_TIMEOUT = 1.0  # сек. ожидания блокировки SQLite, занятой другим воркером
+TOUCH_INTERVAL = 60  # SQLite: срок жизни при чтении продлевается не чаще раза в минуту
+
+HISTORY_LIMIT = 50  # записей истории в самой игре; остальное — в архиве
+
+LOBBY = "lobby"
+GAME = "game"
+PLAYER = "player"
+
+
+class StoreConflict(Exception):
+    """The operation is not allowed in the object's current state (lobby full, no passes left…)."""
+
+
+class StoreBusy(Exception):
+    """The backend is locked by another worker for longer than BUSY_TIMEOUT; retry later."""
+
+
+class GameStore:
+    """Atomic operations on mini-app lobbies, games and players.
+
+    Backends implement ``_transaction(kind, key)`` — a context manager that holds the
+    object's lock and yields a ``Tx`` with the current value (``None`` if missing);
+    assigning ``tx.value`` / setting ``tx.delete`` is written back on exit.
+    """
+
+    def __init__(self):
+        self.codes = CodeAllocator()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Call a store operation from the event loop (``await store.run(store.update, ...)``)."""
+        return fn(*args)  # в памяти: короткие операции под замком, поток не нужен
+
+    # --- примитивы бэкенда ---
+    @contextmanager
+    def _transaction(self, kind: str, key: str, write: bool = True) -> Iterator["Tx"]:
+        raise NotImplementedError
+
+    def _insert(self, kind: str, key: str, value: dict) -> None:
+        raise NotImplementedError
+
+    def lobby_id_by_code(self, code: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def _bind_code(self, code: str, lobby_id: str) -> bool:
+        """Reserve ``code`` for the lobby; False if it is already taken."""
+        raise NotImplementedError
+
+    def _unbind_code(self, code: str) -> None:
+        raise NotImplementedError
+
+    def version(self, kind: str, key: str) -> Optional[int]:
+        """Current version of the object without loading it (None if missing)."""
+        raise NotImplementedError
+
+    def _archive(self, game_id: str, entries: List[dict]) -> None:
+        """Store history entries pushed out of the game (called inside its transaction)."""
+        raise NotImplementedError
+
+    def _archived(self, game_id: str, since: int, limit: int) -> List[dict]:
+        raise NotImplementedError
+
+    # --- общие операции ---
+    def update(self, kind: str, key: str, fn: Callable[[dict], Any]) -> Tuple[bool, Any]:
+        """Run ``fn(obj)`` under the object's lock and save it; ``(found, result)``."""
+        with self._transaction(kind, key) as tx:
+            if tx.value is None:
+                return False, None
+            return True, fn(tx.value)
+
+    def read(self, kind: str, key: str, fn: Callable[[dict], Any]) -> Tuple[bool, Any]:
+        """Like ``update`` but without writing back (serialize a response under the lock)."""
+        with self._transaction(kind, key, write=False) as tx:
+            if tx.value is None:
+                return False, None
+            return True, fn(tx.value)
+
+    @contextmanager
+    def _batch(self) -> Iterator[None]:
+        """Group several primitive writes (``_bind_code``, ``_insert``) into one backend transaction."""
+        yield  # в памяти каждая запись сразу видна целиком, группировать нечего
+
+    def maintain(self) -> None:
+        """Periodic cleanup hook (called on lobby creation)."""
+
+    def create_lobby(self, make_lobby: Callable[[str], dict]) -> dict:
+        """Allocate a free code and store ``make_lobby(code)``; its host is stored as a player."""
+        self.maintain()
+        # код и лобби появляются вместе: чистка другого воркера не увидит код без лобби
+        with self._batch():
+            while True:
+                code = self.codes.next()
+                lobby = make_lobby(code)
+                if self._bind_code(code, lobby['id']):
+                    break
+            self._insert(LOBBY, lobby['id'], lobby)
+            for player in lobby['players']:
+                self._insert(PLAYER, player['id'], {'id': player['id'], 'name': player['name'],
+                                                    'lobby_id': lobby['id'], 'telegram_id': player.get('telegram_id')})
+        return lobby
+
+    def join_lobby(self, lobby_id: str, player: dict) -> Optional[dict]:
+        """Seat ``player`` unless the lobby is full (check and append under one lock).
+
+        Returns the seated player (the existing one if this Telegram user is already
+        in the lobby) or None if there is no such lobby.
+        """
+        def join(lobby):
+            telegram_id = player.get('telegram_id')
+            if telegram_id is not None:
+                seated = next((p for p in lobby['players'] if p.get('telegram_id') == telegram_id), None)
+                if seated is not None:
+                    return seated, False
+            if len(lobby['players']) >= lobby['max_players']:
+                raise StoreConflict('Lobby is full')
+            lobby['players'].append(player)
+            bump(lobby)
+            return player, True
+        found, result = self.update(LOBBY, lobby_id, join)
+        if not found:
+            return None
+        seated, added = result
+        if added:
+            self._insert(PLAYER, player['id'], {'id': player['id'], 'name': player['name'], 'lobby_id': lobby_id,
+                                                'telegram_id': player.get('telegram_id')})
+        return seated
+
+    def start_game(self, lobby_id: str, make_game: Callable[[dict], dict]) -> Optional[dict]:
+        """Turn the lobby into a game atomically: a lobby can be started only once."""
+        with self._transaction(LOBBY, lobby_id) as tx:
+            lobby = tx.value
+            if lobby is None:
+                return None
+            game = make_game(lobby)
+            self._insert(GAME, game['id'], game)
+            tx.delete = True
+        self._unbind_code(lobby['code'])
+        return game
+
+    def advance_turn(self, game: dict) -> None:
+        game['current_player_index'] = (game['current_player_index'] + 1) % len(game['players'])
+        bump(game)
+
+    def use_pass(self, game: dict, max_passes: float) -> None:
+        """Spend the current player's pass and move on; call inside ``update``."""
+        current_player_id = game['players'][game['current_player_index']]['id']
+        if game['passes_used'][current_player_id] >= max_passes:
+            raise StoreConflict('Maximum passes used')
+        game['passes_used'][current_player_id] += 1
+        self.advance_turn(game)
+
+    def append_history(self, game: dict, entry: dict) -> dict:
+        """Number the entry (``seq``) and keep only the last HISTORY_LIMIT in the game; call inside ``update``."""
+        history = game['history']
+        entry['seq'] = game.get('history_count', len(history))
+        game['history_count'] = entry['seq'] + 1
+        history.append(entry)
+        if len(history) > HISTORY_LIMIT:
+            overflow = len(history) - HISTORY_LIMIT
+            self._archive(game['id'], history[:overflow])
+            del history[:overflow]
+        bump(game)
+        return entry
+
+    def history_page(self, game_id: str, since: int = 0, limit: int = HISTORY_LIMIT) -> Tuple[bool, Optional[dict]]:
+        """Entries with ``seq >= since`` (at most ``limit``): archive first, then the game's own tail."""
+        def page(game):
+            history = game['history']
+            first = history[0]['seq'] if history else game.get('history_count', 0)
+            start = max(since, 0)
+            entries = self._archived(game_id, start, min(limit, first - start)) if start < first else []
+            if len(entries) < limit:
+                entries += [e for e in history if e['seq'] >= start][:limit - len(entries)]
+            total = game.get('history_count', len(history))
+            return {'entries': entries, 'next': entries[-1]['seq'] + 1 if entries else start, 'total': total}
+        return self.read(GAME, game_id, page)
+
+
+def bump(obj: dict) -> None:
+    """Mark the lobby/game as changed (new version => new ETag, stale cached body)."""
+    obj['version'] = obj.get('version', 0) + 1
+
+
+class Tx:
+    __slots__ = ("value", "delete")
+
+    def __init__(self, value):
+        self.value = value
+        self.delete = False
+
+
+class MemoryStore(GameStore):
+    """In-process store on TTL session dicts with one lock per object."""
+
+    def __init__(self):
+        super().__init__()
+        self.stores: Dict[str, SessionStore] = {
+            LOBBY: SessionStore("app_lobbies", LOBBY_TTL, on_expire=self._lobby_expired),
+            GAME: SessionStore("app_games", GAME_TTL, on_expire=self._drop_players),
+            PLAYER: SessionStore("app_players", GAME_TTL),
+        }
+        # вытесненная из игр история: game_id -> записи с seq 0, 1, 2, …
+        self.archives: SessionStore = SessionStore("app_history", GAME_TTL)
+        # код лобби -> lobby_id; обновляется вместе с лобби (создание, старт игры, истечение)
+        self.lobby_codes: Dict[str, str] = {}
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        on_restore("app_lobbies")(self._index_lobby_code)
+
+    def _drop_players(self, bot, key, entry):
+        """При истечении лобби/игры удаляем и её игроков"""
+        for player in entry.get('players', ()):
+            self.stores[PLAYER].pop(player['id'], None)
+        self.archives.pop(key, None)
+        self._locks.pop((GAME, key), None)
+
+    def _lobby_expired(self, bot, key, lobby):
+        self._drop_players(bot, key, lobby)
+        self.lobby_codes.pop(lobby['code'], None)
+        self._locks.pop((LOBBY, key), None)
+
+    def _index_lobby_code(self, bot, lobby_id, lobby):
+        self.lobby_codes[lobby['code']] = lobby_id
+
+    def _lock(self, kind: str, key: str) -> threading.Lock:
+        lock = self._locks.get((kind, key))
+        if lock is None:
+            with self._locks_guard:
+                lock = self._locks.setdefault((kind, key), threading.Lock())
+        return lock
+
+    @contextmanager
+    def _transaction(self, kind: str, key: str, write: bool = True) -> Iterator[Tx]:
+        store = self.stores[kind]
+        with self._lock(kind, key):
+            tx = Tx(store.get(key))  # get продлевает TTL — обращение к лобби/игре и есть активность
+            if kind == GAME:
+                self.archives.touch(key)  # архив живёт, пока живёт игра
+            yield tx
+            if tx.delete:
+                store.pop(key, None)
+                self._locks.pop((kind, key), None)
+            # изменения уже в том же dict, писать обратно нечего
+
+    def _insert(self, kind: str, key: str, value: dict) -> None:
+        self.stores[kind][key] = value
+
+    def lobby_id_by_code(self, code: str) -> Optional[str]:
+        return self.lobby_codes.get(code.upper())
+
+    def _bind_code(self, code: str, lobby_id: str) -> bool:
+        return self.lobby_codes.setdefault(code, lobby_id) == lobby_id
+
+    def _unbind_code(self, code: str) -> None:
+        self.lobby_codes.pop(code, None)
+
+    def version(self, kind: str, key: str) -> Optional[int]:
+        obj = self.stores[kind].get(key)  # как и полный GET, продлевает TTL
+        if kind == GAME:
+            self.archives.touch(key)
+        return None if obj is None else obj.get('version', 0)
+
+    def _archive(self, game_id: str, entries: List[dict]) -> None:
+        archive = self.archives.peek(game_id)
+        if archive is None:
+            archive = self.archives[game_id] = []
+        archive.extend(entries)
+        self.archives.touch(game_id)
+
+    def _archived(self, game_id: str, since: int, limit: int) -> List[dict]:
+        return list((self.archives.peek(game_id) or [])[since:since + max(limit, 0)])
+
+
+class SQLiteStore(GameStore):
+    """Objects pickled in one SQLite file; each operation is a BEGIN IMMEDIATE transaction."""
+
+    TTL = {LOBBY: LOBBY_TTL, GAME: GAME_TTL, PLAYER: GAME_TTL}
+
+    def __init__(self, path: str, busy_timeout: float = BUSY_TIMEOUT):
+        super().__init__()
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._purged_at = 0.0
+        # один поток: блокирующий sqlite3 не держит event loop, а операции процесса не переставляются
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mini-app-db")
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS mini_app_objects ("
+                         "kind TEXT NOT NULL, id TEXT NOT NULL, data BLOB NOT NULL, expires_at REAL NOT NULL, "
+                         "PRIMARY KEY (kind, id))")
+            conn.execute("CREATE INDEX IF NOT EXISTS mini_app_objects_expiry ON mini_app_objects(expires_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS mini_app_codes (code TEXT PRIMARY KEY, lobby_id TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS mini_app_history ("
+                         "game_id TEXT NOT NULL, seq INTEGER NOT NULL, entry TEXT NOT NULL, PRIMARY KEY (game_id, seq))")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(mini_app_objects)")}
+            if 'version' not in columns:  # файлы, созданные до появления версий
+                conn.execute("ALTER TABLE mini_app_objects ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    def _connect(self) -> sqlite3.Connection:
+        # соединение на поток; транзакциями управляем сами
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+        return conn
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(self._call, fn, *args))
+
+    @staticmethod
+    def _call(fn: Callable[..., Any], *args: Any) -> Any:
+        try:
+            return fn(*args)
+        except sqlite3.OperationalError as e:
+            if 'locked' in str(e) or 'busy' in str(e):
+                raise StoreBusy(str(e)) from e
+            raise
+
+    @contextmanager
+    def _transaction(self, kind: str, key: str, write: bool = True) -> Iterator[Tx]:
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            row = conn.execute("SELECT data, expires_at FROM mini_app_objects WHERE kind = ? AND id = ? AND expires_at > ?",
+                               (kind, key, now)).fetchone()
+            tx = Tx(pickle.loads(row[0]) if row else None)
+            yield tx
+            if write and tx.value is not None:
+                if tx.delete:
+                    conn.execute("DELETE FROM mini_app_objects WHERE kind = ? AND id = ?", (kind, key))
+                else:
+                    self._put(conn, kind, key, tx.value, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if row and not write:
+            # продление — после COMMIT отдельным запросом: UPDATE внутри читающей транзакции
+            # в WAL падает сразу с "database is locked", если другой воркер успел что-то записать
+            self._touch(conn, kind, key, row[1], now)
+
+    def _touch(self, conn: sqlite3.Connection, kind: str, key: str, expires_at: float, now: float) -> None:
+        # чтение продлевает TTL, как и в MemoryStore; запись — только если срок заметно «просел»
+        if expires_at >= now + self.TTL[kind] - TOUCH_INTERVAL:
+            return
+        try:
+            conn.execute("UPDATE mini_app_objects SET expires_at = ? WHERE kind = ? AND id = ?",
+                         (now + self.TTL[kind], kind, key))
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+            # база занята дольше BUSY_TIMEOUT: чтение уже удалось, продлим при следующем обращении
+
+    def _put(self, conn: sqlite3.Connection, kind: str, key: str, value: dict, now: float) -> None:
+        conn.execute("INSERT OR REPLACE INTO mini_app_objects(kind, id, data, expires_at, version) VALUES (?, ?, ?, ?, ?)",
+                     (kind, key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now + self.TTL[kind],
+                      value.get('version', 0)))
+
+    def _insert(self, kind: str, key: str, value: dict) -> None:
+        conn = self._connect()
+        with self._autocommit(conn):  # внутри start_game/create_lobby — их транзакция
+            self._put(conn, kind, key, value, time.time())
+
+    @contextmanager
+    def _batch(self) -> Iterator[None]:
+        with self._autocommit(self._connect()):
+            yield
+
+    @contextmanager
+    def _autocommit(self, conn: sqlite3.Connection):
+        # своя транзакция, либо присоединяемся к уже открытой (_batch, start_game)
+        if conn.in_transaction:
+            yield
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def lobby_id_by_code(self, code: str) -> Optional[str]:
+        row = self._connect().execute("SELECT lobby_id FROM mini_app_codes WHERE code = ?", (code.upper(),)).fetchone()
+        return row[0] if row else None
+
+    def _bind_code(self, code: str, lobby_id: str) -> bool:
+        conn = self._connect()
+        with self._autocommit(conn):
+            return conn.execute("INSERT OR IGNORE INTO mini_app_codes(code, lobby_id) VALUES (?, ?)",
+                                (code, lobby_id)).rowcount == 1
+
+    def _unbind_code(self, code: str) -> None:
+        conn = self._connect()
+        with self._autocommit(conn):
+            conn.execute("DELETE FROM mini_app_codes WHERE code = ?", (code,))
+
+    def version(self, kind: str, key: str) -> Optional[int]:
+        conn, now = self._connect(), time.time()
+        row = conn.execute("SELECT version, expires_at FROM mini_app_objects WHERE kind = ? AND id = ? AND expires_at > ?",
+                           (kind, key, now)).fetchone()
+        if row is None:
+            return None
+        self._touch(conn, kind, key, row[1], now)  # вне транзакции — отдельный autocommit-запрос
+        return row[0]
+
+    def _archive(self, game_id: str, entries: List[dict]) -> None:
+        self._connect().executemany("INSERT OR REPLACE INTO mini_app_history(game_id, seq, entry) VALUES (?, ?, ?)",
+                                    [(game_id, e['seq'], json.dumps(e, ensure_ascii=False)) for e in entries])
+
+    def _archived(self, game_id: str, since: int, limit: int) -> List[dict]:
+        rows = self._connect().execute("SELECT entry FROM mini_app_history WHERE game_id = ? AND seq >= ? "
+                                       "ORDER BY seq LIMIT ?", (game_id, since, max(limit, 0))).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def maintain(self) -> None:
+        # истечение TTL в SQLite — ленивое: не чаще раза в минуту при создании лобби
+        now = time.time()
+        if now - self._purged_at >= 60:
+            self._purged_at = now
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """Drop expired objects, the codes of expired lobbies and the history of expired games."""
+        conn = self._connect()
+        with self._autocommit(conn):
+            removed = conn.execute("DELETE FROM mini_app_objects WHERE expires_at <= ?", (time.time(),)).rowcount
+            conn.execute("DELETE FROM mini_app_codes WHERE lobby_id NOT IN "
+                         "(SELECT id FROM mini_app_objects WHERE kind = ?)", (LOBBY,))
+            conn.execute("DELETE FROM mini_app_history WHERE game_id NOT IN "
+                         "(SELECT id FROM mini_app_objects WHERE kind = ?)", (GAME,))
+        return removed
@@ -2,24 +2,82 @@ from __future__ import annotations
 from aiogram import Bot
 from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
 import asyncio
-from typing import Iterable
+from typing import Any, Dict, Iterable, Optional
+
+# Telegram: ~30 сообщений/с на бота суммарно — держим запас
+DEFAULT_RATE = 25
+
+
+class RateLimiter:
+    """Token bucket shared by all sends of one bot; waiters are served in FIFO order."""
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self._tokens = self.burst
+        self._updated: Optional[float] = None
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self._updated is not None:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                wait = self._blocked_until - now
+                if wait <= 0 and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep(max(wait, (1 - self._tokens) / self.rate))
+
+    def pause(self, seconds: float):
+        """Flood control from Telegram (RetryAfter): nobody sends for ``seconds``."""
+        until = asyncio.get_running_loop().time() + seconds
+        self._blocked_until = max(self._blocked_until, until)
+
+
+_limiters: Dict[int, RateLimiter] = {}
+
+
+def limiter_for(bot: Bot) -> RateLimiter:
+    limiter = _limiters.get(bot.id)
+    if limiter is None:
+        limiter = _limiters[bot.id] = RateLimiter()
+    return limiter
+
+
+async def send_limited(bot: Bot, chat_id: int, text: str, limiter: Optional[RateLimiter] = None, **kwargs: Any):
+    """send_message through the bot's rate limiter, retrying once after RetryAfter."""
+    limiter = limiter or limiter_for(bot)
+    await limiter.acquire()
+    try:
+        return await bot.send_message(chat_id, text, **kwargs)
+    except TelegramRetryAfter as e:
+        limiter.pause(e.retry_after)
+        await limiter.acquire()
+        return await bot.send_message(chat_id, text, **kwargs)
+
+
+async def send_many(bot: Bot, messages: Iterable[tuple], **kwargs: Any) -> Dict[int, Exception]:
+    """Send all ``(chat_id, text)`` / ``(chat_id, text, extra_kwargs)`` concurrently under the rate limit.
+
+    Never raises for a single recipient: returns ``{chat_id: exception}`` for the
+    messages that could not be delivered (e.g. the user never started the bot).
+    """
+    messages = list(messages)
+    limiter = limiter_for(bot)
+    results = await asyncio.gather(
+        *(send_limited(bot, m[0], m[1], limiter, **{**kwargs, **(m[2] if len(m) > 2 else {})}) for m in messages),
+        return_exceptions=True,
+    )
+    return {m[0]: r for m, r in zip(messages, results) if isinstance(r, Exception)}
+
 
 async def broadcast(bot: Bot, user_ids: Iterable[int], text: str) -> dict:
-    stats = {"ok": 0, "forbidden": 0, "errors": 0}
-    for uid in user_ids:
-        try:
-            await bot.send_message(uid, text)
-            stats["ok"] += 1
-        except TelegramRetryAfter as e:
-            await asyncio.sleep(e.retry_after)
-            try:
-                await bot.send_message(uid, text)
-                stats["ok"] += 1
-            except Exception:
-                stats["errors"] += 1
-        except TelegramForbiddenError:
-            stats["forbidden"] += 1
-        except Exception:
-            stats["errors"] += 1
-        await asyncio.sleep(0.05)
-    return stats
+    user_ids = list(user_ids)
+    failed = await send_many(bot, ((uid, text) for uid in user_ids))
+    forbidden = sum(isinstance(e, TelegramForbiddenError) for e in failed.values())
+    return {"ok": len(user_ids) - len(failed), "forbidden": forbidden, "errors": len(failed) - forbidden}
@@ -0,0 +1,95 @@
+"""Маршрутизация callback_query по префиксу без прохода по цепочке роутеров.
+
+callback_data вида ``prefix:action[:arg...]`` разбирается один раз в CallbackData,
+после чего обработчик находится двумя обращениями к словарям:
+сначала по префиксу (``ttt``, ``tod``, ``help``…), затем по ``action:первый_аргумент``
+или просто ``action``. Неизвестные префиксы и действия сразу получают пустой answer().
+"""
+from __future__ import annotations
+import logging
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+from aiogram.types import CallbackQuery
+from ..middlewares.callback_ack import CallbackAck
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackData(NamedTuple):
+    prefix: str
+    action: str
+    args: Tuple[str, ...] = ()
+
+    def arg(self, index: int, default: Optional[str] = None) -> Optional[str]:
+        return self.args[index] if index < len(self.args) else default
+
+    def int_arg(self, index: int, default: Optional[int] = None) -> Optional[int]:
+        try:
+            return int(self.args[index])
+        except (IndexError, ValueError):
+            return default
+
+
+def parse_callback_data(raw: Optional[str]) -> Optional[CallbackData]:
+    if not raw:
+        return None
+    parts = raw.split(":")
+    return CallbackData(parts[0], parts[1] if len(parts) > 1 else "", tuple(parts[2:]))
+
+
+CallbackHandler = Callable[[CallbackQuery, CallbackData, CallbackAck], Awaitable[object]]
+
+# prefix -> CallbackRouter
+callback_routes: Dict[str, "CallbackRouter"] = {}
+
+
+class CallbackRouter:
+    """Per-feature table of callback handlers for one ``callback_data`` prefix.
+
+    Usage::
+
+        callbacks = CallbackRouter("ttt")
+
+        @callbacks.action("move")
+        async def on_move(cb: CallbackQuery, payload: CallbackData, ack: CallbackAck): ...
+
+        @callbacks.action("lobby", "join")   # matches "tod:lobby:join"
+        async def on_join(cb, payload, ack): ...
+
+    Handlers answer the query through ``ack`` (see AckFirstMiddleware): answer as soon
+    as the checks pass, then do the slow edits.
+    """
+
+    def __init__(self, prefix: str):
+        if prefix in callback_routes:
+            raise ValueError(f"Callback prefix {prefix!r} is already registered")
+        self.prefix = prefix
+        self.handlers: Dict[str, CallbackHandler] = {}
+        callback_routes[prefix] = self
+
+    def action(self, name: str, *subactions: str):
+        def decorator(func: CallbackHandler) -> CallbackHandler:
+            keys = [f"{name}:{sub}" for sub in subactions] or [name]
+            for key in keys:
+                self.handlers[key] = func
+            return func
+        return decorator
+
+    def resolve(self, payload: CallbackData) -> Optional[CallbackHandler]:
+        if payload.args:
+            handler = self.handlers.get(f"{payload.action}:{payload.args[0]}")
+            if handler is not None:
+                return handler
+        return self.handlers.get(payload.action)
+
+
+async def dispatch_callback(cb: CallbackQuery, ack: Optional[CallbackAck] = None):
+    """Single aiogram handler for all callback queries (register on the Dispatcher)."""
+    if ack is None:  # без AckFirstMiddleware
+        ack = CallbackAck(cb)
+    payload = parse_callback_data(cb.data)
+    route = callback_routes.get(payload.prefix) if payload else None
+    handler = route.resolve(payload) if route else None
+    if handler is None:
+        logger.debug("Unroutable callback data: %r", cb.data)
+        return await ack.answer()
+    return await handler(cb, payload, ack)
@@ -0,0 +1,146 @@
+"""Общие часы для дедлайнов игровых фаз.
+
+Вместо отдельной корутины с ``asyncio.sleep`` на каждую фазу каждой игры —
+одна куча дедлайнов и один таск, который спит до ближайшего из них.
+
+- у ключа (например ``("mafia", chat_id)``) не больше одного активного таймера,
+  новый ``schedule`` для того же ключа заменяет старый;
+- ``cancel`` — O(1): запись просто помечается отменённой и выбрасывается из кучи,
+  когда до неё дойдёт очередь;
+- ``fire_now`` — досрочное завершение фазы (все уже походили);
+- колбэк запускается отдельной задачей, поэтому медленная фаза не задерживает часы
+  и может сама ставить следующий таймер.
+"""
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    __slots__ = ("deadline", "seq", "key", "callback", "args", "cancelled")
+
+    def __init__(self, deadline: float, seq: int, key: Hashable, callback: Callable[..., Awaitable[Any]], args: tuple):
+        self.deadline = deadline
+        self.seq = seq
+        self.key = key
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def __lt__(self, other: "Timer") -> bool:
+        return (self.deadline, self.seq) < (other.deadline, other.seq)
+
+
+class GameClock:
+    """Heap of phase deadlines served by a single asyncio task."""
+
+    def __init__(self):
+        self._heap: List[Timer] = []
+        self._timers: Dict[Hashable, Timer] = {}
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self.fired = 0
+
+    def _now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def schedule(self, key: Hashable, delay: float, callback: Callable[..., Awaitable[Any]], *args: Any) -> Timer:
+        """Run ``await callback(*args)`` after ``delay`` seconds (replaces the key's timer)."""
+        self.cancel(key)
+        timer = Timer(self._now() + max(0.0, delay), next(self._seq), key, callback, args)
+        self._timers[key] = timer
+        heapq.heappush(self._heap, timer)
+        self._ensure_running()
+        if self._heap[0] is timer:
+            self._wakeup.set()  # новый ближайший дедлайн — будим спящий цикл
+        return timer
+
+    def cancel(self, key: Hashable) -> bool:
+        timer = self._timers.pop(key, None)
+        if timer is None:
+            return False
+        timer.cancelled = True
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._timers):
+            # много отменённых записей — пересобираем кучу, чтобы она не росла
+            self._heap = [t for t in self._heap if not t.cancelled]
+            heapq.heapify(self._heap)
+        return True
+
+    def fire_now(self, key: Hashable) -> bool:
+        """Finish the key's timer early; returns False if there is none."""
+        timer = self._timers.pop(key, None)
+        if timer is None:
+            return False
+        timer.cancelled = True
+        self._run(timer)
+        return True
+
+    def remaining(self, key: Hashable) -> Optional[float]:
+        timer = self._timers.get(key)
+        return None if timer is None else max(0.0, timer.deadline - self._now())
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def _run(self, timer: Timer) -> None:
+        self.fired += 1
+        task = asyncio.ensure_future(timer.callback(*timer.args))
+        self._running.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Game clock callback failed", exc_info=task.exception())
+
+    def _ensure_running(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self) -> None:
+        while True:
+            heap = self._heap
+            while heap and heap[0].cancelled:
+                heapq.heappop(heap)
+            self._wakeup.clear()
+            if not heap:
+                await self._wakeup.wait()
+                continue
+            delay = heap[0].deadline - self._now()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            timer = heapq.heappop(heap)
+            if self._timers.get(timer.key) is timer:
+                del self._timers[timer.key]
+                self._run(timer)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"timers": len(self._timers), "heap": len(self._heap), "running": len(self._running), "fired": self.fired}
+
+
+clock = GameClock()
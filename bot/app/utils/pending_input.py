@@ -0,0 +1,157 @@
+"""Ожидание текстового ввода в ЛС (задание для «Правды или действия» и т.п.).
+
+Фича говорит «жду от пользователя сообщение в ЛС» через ``pending_inputs.expect``;
+у каждого ожидания есть дедлайн на общих игровых часах (``utils.game_clock``).
+
+- все ЛС проходят через один обработчик ``dispatch_input`` (регистрируется на
+  Dispatcher): фильтр — одно обращение к словарю по user_id, обработчик фичи
+  находится по имени фичи, без перебора роутеров и lambda-фильтров;
+- если ответа нет к дедлайну, вызывается ``on_timeout`` фичи (например, выдать
+  случайное задание), так что игра не зависает;
+- ожидания лежат в ``SessionStore`` и переживают перезапуск вместе со снимками;
+- ``pending_inputs.stats()`` — сколько ждём по каждой фиче, сколько ответили и
+  сколько истекло (для /_diag).
+"""
+from __future__ import annotations
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram.types import Message
+
+from ..middlewares.ordering import register_key_resolver
+from .game_clock import clock
+from .sessions import SessionStore
+from .snapshots import on_restore
+
+logger = logging.getLogger(__name__)
+
+INPUT_TTL = 60 * 60  # страховка: запись без дедлайна всё равно не живёт дольше часа
+
+
+@dataclass
+class PendingInput:
+    feature: str
+    user_id: int
+    chat_id: int  # чат игры, к которой относится ввод
+    deadline: float  # time.time()
+    data: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def clock_key(self):
+        return ("input", self.user_id)
+
+
+InputHandler = Callable[[Message, PendingInput], Awaitable[Any]]
+TimeoutHandler = Callable[[Any, PendingInput], Awaitable[Any]]
+
+
+class PendingInputs:
+    """One pending DM input per user, routed to the feature that asked for it."""
+
+    def __init__(self):
+        self.entries: Dict[int, PendingInput] = SessionStore("pending_input", INPUT_TTL)
+        self.input_handlers: Dict[str, InputHandler] = {}
+        self.timeout_handlers: Dict[str, TimeoutHandler] = {}
+        self.counters: Counter = Counter()
+
+    def on_input(self, feature: str):
+        def decorator(func: InputHandler) -> InputHandler:
+            self.input_handlers[feature] = func
+            return func
+        return decorator
+
+    def on_timeout(self, feature: str):
+        def decorator(func: TimeoutHandler) -> TimeoutHandler:
+            self.timeout_handlers[feature] = func
+            return func
+        return decorator
+
+    def expect(self, bot, feature: str, user_id: int, chat_id: int, timeout: float, **data: Any) -> PendingInput:
+        """Wait for a DM from ``user_id``; replaces whatever that user was asked before."""
+        entry = PendingInput(feature, user_id, chat_id, time.time() + timeout, data)
+        self.entries[user_id] = entry
+        self._arm(bot, entry)
+        return entry
+
+    def _arm(self, bot, entry: PendingInput) -> None:
+        clock.schedule(entry.clock_key, max(0.0, entry.deadline - time.time()), self._expire, bot, entry)
+
+    def get(self, user_id: int) -> Optional[PendingInput]:
+        return self.entries.peek(user_id)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.entries
+
+    def take(self, user_id: int) -> Optional[PendingInput]:
+        """Remove and return the user's entry (its deadline is cancelled)."""
+        entry = self.entries.pop(user_id, None)
+        if entry is not None:
+            clock.cancel(entry.clock_key)
+        return entry
+
+    def cancel_chat(self, chat_id: int, feature: Optional[str] = None) -> int:
+        """Drop everything a finished game was waiting for."""
+        dropped = 0
+        for user_id, entry in self.entries.items():
+            if entry.chat_id == chat_id and (feature is None or entry.feature == feature):
+                if self.entries.peek(user_id) is entry:
+                    self.take(user_id)
+                    self.counters["cancelled"] += 1
+                    dropped += 1
+        return dropped
+
+    async def _expire(self, bot, entry: PendingInput) -> None:
+        if self.entries.peek(entry.user_id) is not entry:
+            return  # уже ответили или заменили новым ожиданием
+        self.entries.pop(entry.user_id, None)
+        self.counters["timed_out"] += 1
+        handler = self.timeout_handlers.get(entry.feature)
+        if handler is not None:
+            await handler(bot, entry)
+
+    async def dispatch(self, message: Message) -> Any:
+        entry = self.take(message.from_user.id)
+        if entry is None:
+            return None
+        handler = self.input_handlers.get(entry.feature)
+        if handler is None:
+            logger.warning("No input handler for feature %r", entry.feature)
+            return None
+        self.counters["answered"] += 1
+        return await handler(message, entry)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending": dict(Counter(e.feature for e in self.entries.values())), **self.counters}
+
+
+pending_inputs = PendingInputs()
+
+
+def has_pending_input(message: Message) -> bool:
+    """Filter for dispatch_input: a plain DM from a user we are waiting for (commands pass by)."""
+    return (message.chat.type == "private" and message.from_user is not None
+            and message.from_user.id in pending_inputs
+            and bool(message.text) and not message.text.startswith("/"))
+
+
+async def dispatch_input(message: Message):
+    """Single aiogram handler for all awaited DM input (register on the Dispatcher with has_pending_input)."""
+    return await pending_inputs.dispatch(message)
+
+
+@register_key_resolver
+def _pending_input_chat(update, data):
+    # ответ в ЛС меняет игру в группе — ставим его в очередь этой группы
+    msg = update.message
+    if msg and msg.chat.type == 'private' and msg.from_user:
+        entry = pending_inputs.get(msg.from_user.id)
+        return entry.chat_id if entry is not None else None
+    return None
+
+
+@on_restore("pending_input")
+def _rearm(bot, user_id: int, entry: PendingInput):
+    # дедлайн в time.time(): то, что истекло за время простоя, сработает сразу
+    pending_inputs._arm(bot, entry)
@@ -0,0 +1,290 @@
+"""Единый реестр игровых сессий с TTL.
+
+Каждое хранилище (``SessionStore``) ведёт себя как обычный dict, поэтому игровые
+модули продолжают писать ``games[chat_id]`` / ``del lobbies[code]``, но:
+
+- у каждого типа сессий свой TTL, который продлевается при каждом обращении
+  (``store[key]``, ``store[key] = ...``, ``store.get(key)``, ``touch``);
+- все хранилища обслуживает один фоновый таск с хешированным колесом таймеров:
+  продление — это запись дедлайна в словарь, без перестановки таймера; запись
+  перекладывается в нужный слот лениво, когда колесо до неё доходит;
+- по истечении TTL сессия удаляется и вызывается ``on_expire(bot, key, value)``
+  (обычная функция или корутина) — например, чтобы написать в чат «игра истекла»;
+- ``store.values()`` / ``store.items()`` и ``in`` TTL не продлевают;
+- ``registry.stats()`` отдаёт количество живых сессий и примерный объём в байтах
+  по каждому типу (для /_diag).
+
+Хранилища потокобезопасны (RLock); mini-app работает в том же event loop, что и бот,
+а без event loop колесо можно крутить фоновым потоком (``start_thread``).
+"""
+from __future__ import annotations
+import asyncio
+import inspect
+import logging
+import sys
+import threading
+import time
+from collections.abc import MutableMapping
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, List, Optional, Set, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+ExpireCallback = Callable[[Any, Hashable, Any], Union[None, Awaitable[None]]]
+
+
+class SessionStore(MutableMapping):
+    """Dict of sessions of one kind with a sliding TTL (see module docstring)."""
+
+    def __init__(self, kind: str, ttl: float, on_expire: Optional[ExpireCallback] = None,
+                 registry: Optional["SessionRegistry"] = None):
+        self.kind = kind
+        self.ttl = ttl
+        self.on_expire = on_expire
+        self.expired = 0
+        self._data: Dict[Hashable, Any] = {}
+        self._deadlines: Dict[Hashable, float] = {}
+        self._lock = threading.RLock()
+        self._registry = registry or sessions
+        self._registry.register(self)
+
+    # --- dict-интерфейс ---
+    def __getitem__(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self._data[key]
+            self._deadlines[key] = time.monotonic() + self.ttl
+            return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            fresh = key not in self._data
+            self._data[key] = value
+            deadline = self._deadlines[key] = time.monotonic() + self.ttl
+        if fresh:
+            self._registry.schedule(self, key, deadline)
+
+    def __delitem__(self, key: Hashable) -> None:
+        with self._lock:
+            del self._data[key]
+            del self._deadlines[key]
+
+    def __contains__(self, key: object) -> bool:
+        # проверка наличия не считается активностью (её делают и фильтры/резолверы)
+        return key in self._data
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def values(self) -> List[Any]:
+        # обход (поиск, статистика) — тоже не активность, TTL не продлевается
+        return list(self._data.values())
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        return list(self._data.items())
+
+    def __repr__(self) -> str:
+        return f"SessionStore({self.kind!r}, ttl={self.ttl}, size={len(self._data)})"
+
+    # --- TTL ---
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Read without refreshing the TTL."""
+        return self._data.get(key, default)
+
+    def touch(self, key: Hashable) -> bool:
+        with self._lock:
+            if key not in self._data:
+                return False
+            self._deadlines[key] = time.monotonic() + self.ttl
+            return True
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        return self._deadlines.get(key)
+
+    def dump(self) -> List[Tuple[Hashable, Any, float]]:
+        """``[(key, value, seconds_left)]`` for snapshots (see utils.snapshots)."""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value, self._deadlines[key] - now) for key, value in self._data.items()]
+
+    def load(self, entries: List[Tuple[Hashable, Any, float]], elapsed: float = 0.0) -> int:
+        """Put dumped sessions back; ``elapsed`` seconds of downtime are taken off their TTL."""
+        now = time.monotonic()
+        loaded = 0
+        for key, value, left in entries:
+            left -= elapsed
+            if left <= 0:
+                continue
+            with self._lock:
+                self._data[key] = value
+                self._deadlines[key] = now + left
+            self._registry.schedule(self, key, now + left)
+            loaded += 1
+        return loaded
+
+    def _take_if_expired(self, key: Hashable, now: float) -> Tuple[bool, Any, Optional[float]]:
+        """(expired?, value, current deadline) — used by the sweeper under the store lock."""
+        with self._lock:
+            deadline = self._deadlines.get(key)
+            if deadline is None:
+                return False, None, None  # уже удалена вручную
+            if deadline > now:
+                return False, None, deadline
+            value = self._data.pop(key)
+            del self._deadlines[key]
+            self.expired += 1
+            return True, value, None
+
+    def approx_bytes(self) -> int:
+        with self._lock:
+            items = list(self._data.items())
+        seen: Set[int] = set()
+        return sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in items)
+
+
+def deep_sizeof(obj: Any, seen: Optional[Set[int]] = None, depth: int = 8) -> int:
+    """Rough recursive ``sys.getsizeof`` (containers, dataclasses, __slots__)."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or depth < 0:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj, 0)
+    if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, dict):
+        return size + sum(deep_sizeof(k, seen, depth - 1) + deep_sizeof(v, seen, depth - 1) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(deep_sizeof(i, seen, depth - 1) for i in obj)
+    if isinstance(obj, (asyncio.Task, asyncio.Handle)):
+        return size  # содержимое таска нам неинтересно
+    if hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen, depth - 1)
+    for slot in getattr(type(obj), "__slots__", ()):
+        if hasattr(obj, slot):
+            size += deep_sizeof(getattr(obj, slot), seen, depth - 1)
+    return size
+
+
+class SessionRegistry:
+    """All session stores plus one hashed timer wheel that expires their entries.
+
+    The wheel has ``slots`` buckets of ``resolution`` seconds; a key sits in the bucket
+    of its (possibly outdated) deadline. When the cursor reaches a bucket, keys whose
+    deadline moved forward are re-bucketed, the rest expire.
+    """
+
+    def __init__(self, resolution: float = 5.0, slots: int = 720):
+        self.resolution = resolution
+        self.stores: Dict[str, SessionStore] = {}
+        self._wheel: List[Set[Tuple[str, Hashable]]] = [set() for _ in range(slots)]
+        self._wheel_lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._tick = int(time.monotonic() // resolution)
+        self._bot = None
+        self._task: Optional[asyncio.Task] = None
+        self._callbacks: Set[asyncio.Task] = set()
+
+    def register(self, store: SessionStore) -> None:
+        if store.kind in self.stores:
+            raise ValueError(f"Session kind {store.kind!r} is already registered")
+        self.stores[store.kind] = store
+
+    def schedule(self, store: SessionStore, key: Hashable, deadline: float) -> None:
+        # слот не раньше текущей позиции курсора, иначе запись пролежит лишний оборот
+        tick = max(int(deadline // self.resolution) + 1, self._tick + 1)
+        with self._wheel_lock:
+            self._wheel[tick % len(self._wheel)].add((store.kind, key))
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Advance the wheel up to ``now``; returns the number of expired sessions."""
+        now = time.monotonic() if now is None else now
+        with self._sweep_lock:
+            return self._advance(now)
+
+    def _advance(self, now: float) -> int:
+        target = int(now // self.resolution)
+        expired = 0
+        while self._tick < target:
+            self._tick += 1
+            with self._wheel_lock:
+                bucket = self._wheel[self._tick % len(self._wheel)]
+                self._wheel[self._tick % len(self._wheel)] = set()
+            for kind, key in bucket:
+                store = self.stores[kind]
+                is_expired, value, deadline = store._take_if_expired(key, now)
+                if is_expired:
+                    expired += 1
+                    self._fire(store, key, value)
+                elif deadline is not None:
+                    self.schedule(store, key, deadline)
+        return expired
+
+    def _fire(self, store: SessionStore, key: Hashable, value: Any) -> None:
+        logger.info("Session %s:%r expired", store.kind, key)
+        if store.on_expire is None:
+            return
+        try:
+            result = store.on_expire(self._bot, key, value)
+        except Exception:
+            logger.exception("on_expire for %s:%r failed", store.kind, key)
+            return
+        if inspect.isawaitable(result):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:  # поток без event loop (start_thread)
+                result.close()
+                logger.warning("Async on_expire for %s needs the bot loop, skipped", store.kind)
+                return
+            task = asyncio.ensure_future(result)
+            self._callbacks.add(task)
+            task.add_done_callback(self._callback_done)
+
+    def _callback_done(self, task: asyncio.Task) -> None:
+        self._callbacks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Session expiry callback failed", exc_info=task.exception())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.resolution)
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Session sweep failed")
+
+    def start(self, bot) -> None:
+        """Start the sweeper on the running loop; ``bot`` is passed to expiry callbacks."""
+        self._bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def start_thread(self) -> threading.Thread:
+        """Sweep from a daemon thread (processes without an asyncio loop)."""
+        def loop():
+            while True:
+                time.sleep(self.resolution)
+                try:
+                    self.sweep()
+                except Exception:
+                    logger.exception("Session sweep failed")
+        thread = threading.Thread(target=loop, name="session-sweeper", daemon=True)
+        thread.start()
+        return thread
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {kind: {"live": len(store), "bytes": store.approx_bytes(), "expired": store.expired}
+                for kind, store in self.stores.items()}
+
+
+sessions = SessionRegistry()
@@ -0,0 +1,131 @@
+"""Тёплый перезапуск: снимки игровых сессий в SQLite.
+
+Все ``SessionStore`` из реестра ``sessions`` периодически (и при остановке бота)
+сериализуются (pickle + zlib) в одну таблицу — строка на тип сессий. При старте
+снимок загружается обратно с учётом времени простоя, после чего вызываются
+хуки ``on_restore(kind)``: игры перевооружают таймеры фаз, восстанавливают индексы.
+
+Объекты игр должны быть picklable; всё, что привязано к event loop (asyncio.Task),
+они выбрасывают в ``__getstate__`` и пересоздают в хуке.
+"""
+from __future__ import annotations
+import asyncio
+import inspect
+import logging
+import pickle
+import sqlite3
+import time
+import zlib
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Union
+
+from .sessions import SessionRegistry, sessions
+
+logger = logging.getLogger(__name__)
+
+RestoreHook = Callable[[Any, Hashable, Any], Union[None, Awaitable[None]]]
+
+_restore_hooks: Dict[str, List[RestoreHook]] = {}
+
+
+def on_restore(kind: str):
+    """Decorator: ``hook(bot, key, value)`` is called for every restored session of ``kind``."""
+    def decorator(hook: RestoreHook) -> RestoreHook:
+        _restore_hooks.setdefault(kind, []).append(hook)
+        return hook
+    return decorator
+
+
+class GameSnapshots:
+    """Saves and restores every session store of a registry to one SQLite file."""
+
+    def __init__(self, path: str, registry: SessionRegistry = sessions):
+        self.path = path
+        self.registry = registry
+        self.saved_at: Optional[float] = None
+        self.last_size = 0
+        self._task: Optional[asyncio.Task] = None
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS game_snapshots ("
+                         "kind TEXT PRIMARY KEY, saved_at REAL NOT NULL, data BLOB NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def serialize(self) -> List[tuple]:
+        """Rows ``(kind, saved_at, blob)``; must run on the loop thread (games mutate there)."""
+        now = time.time()
+        rows = []
+        for kind, store in self.registry.stores.items():
+            try:
+                blob = zlib.compress(pickle.dumps(store.dump(), protocol=pickle.HIGHEST_PROTOCOL))
+            except Exception:
+                logger.exception("Cannot snapshot sessions %r", kind)
+                continue
+            rows.append((kind, now, blob))
+        return rows
+
+    def write(self, rows: List[tuple]) -> int:
+        """Store serialized rows in one transaction; returns the compressed size in bytes."""
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO game_snapshots(kind, saved_at, data) VALUES (?, ?, ?)", rows)
+        if rows:
+            self.saved_at = rows[0][1]
+        self.last_size = sum(len(r[2]) for r in rows)
+        return self.last_size
+
+    def save(self) -> int:
+        return self.write(self.serialize())
+
+    async def restore(self, bot) -> Dict[str, int]:
+        """Load the last snapshot into the (empty) stores and run the restore hooks."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT kind, saved_at, data FROM game_snapshots").fetchall()
+        restored: Dict[str, int] = {}
+        now = time.time()
+        for kind, saved_at, blob in rows:
+            store = self.registry.stores.get(kind)
+            if store is None:
+                continue
+            try:
+                entries = pickle.loads(zlib.decompress(blob))
+            except Exception:
+                logger.exception("Broken snapshot for %r, skipped", kind)
+                continue
+            restored[kind] = store.load(entries, elapsed=max(0.0, now - saved_at))
+            for hook in _restore_hooks.get(kind, ()):
+                for key, value in store.items():
+                    try:
+                        result = hook(bot, key, value)
+                        if inspect.isawaitable(result):
+                            await result
+                    except Exception:
+                        logger.exception("Restore hook for %s:%r failed", kind, key)
+        if restored:
+            logger.info("Restored sessions from snapshot: %s", restored)
+        return restored
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # снимок состояния — здесь же, в потоке loop; запись в SQLite — в executor
+                rows = self.serialize()
+                await asyncio.get_running_loop().run_in_executor(None, self.write, rows)
+            except Exception:
+                logger.exception("Periodic snapshot failed")
+
+    def start(self, interval: float = 60.0) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        """Stop the periodic task and take the final snapshot."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        size = self.save()
+        logger.info("Final game snapshot saved (%d bytes)", size)
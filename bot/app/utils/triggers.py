@@ -0,0 +1,144 @@
+"""Единый индекс текстовых триггеров.
+
+Все ключевые слова (подстроки) собираются в один автомат Ахо–Корасик, все регулярки —
+в одно скомпилированное выражение, точные фразы — в словарь. Текст сообщения
+приводится к нижнему регистру и прогоняется через индекс один раз (в TriggerMiddleware),
+а хендлеры проверяют только принадлежность имени триггера к найденному множеству.
+"""
+from __future__ import annotations
+import re
+from collections import deque
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+from aiogram.filters import BaseFilter
+from aiogram.types import Message
+
+EMPTY: FrozenSet[str] = frozenset()
+
+
+class AhoCorasick:
+    """Minimal Aho–Corasick automaton: reports which keyword labels occur in a text."""
+
+    def __init__(self, keywords: Dict[str, Set[str]]):
+        # goto[state] — переходы, out[state] — метки, заканчивающиеся в этом состоянии
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[FrozenSet[str]] = [EMPTY]
+        for word, labels in keywords.items():
+            self._add(word, labels)
+        self._build()
+
+    def _add(self, word: str, labels: Set[str]):
+        state = 0
+        for ch in word:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({}); self._fail.append(0); self._out.append(EMPTY)
+            state = nxt
+        self._out[state] = self._out[state] | labels
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] | self._out[self._fail[nxt]]
+
+    def labels(self, text: str) -> Set[str]:
+        found: Set[str] = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+
+class TriggerRegistry:
+    """Registry of named text triggers compiled into a single-pass matcher.
+
+    - ``keyword(name, *words)`` — слово встречается в тексте (подстрока);
+    - ``exact(name, *phrases)`` — текст целиком равен фразе;
+    - ``regex(name, *patterns)`` — ``re.match`` хотя бы одного шаблона.
+
+    Сравнение всегда идёт по ``text.lower()``. Индекс пересобирается лениво
+    после регистрации новых триггеров.
+    """
+
+    def __init__(self):
+        self._keywords: Dict[str, Set[str]] = {}
+        self._exact: Dict[str, Set[str]] = {}
+        self._regex: Dict[str, List[str]] = {}
+        self._compiled: Optional[Tuple[Optional[AhoCorasick], Dict[str, FrozenSet[str]], Optional[re.Pattern], List[str]]] = None
+
+    def keyword(self, name: str, *words: str):
+        for w in words:
+            self._keywords.setdefault(w.lower(), set()).add(name)
+        self._compiled = None
+
+    def exact(self, name: str, *phrases: str):
+        for p in phrases:
+            self._exact.setdefault(p.lower(), set()).add(name)
+        self._compiled = None
+
+    def regex(self, name: str, *patterns: str):
+        self._regex.setdefault(name, []).extend(patterns)
+        self._compiled = None
+
+    def _compile(self):
+        automaton = AhoCorasick(self._keywords) if self._keywords else None
+        exact = {k: frozenset(v) for k, v in self._exact.items()}
+        # Каждый regex-триггер — отдельный lookahead в начале строки, поэтому один
+        # re.match сообщает обо всех сработавших триггерах сразу (как раньше делал re.match по каждому)
+        names = list(self._regex)
+        combined = None
+        if names:
+            parts = [f"(?:(?=(?P<t{i}>{'|'.join(f'(?:{p})' for p in self._regex[n])})))?" for i, n in enumerate(names)]
+            combined = re.compile("".join(parts))
+        self._compiled = (automaton, exact, combined, names)
+        return self._compiled
+
+    def match(self, text: Optional[str]) -> FrozenSet[str]:
+        """Return names of all triggers that fire for ``text``."""
+        if not text:
+            return EMPTY
+        automaton, exact, combined, names = self._compiled or self._compile()
+        low = text.lower()
+        found: Set[str] = set(exact.get(low, EMPTY))
+        if automaton is not None:
+            found |= automaton.labels(low)
+        if combined is not None:
+            m = combined.match(low)
+            for i, name in enumerate(names):
+                if m.group(f"t{i}") is not None:
+                    found.add(name)
+        return frozenset(found) if found else EMPTY
+
+
+triggers = TriggerRegistry()
+
+
+class Trigger(BaseFilter):
+    """Filter that passes when the named trigger fired for the message.
+
+    Uses the set precomputed by TriggerMiddleware; without the middleware
+    falls back to matching the message itself.
+    """
+
+    def __init__(self, name: str, registry: TriggerRegistry = triggers):
+        self.name = name
+        self.registry = registry
+
+    async def __call__(self, message: Message, text_triggers: Optional[FrozenSet[str]] = None) -> bool:
+        if text_triggers is None:
+            text_triggers = self.registry.match(message.text)
+        return self.name in text_triggers
@@ -0,0 +1,140 @@
+"""Общий кэш отображаемых имён пользователей и списков админов чатов.
+
+- TTL + LRU-ограничение размера (TTLCache);
+- single-flight: параллельные запросы одного ключа ждут один вызов Bot API;
+- пассивное обновление: UserCacheMiddleware кладёт сюда from_user / chat_member
+  из входящих апдейтов, поэтому имена активных игроков берутся без запросов к API.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Small LRU cache whose entries expire ``ttl`` seconds after being stored."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = _MISSING) -> Any:
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def display_name_of(user) -> str:
+    """Same naming rule the games always used: 'First Last' > first > username > id."""
+    if user.first_name and user.last_name:
+        return f"{user.first_name} {user.last_name}"
+    if user.first_name:
+        return user.first_name
+    if user.username:
+        return user.username
+    return f"Пользователь {user.id}"
+
+
+class UserDirectory:
+    def __init__(self, names_ttl: float = 6 * 3600, admins_ttl: float = 600,
+                 max_names: int = 20000, max_chats: int = 2000):
+        self.names = TTLCache(max_names, names_ttl)
+        self.admins = TTLCache(max_chats, admins_ttl)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def _single_flight(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        fut = self._inflight.get(key)
+        if fut is not None:
+            return await asyncio.shield(fut)
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            result = await fetch()
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # помечаем как полученное, если никто больше не ждал
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    # --- имена ---
+    def remember_user(self, user) -> None:
+        if user is not None and not getattr(user, "is_bot", False):
+            self.names.set(user.id, display_name_of(user))
+
+    def cached_name(self, user_id: int) -> Optional[str]:
+        return self.names.get(user_id, None)
+
+    async def display_name(self, bot, user_id: int) -> Optional[str]:
+        """Display name for ``user_id`` or None when Telegram doesn't tell us."""
+        name = self.names.get(user_id, None)
+        if name is not None:
+            return name
+
+        async def fetch():
+            try:
+                member = await bot.get_chat_member(chat_id=user_id, user_id=user_id)
+            except Exception as e:
+                logger.debug("get_chat_member(%s) failed: %s", user_id, e)
+                return None
+            self.remember_user(member.user)
+            return display_name_of(member.user)
+
+        return await self._single_flight(("name", user_id), fetch)
+
+    # --- админы чатов ---
+    async def chat_admins(self, bot, chat_id: int) -> List[Any]:
+        admins = self.admins.get(chat_id, None)
+        if admins is not None:
+            return admins
+
+        async def fetch():
+            result = await bot.get_chat_administrators(chat_id)
+            self.admins.set(chat_id, result)
+            for member in result:
+                self.remember_user(member.user)
+            return result
+
+        return await self._single_flight(("admins", chat_id), fetch)
+
+    def invalidate_admins(self, chat_id: int) -> None:
+        self.admins.pop(chat_id)
+
+    def stats(self) -> dict:
+        return {
+            "names": len(self.names), "names_hits": self.names.hits, "names_misses": self.names.misses,
+            "admin_chats": len(self.admins), "admins_hits": self.admins.hits, "admins_misses": self.admins.misses,
+        }
+
+
+users = UserDirectory()
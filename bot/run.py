@@ -1,5 +1,6 @@
 from __future__ import annotations
 import asyncio
+import os
 import sqlite3
 import logging
 from aiogram import Bot, Dispatcher
@@ -56,6 +57,12 @@ tictactoe = safe_import("tictactoe", "TicTacToe handlers")
 truth_or_dare = safe_import("truth_or_dare", "Truth or Dare handlers")
 diagnostic = safe_import("diagnostic", "diagnostic handlers")
 from app.utils.broadcast import broadcast
+from app.middlewares import AckFirstMiddleware, ChatOrderingMiddleware, TriggerMiddleware, UserCacheMiddleware
+from app.utils.callbacks import dispatch_callback
+from app.utils.pending_input import dispatch_input, has_pending_input
+from app.utils.sessions import sessions
+from app.utils.snapshots import GameSnapshots
+from app.utils.game_clock import clock
 from aiogram.filters import Command
 from aiogram.types import Message
 from aiogram import BaseMiddleware
@@ -75,6 +82,15 @@ async def main():
 
     # Подключаем middleware на уровень сообщений
     dp.message.middleware(LogUpdateMiddleware())
+    # Один проход по индексу текстовых триггеров на сообщение (см. app/utils/triggers.py)
+    dp.message.outer_middleware(TriggerMiddleware())
+    # Нажатие кнопки подтверждается сразу (или через ~0.3с автоматически), правки сообщения идут после;
+    # до ChatOrderingMiddleware — таймер ответа не ждёт очереди чата/игры
+    dp.update.outer_middleware(AckFirstMiddleware())
+    # Апдейты одного чата/игры — строго по очереди, разные чаты — параллельно
+    dp.update.outer_middleware(ChatOrderingMiddleware(max_pending=config.update_queue_limit))
+    # Имена/админы из входящих апдейтов сразу попадают в общий кэш (app/utils/user_cache.py)
+    dp.update.outer_middleware(UserCacheMiddleware())
 
     # базовое логирование
     import logging, sys
@@ -108,6 +124,11 @@ async def main():
         (diagnostic, "diagnostic")  # последний для fallback
     ]
     
+    # Все callback_query идут через один обработчик с O(1) поиском по префиксу (app/utils/callbacks.py)
+    dp.callback_query.register(dispatch_callback)
+    # Ожидаемый текст в ЛС (задания ToD и т.п.) — один обработчик с поиском по user_id (app/utils/pending_input.py)
+    dp.message.register(dispatch_input, has_pending_input)
+
     for handler_module, name in handlers_to_register:
         if handler_module and hasattr(handler_module, 'router'):
             logging.info(f"Registering {name} router...")
@@ -175,6 +196,7 @@ async def main():
         BotCommand(command="truth", description="Правда или действие"),
         BotCommand(command="tod", description="TOD альт"),
         BotCommand(command="tictactoe", description="Крестики-нолики"),
+        BotCommand(command="tictactoe_bot", description="Крестики-нолики против бота"),
         BotCommand(command="refresh_commands", description="Обновить меню"),
     ]
 
@@ -194,9 +216,27 @@ async def main():
     # Запускаем периодический таск проверки перерывов дрочки
     if drochka and hasattr(drochka, 'check_breaks_and_notify'):
         asyncio.create_task(drochka.check_breaks_and_notify(bot))
-    await bot.delete_webhook(drop_pending_updates=True)
-    # Используем polling в режиме, подходящем для многопоточной среды
-    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    # Тёплый перезапуск: поднимаем игры из последнего снимка (таймеры фаз — с оставшимся временем)
+    snapshots = GameSnapshots(config.snapshot_db or os.path.join(getattr(drochka, 'DB_BASE_DIR', '.'), "game_snapshots.db"))
+    try:
+        await snapshots.restore(bot)
+    except Exception as e:
+        logging.error(f"Failed to restore game snapshot: {e}")
+    # Один фоновый таск истекает брошенные лобби/игры всех модулей (app/utils/sessions.py)
+    sessions.start(bot)
+    snapshots.start(config.snapshot_interval)
+    # Апдейты, пришедшие пока бот перезапускался, не выбрасываем — игры их ждут
+    await bot.delete_webhook(drop_pending_updates=False)
+    try:
+        # Каждый апдейт — отдельная задача (параллельно между чатами), порядок внутри чата держит ChatOrderingMiddleware.
+        # chat_member хендлеров нет, но его читает UserCacheMiddleware (кто-то стал/перестал быть админом —
+        # кэш админов чата сбрасывается); Telegram присылает его, только если бот сам админ в чате
+        allowed_updates = sorted(set(dp.resolve_used_update_types()) | {"chat_member"})
+        await dp.start_polling(bot, allowed_updates=allowed_updates, handle_as_tasks=True)
+    finally:
+        await sessions.stop()
+        await clock.stop()
+        await snapshots.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -1,34 +1,43 @@
 """
 Файл для запуска приложения с ботом и Mini-App
+
+Бот и HTTP-сервер Mini-App (aiohttp) работают в одном event loop: общие
+хранилища сессий, часы и снимки без потоков и блокировок.
 """
 import os
 import sys
-import threading
 import asyncio
-from flask import Flask
-from bot.run import main as run_bot
 
-# Импортируем Flask-приложение для Mini-App
-from bot.app.mini_apps.truth_or_dare.server import app as mini_app
+# bot/ в sys.path: модули импортируются так же, как из run.py (app.*), — один экземпляр реестров
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run import main as run_bot
+from app.mini_apps.truth_or_dare.server import start_server, MAX_CONCURRENCY, KEEPALIVE_TIMEOUT
 
-def run_flask():
-    """Запуск Flask-приложения для Mini-App"""
+
+async def run_mini_app():
+    """Запуск HTTP-сервера Mini-App в текущем event loop; возвращает runner"""
     port = int(os.environ.get("PORT", 500))
-    mini_app.run(host="0.0.0.0", port=port, debug=False)
+    return await start_server("0.0.0.0", port, concurrency=MAX_CONCURRENCY, keepalive_timeout=KEEPALIVE_TIMEOUT)
+
+
+async def run_all():
+    """Mini-App и бот в одном event loop (сессии, TTL и снимки стартуют внутри run.main)"""
+    runner = await run_mini_app()
+    try:
+        await run_bot()
+    finally:
+        await runner.cleanup()
+
 
 def run_bot_async():
-    """Запуск бота в отдельном потоке"""
-    asyncio.run(run_bot())
+    """Запуск бота вместе с Mini-App"""
+    asyncio.run(run_all())
+
 
 if __name__ == "__main__":
-    # Запуск Flask-приложения в отдельном потоке
-    flask_thread = threading.Thread(target=run_flask)
-    flask_thread.daemon = True
-    flask_thread.start()
-    
-    # Запуск бота в основном потоке
     try:
         run_bot_async()
     except KeyboardInterrupt:
         print("Приложение остановлено")
-        sys.exit(0)
\ No newline at end of file
+        sys.exit(0)
@@ -1,54 +1,50 @@
 """
 Тестирование полного запуска приложения с ботом и Mini-App
 """
-import threading
-import time
-import requests
-from bot.start_app import run_flask, run_bot_async
+import asyncio
+import os
+import sys
+import aiohttp
 
-def test_app_startup():
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from start_app import run_mini_app
+
+async def check_app_startup():
     """Тестирование запуска приложения"""
     print("Тестирование запуска приложения...")
-    
-    # Запуск Flask-приложения в отдельном потоке
-    flask_thread = threading.Thread(target=run_flask)
-    flask_thread.daemon = True
-    flask_thread.start()
-    
-    print("Flask-приложение запущено в отдельном потоке")
-    
-    # Ждем немного, чтобы сервер запустился
-    time.sleep(2)
-    
-    # Проверяем, доступен ли сервер
-    try:
-        # Попробуем получить доступ к главной странице Mini-App
-        response = requests.get("http://localhost:500/", timeout=5)
-        if response.status_code == 200:
-            print("✓ Mini-App доступна по адресу http://localhost:500/")
-        else:
-            print(f"✗ Mini-App недоступна, статус: {response.status_code}")
-    except requests.exceptions.RequestException as e:
-        print(f"✗ Ошибка при подключении к Mini-App: {e}")
-        print("  (Это нормально для теста, так как порт может отличаться)")
-    
-    # Проверяем API
-    try:
-        response = requests.get("http://localhost:500/api/health", timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('status') == 'ok':
-                print("✓ API Mini-App работает корректно")
-            else:
-                print("✗ API Mini-App вернул неожиданный ответ")
-        else:
-            print(f"✗ API Mini-App недоступно, статус: {response.status_code}")
-    except:
-        print("✗ Ошибка при проверке API Mini-App")
-        print("  (Это нормально для теста, так как порт может отличаться)")
-    
+
+    # Запуск Mini-App в текущем event loop (так же, как рядом с ботом)
+    runner = await run_mini_app()
+    port = int(os.environ.get("PORT", 500))
+
+    print("Mini-App запущена в event loop")
+
+    async with aiohttp.ClientSession() as session:
+        # Проверяем, доступна ли главная страница Mini-App
+        try:
+            async with session.get(f"http://localhost:{port}/", timeout=5) as response:
+                if response.status == 200:
+                    print(f"✓ Mini-App доступна по адресу http://localhost:{port}/")
+                else:
+                    print(f"✗ Mini-App недоступна, статус: {response.status}")
+        except aiohttp.ClientError as e:
+            print(f"✗ Ошибка при подключении к Mini-App: {e}")
+
+        # Проверяем API
+        try:
+            async with session.get(f"http://localhost:{port}/api/health", timeout=5) as response:
+                data = await response.json()
+                if response.status == 200 and data.get('status') == 'ok':
+                    print("✓ API Mini-App работает корректно")
+                else:
+                    print(f"✗ API Mini-App вернул неожиданный ответ (статус {response.status})")
+        except aiohttp.ClientError:
+            print("✗ Ошибка при проверке API Mini-App")
+
+    await runner.cleanup()
     print("\nПриложение успешно настроено для запуска с ботом и Mini-App!")
     print("Для полного тестирования необходимо установить зависимости и запустить с реальным токеном бота.")
 
 if __name__ == "__main__":
-    test_app_startup()
\ No newline at end of file
+    asyncio.run(check_app_startup())
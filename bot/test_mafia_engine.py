@@ -0,0 +1,130 @@
+"""
+Проверка движка мафии без Telegram: ночь, голосование, условие победы
+
+    python bot/test_mafia_engine.py
+"""
+from app.games.mafia_engine import GamePhase, MafiaGame, Player, Role, Side
+
+# Роли раздаём без перемешивания: порядок игроков = порядок ролей
+ROLES = [Role.MAFIA, Role.DOCTOR, Role.DETECTIVE, Role.CIVILIAN, Role.CIVILIAN]
+
+
+def make_game(roles=ROLES):
+    game = MafiaGame(chat_id=-100, players=[Player(user_id=i + 1, username=f"Игрок {i + 1}") for i in range(len(roles))])
+    game.assign_roles(roles)
+    game.start_night()
+    return game
+
+
+def test_night_kill():
+    game = make_game()
+    mafia, doctor, detective, town = game.players[0], game.players[1], game.players[2], game.players[3]
+    assert not game.night_actions_complete()
+    assert game.night_action(mafia, town) is None
+    assert game.night_action(doctor, doctor) is None
+    assert not game.night_actions_complete()  # детектив ещё не ходил
+    assert game.night_action(detective, mafia) is None
+    assert game.night_actions_complete()
+    result = game.resolve_night()
+    assert result.killed is town and not town.alive and result.saved is None
+    assert result.checked is mafia and result.checked_is_mafia
+    assert game.alive_count == 4
+
+
+def test_night_heal():
+    game = make_game()
+    mafia, doctor, town = game.players[0], game.players[1], game.players[3]
+    game.night_action(mafia, town)
+    game.night_action(doctor, town)
+    result = game.resolve_night()
+    assert result.killed is None and result.saved is town and town.alive
+    assert result.checked is None  # детектив не проверял
+    assert game.alive_count == 5
+
+
+def test_night_action_errors():
+    game = make_game([Role.MAFIA, Role.MAFIA, Role.DOCTOR, Role.CIVILIAN, Role.CIVILIAN])
+    mafia, other_mafia, doctor, town = game.players[0], game.players[1], game.players[2], game.players[3]
+    assert game.night_action(mafia, other_mafia) == "❌ Нельзя убивать своих!"
+    assert game.night_action(town, mafia) == "❌ Вы не можете использовать эту команду!"
+    assert game.night_action(doctor, mafia, role=Role.DETECTIVE) == "❌ Вы не можете использовать эту команду!"
+    game.kill(town)
+    assert game.night_action(mafia, town) == "❌ Игрок не найден!"
+    game.start_day()
+    assert game.night_action(mafia, doctor) == "❌ Сейчас не ночь!"
+    # детектива нет в партии — ночь завершается без его хода
+    game.start_night()
+    game.night_action(mafia, doctor)
+    game.night_action(doctor, doctor)
+    assert game.night_actions_complete()
+
+
+def test_vote_tally_and_leaders():
+    game = make_game()
+    game.start_day()
+    game.start_voting()
+    game.cast_vote(1, 4)
+    game.cast_vote(2, 5)
+    assert set(game.vote_leaders) == {4, 5} and game.leader_votes == 1
+    game.cast_vote(3, 4)
+    assert game.vote_leaders == (4,) and game.leader_votes == 2
+    game.cast_vote(3, 4)  # повторный голос за того же не считается
+    assert game.vote_tally[4] == 2
+    game.cast_vote(3, 5)  # передумал: лидер сменился
+    assert game.vote_leaders == (5,) and game.leader_votes == 2 and game.vote_tally[4] == 1
+    game.cast_vote(3, 1)  # лидер потерял голос — лидеры пересчитываются: ничья трёх
+    assert set(game.vote_leaders) == {1, 4, 5} and game.leader_votes == 1
+    game.cast_vote(1, 5)
+    assert game.vote_leaders == (5,) and game.vote_tally == {1: 1, 4: 0, 5: 2}
+    assert not game.all_voted()
+    game.cast_vote(4, 5)
+    game.cast_vote(5, 1)
+    assert game.all_voted()
+    result = game.resolve_vote()
+    assert result.executed is game.players[4] and not result.tie
+    assert game.alive_count == 4
+
+
+def test_vote_tie_and_no_votes():
+    game = make_game()
+    game.start_day()
+    assert game.resolve_vote().executed is None and not game.resolve_vote().tie
+    game.cast_vote(1, 4)
+    game.cast_vote(4, 1)
+    result = game.resolve_vote()
+    assert result.executed is None and result.tie
+    assert game.alive_count == 5
+
+
+def test_votes_survive_snapshot():
+    import pickle
+    game = make_game()
+    game.start_day()
+    game.cast_vote(1, 4)
+    game.cast_vote(2, 4)
+    restored = pickle.loads(pickle.dumps(game))
+    assert restored.vote_leaders == (4,) and restored.leader_votes == 2
+    assert restored.alive_by_username("игрок 3") is restored.players[2]
+
+
+def test_winner():
+    game = make_game()
+    assert game.winner() is None
+    game.kill(game.players[3])
+    game.kill(game.players[4])
+    assert game.winner() is None  # мафия 1 против 2
+    game.kill(game.players[2])
+    assert game.winner() == Side.MAFIA
+    assert game.check_win_condition() == "Мафия победила!" and game.phase == GamePhase.ENDED
+
+    game = make_game()
+    game.kill(game.players[0])
+    assert game.winner() == Side.TOWN
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_"):
+            check()
+            print(f"{name}: ok")
+    print("\nТестирование завершено успешно!")
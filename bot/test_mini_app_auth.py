@@ -7,6 +7,7 @@ from datetime import datetime
 import hashlib
 import hmac
 import os
+import time
 
 # Используем фиктивный токен для тестирования
 FAKE_BOT_TOKEN = "123456789:ABCdefGHIjklMNOpqrsTUVwxyz"
@@ -88,5 +89,81 @@ async def test_auth_generation():
     
     print("\nТестирование завершено успешно!")
 
+def signed_init_data(user_id, first_name, bot_token=FAKE_BOT_TOKEN, auth_date=None):
+    """initData в том виде, как его отдаёт Telegram.WebApp (подпись — как в generate_mini_app_url)"""
+    from urllib.parse import urlencode
+    fields = {
+        "auth_date": str(int(auth_date if auth_date is not None else time.time())),
+        "query_id": "AAHdF6IQAAAAAN0XohDhrOrc",
+        "user": json.dumps({"id": user_id, "first_name": first_name}, ensure_ascii=False),
+    }
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+def expect_auth_error(fn, *args):
+    from app.mini_apps.truth_or_dare.auth import AuthError
+    try:
+        fn(*args)
+    except AuthError as e:
+        return str(e)
+    raise AssertionError(f"{fn.__name__}{args!r} должен был отказать")
+
+
+def test_verify_init_data():
+    """Проверка подписи и срока initData (app/mini_apps/truth_or_dare/auth.py)"""
+    from app.mini_apps.truth_or_dare.auth import verify_init_data
+    fields = verify_init_data(signed_init_data(123456789, "Иван"), FAKE_BOT_TOKEN)
+    assert fields["user"] == {"id": 123456789, "first_name": "Иван"}
+    # подписано чужим токеном бота
+    assert expect_auth_error(verify_init_data, signed_init_data(1, "Иван", bot_token="1:other"), FAKE_BOT_TOKEN) \
+        == "Invalid initData signature"
+    # подменили пользователя после подписи
+    forged = signed_init_data(1, "Иван").replace("%22id%22%3A+1%2C", "%22id%22%3A+2%2C")
+    assert "%22id%22%3A+2%2C" in forged
+    assert expect_auth_error(verify_init_data, forged, FAKE_BOT_TOKEN) == "Invalid initData signature"
+    # без подписи и просроченный
+    assert expect_auth_error(verify_init_data, "auth_date=1&user=%7B%7D", FAKE_BOT_TOKEN) == "initData has no hash"
+    old = signed_init_data(1, "Иван", auth_date=time.time() - 2 * 24 * 60 * 60)
+    assert expect_auth_error(verify_init_data, old, FAKE_BOT_TOKEN) == "initData expired"
+    print("verify_init_data: ok")
+
+
+def test_session_tokens():
+    """login -> authenticate: кэш, другой воркер, подделка и истечение токена"""
+    from app.mini_apps.truth_or_dare.auth import MiniAppAuth
+    auth = MiniAppAuth(bot_token=FAKE_BOT_TOKEN)
+    token, user = auth.login(signed_init_data(123456789, "Иван"))
+    assert (user.id, user.name) == (123456789, "Иван")
+    assert auth.authenticate(token) == user  # из LRU
+    # другой воркер / перезапуск: кэша нет, токен проверяется по подписи
+    other = MiniAppAuth(bot_token=FAKE_BOT_TOKEN).authenticate(token)
+    assert (other.id, other.name) == (user.id, user.name)
+    # токен другого бота, подпись от другого payload, мусор
+    assert expect_auth_error(MiniAppAuth(bot_token="1:other").authenticate, token) == "Invalid session token"
+    second, _ = auth.login(signed_init_data(987654321, "Мария"))
+    spliced = token.split(".")[0] + "." + second.split(".")[1]
+    assert expect_auth_error(MiniAppAuth(bot_token=FAKE_BOT_TOKEN).authenticate, spliced) == "Invalid session token"
+    assert expect_auth_error(auth.authenticate, "garbage") == "Invalid session token"
+    assert expect_auth_error(auth.authenticate, "") == "Authorization required"
+    # login не выдаёт токен по поддельному initData
+    expect_auth_error(auth.login, signed_init_data(1, "Иван", bot_token="1:other"))
+    # истёкший токен отвергается и в кэше, и без него
+    expired_auth = MiniAppAuth(bot_token=FAKE_BOT_TOKEN, ttl=-1)
+    expired, _ = expired_auth.login(signed_init_data(123456789, "Иван"))
+    assert expect_auth_error(expired_auth.authenticate, expired) == "Session expired"
+    assert expect_auth_error(MiniAppAuth(bot_token=FAKE_BOT_TOKEN).authenticate, expired) == "Session expired"
+    # LRU ограничен
+    small = MiniAppAuth(bot_token=FAKE_BOT_TOKEN, cache_size=2)
+    for user_id in range(3):
+        small.login(signed_init_data(user_id + 1, "Иван"))
+    assert len(small._sessions) == 2
+    print("MiniAppAuth login/authenticate: ok")
+
+
 if __name__ == "__main__":
-    asyncio.run(test_auth_generation())
\ No newline at end of file
+    asyncio.run(test_auth_generation())
+    test_verify_init_data()
+    test_session_tokens()
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+Проверка крестиков-ноликов без Telegram: победитель на битовой доске и бот по таблице
+
+    python bot/test_tictactoe.py
+"""
+import random
+
+from app.games.tictactoe import (CELLS, EMPTY_CELL, PLAYER_O, PLAYER_X, TIE, TicTacToeBoard, WIN_MASKS,
+                                 bot_move, solve)
+
+
+def board(rows):
+    """``"XO./.X./..O"`` -> доска (строки через /)"""
+    b = TicTacToeBoard()
+    for pos, mark in enumerate(rows.replace("/", "")):
+        if mark == "X":
+            b.x |= 1 << pos
+        elif mark == "O":
+            b.o |= 1 << pos
+    return b
+
+
+def test_winner():
+    assert TicTacToeBoard().winner() == EMPTY_CELL
+    assert board("XXX/OO./...").winner() == PLAYER_X
+    assert board("XO./XO./.OX").winner() == PLAYER_O
+    assert board("XO./OX./..X").winner() == PLAYER_X
+    assert board("XXO/.O./O.X").winner() == PLAYER_O
+    assert board("XOX/XOO/OXX").winner() == TIE
+    assert len(WIN_MASKS) == 8
+    for mask in WIN_MASKS:
+        assert TicTacToeBoard(x=mask).winner() == PLAYER_X
+        assert TicTacToeBoard(o=mask).winner() == PLAYER_O
+
+
+def test_play_matches_winner():
+    # play() смотрит только линии через поставленную клетку — итог должен совпадать с полной проверкой
+    rng = random.Random(1)
+    for _ in range(500):
+        b, result, symbol = TicTacToeBoard(), EMPTY_CELL, PLAYER_X
+        while result == EMPTY_CELL:
+            result = b.play(rng.choice(b.free_cells()), symbol)
+            assert result == b.winner()
+            symbol = PLAYER_O if symbol == PLAYER_X else PLAYER_X
+
+
+def _worst_outcome(b, bot):
+    """Худший для бота исход при любых ходах соперника и любом из лучших ходов бота."""
+    outcomes = set()
+    if b.turn == bot:
+        best = solve()[b.key][0][1]
+        moves = [pos for pos, score in solve()[b.key] if score == best]
+        assert bot_move(b, "hard") in moves
+    else:
+        moves = b.free_cells()
+    for pos in moves:
+        nb = b.copy()
+        result = nb.play(pos, b.turn)
+        outcomes.add(result if result != EMPTY_CELL else _worst_outcome(nb, bot))
+    opponent = PLAYER_O if bot == PLAYER_X else PLAYER_X
+    return opponent if opponent in outcomes else (TIE if TIE in outcomes else bot)
+
+
+def test_bot_never_loses():
+    assert _worst_outcome(TicTacToeBoard(), PLAYER_X) != PLAYER_O
+    assert _worst_outcome(TicTacToeBoard(), PLAYER_O) != PLAYER_X
+    # идеальная игра с обеих сторон — ничья
+    b, result = TicTacToeBoard(), EMPTY_CELL
+    while result == EMPTY_CELL:
+        result = b.play(bot_move(b, "hard"), b.turn)
+    assert result == TIE
+
+
+def test_bot_takes_win():
+    b = board("XX./OO./...")  # ход X: выигрыш в клетке 2
+    assert bot_move(b, "hard") == 2
+    b = board("XX./OO./X..")  # ход O: выигрыш в клетке 5
+    assert bot_move(b, "hard") == 5
+
+
+def test_solution_covers_reachable_positions():
+    table = solve()
+    seen, stack = set(), [TicTacToeBoard()]
+    while stack:
+        b = stack.pop()
+        if b.key in seen:
+            continue
+        seen.add(b.key)
+        assert b.key in table and len(table[b.key]) == CELLS - b.moves
+        for pos in b.free_cells():
+            nb = b.copy()
+            if nb.play(pos, b.turn) == EMPTY_CELL:
+                stack.append(nb)
+    assert len(seen) == len(table)
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_"):
+            check()
+            print(f"{name}: ok")
+    print("\nТестирование завершено успешно!")